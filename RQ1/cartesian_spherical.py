@@ -1,41 +1,78 @@
 import math
 import pickle
+import numpy as np
 
-def cartesian_to_spherical(x, y, z):
-    r = math.sqrt(x ** 2 + y ** 2 + z ** 2)
-    theta = math.atan2(y, x)
-    phi = math.acos(z / r) if r != 0 else 0  # Ensure r is not zero to avoid division by zero
 
-    return r, theta, phi
+def cartesian_to_spherical(positions, out=None):
+    """
+    (r, theta, phi) of (..., 3, frames) x, y, z positions such as a
+    (sensors, 3, frames) EMA array, for all samples at once. theta is the
+    angle in the x-y plane, phi the angle from the z axis (0 where r is 0).
+    Pass `out=positions` to convert in place or a preallocated array of the
+    same shape, only per-channel temporaries are allocated.
+    """
 
+    positions = np.asarray(positions)
+    if out is None:
+        out = np.empty(positions.shape, dtype=np.result_type(positions.dtype, np.float32))
+    x, y, z = positions[..., 0, :], positions[..., 1, :], positions[..., 2, :]
+    r = np.sqrt(x * x + y * y + z * z)
+    phi = np.divide(z, r, out=np.zeros_like(r), where=r != 0)
+    np.arccos(np.clip(phi, -1.0, 1.0, out=phi), out=phi, where=r != 0)
+    np.arctan2(y, x, out=out[..., 1, :])
+    out[..., 0, :] = r
+    out[..., 2, :] = phi
+    return out
 
-def spherical_to_cartesian(r, theta, phi):
-    x = r * math.sin(phi) * math.cos(theta)
-    y = r * math.sin(phi) * math.sin(theta)
-    z = r * math.cos(phi)
-    return x, y, z
 
+def spherical_to_cartesian(spherical, out=None):
+    # Inverse of cartesian_to_spherical, `out` works the same way
+    spherical = np.asarray(spherical)
+    if out is None:
+        out = np.empty(spherical.shape, dtype=np.result_type(spherical.dtype, np.float32))
+    r, theta, phi = spherical[..., 0, :], spherical[..., 1, :], spherical[..., 2, :]
+    planar = r * np.sin(phi)
+    z = r * np.cos(phi)
+    np.multiply(planar, np.cos(theta), out=out[..., 0, :])
+    np.sin(theta, out=out[..., 1, :])
+    out[..., 1, :] *= planar
+    out[..., 2, :] = z
+    return out
 
-# Example usage
-x_coord = -37.6605  # Replace with your x-coordinate
-y_coord = -29.4712  # Replace with your y-coordinate
-z_coord = 3.5062  # Replace with your z-coordinate
 
-# Example usage
-radius = 47.949  # Replace with your radial distance
-theta = math.radians(-32.3646)  # Replace with your polar angle in radians
-phi = math.radians(75.0436)  # Replace with your azimuthal angle in radians
+# Coordinates the EMA DTW modules can compare the sensors in
+coordinate_modes = {'cartesian': None, 'spherical': cartesian_to_spherical}
 
-x, y, z = spherical_to_cartesian(radius, theta, phi)
-print(f"Cartesian Coordinates: ({x}, {y}, {z})")
 
-r, theta, phi = cartesian_to_spherical(x_coord, y_coord, z_coord)
-print(f"Spherical Coordinates: (r={r}, theta={theta}, phi={phi})")
+def ema_coordinates(ema, coordinates='cartesian'):
+    # A (sensors, 3, frames) EMA array in the given coordinates
+    if coordinates not in coordinate_modes:
+        raise ValueError(f"Unknown EMA coordinates '{coordinates}'")
+    if coordinate_modes[coordinates] is None:
+        return ema
+    return coordinate_modes[coordinates](ema)
 
-try:
-    with open(f'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/phone_data/M04/dh_list.pkl','rb') as file:
-        loaded_list = pickle.load(file)
-        print(loaded_list)
-except FileNotFoundError:
-    print(f"The file 'M03' does not exist.")
 
+if __name__ == '__main__':
+    # Example usage
+    x_coord = -37.6605  # Replace with your x-coordinate
+    y_coord = -29.4712  # Replace with your y-coordinate
+    z_coord = 3.5062  # Replace with your z-coordinate
+
+    # Example usage
+    radius = 47.949  # Replace with your radial distance
+    theta = math.radians(-32.3646)  # Replace with your polar angle in radians
+    phi = math.radians(75.0436)  # Replace with your azimuthal angle in radians
+
+    x, y, z = spherical_to_cartesian(np.array([[radius], [theta], [phi]]))[:, 0]
+    print(f"Cartesian Coordinates: ({x}, {y}, {z})")
+
+    r, theta, phi = cartesian_to_spherical(np.array([[x_coord], [y_coord], [z_coord]]))[:, 0]
+    print(f"Spherical Coordinates: (r={r}, theta={theta}, phi={phi})")
+
+    try:
+        with open(f'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/phone_data/M04/dh_list.pkl','rb') as file:
+            loaded_list = pickle.load(file)
+            print(loaded_list)
+    except FileNotFoundError:
+        print(f"The file 'M03' does not exist.")
@@ -0,0 +1,278 @@
+import json
+import numpy as np
+import os
+import sqlite3
+import time
+
+output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+
+# The acoustic manifest of csv_to_json, and the EMA manifest of ema_slicer (or
+# extract_ema.m): the same phones with an EMA slice path added to each
+json_file_path = os.path.join(output_directory, 'master_sliced_data.json')
+ema_json_file_path = os.path.join(output_directory, 'master_sliced_ema_data.json')
+catalog_file_path = os.path.join(output_directory, 'catalog.sqlite')
+
+prompt_to_code = {'feed': 'T1', 'horn': 'T2', 'the quick brown fox jumps over the lazy dog': 'T3',
+                  'dont ask me to carry an oily rag like that': 'T4'}
+
+# One row per phone occurrence, `occurrence` counts the same phone within one
+# speaker and prompt from 1 (f_sliced.npy is 1, f_sliced_2.npy is 2, ...)
+columns = ['speaker', 'session', 'file_number', 'prompt', 'code', 'phone', 'occurrence', 'start_frame',
+           'end_frame', 'start_time', 'end_time', 'mfcc_path', 'ema_path', 'matrix_file_path']
+
+indexes = {'by_phone': ['phone', 'speaker', 'code'],
+           'by_speaker': ['speaker', 'code', 'phone'],
+           'by_code': ['code', 'phone'],
+           'by_prompt': ['prompt', 'speaker']}
+
+
+def manifest_rows(data_dict):
+    # Catalog rows of the master sliced manifest, in manifest order
+    for speaker, values in data_dict.items():
+        for person_prompts in values:
+            occurrences = {}
+            for phones in person_prompts['text']:
+                occurrence = occurrences.get((phones['prompt'], phones['phone']), 0) + 1
+                occurrences[(phones['prompt'], phones['phone'])] = occurrence
+                yield (speaker, person_prompts.get('session_name'), person_prompts.get('file_number'),
+                       phones['prompt'], prompt_to_code[phones['prompt']], phones['phone'], occurrence,
+                       float(phones['start_frame']), float(phones['end_frame']), float(phones['start_time']),
+                       float(phones['end_time']), phones['sliced_matrix_path'], phones.get('ema_file_path'),
+                       person_prompts.get('matrix_file_path'))
+
+
+def ema_paths(ema_manifest_path):
+    # (speaker, prompt, phone, occurrence) -> (start_time, end_time, EMA slice
+    # path) of the EMA manifest, empty when it was never written
+    if not os.path.exists(ema_manifest_path):
+        return {}
+    with open(ema_manifest_path, 'r') as json_file:
+        data_dict = json.load(json_file)
+    return {(row[0], row[3], row[5], row[6]): (row[9], row[10], row[12]) for row in manifest_rows(data_dict)}
+
+
+def joined_rows(data_dict, ema_slices):
+    # Acoustic manifest rows with the EMA path of the same occurrence, only
+    # where the EMA manifest sliced the same interval
+    for row in manifest_rows(data_dict):
+        start_time, end_time, ema_path = ema_slices.get((row[0], row[3], row[5], row[6]), (None, None, None))
+        if (start_time, end_time) != (row[9], row[10]):
+            ema_path = None
+        yield row[:12] + (ema_path,) + row[13:]
+
+
+def build_catalog(manifest_path, catalog_path, ema_manifest_path):
+    """
+    Writes the SQLite catalog of every phone occurrence in the acoustic master
+    sliced manifest, with indexes for lookups by phone, speaker, prompt code
+    and prompt. EMA slice paths are joined in from the EMA manifest. The
+    previous catalog is replaced, `meta` records when it was built.
+    """
+
+    with open(manifest_path, 'r') as json_file:
+        data_dict = json.load(json_file)
+    temporary_path = catalog_path + '.tmp'
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    connection = sqlite3.connect(temporary_path)
+    connection.execute(f"CREATE TABLE occurrences ({', '.join(columns)})")
+    connection.executemany(f"INSERT INTO occurrences VALUES ({', '.join('?' * len(columns))})",
+                           joined_rows(data_dict, ema_paths(ema_manifest_path)))
+    for name, fields in indexes.items():
+        connection.execute(f"CREATE INDEX {name} ON occurrences ({', '.join(fields)})")
+    connection.execute("CREATE TABLE meta (key, value)")
+    connection.execute("INSERT INTO meta VALUES ('built', ?)", (str(time.time_ns()),))
+    connection.commit()
+    connection.close()
+    os.replace(temporary_path, catalog_path)
+    print(f'Catalog of "{manifest_path}" written to "{catalog_path}"')
+
+
+_connections = {}
+# Catalog file the phone index and the path lookup were built from
+_catalog_in_use = None
+
+
+def is_stale(manifest_path, catalog_path, ema_manifest_path):
+    # Missing or older than either manifest it is built from
+    if not os.path.exists(catalog_path):
+        return True
+    built = os.path.getmtime(catalog_path)
+    return any(os.path.exists(path) and os.path.getmtime(path) > built for path in (manifest_path, ema_manifest_path))
+
+
+def connect():
+    # Open (and build or rebuild when a manifest is newer) the catalog, one
+    # connection per catalog file and process. The paths are the module
+    # settings above, read on every call so they can be pointed elsewhere
+    global _catalog_in_use, _phone_index, _rows_by_path
+    manifest_path, catalog_path, ema_manifest_path = json_file_path, catalog_file_path, ema_json_file_path
+    if catalog_path != _catalog_in_use:
+        _phone_index = None
+        _rows_by_path = None
+        _catalog_in_use = catalog_path
+    if is_stale(manifest_path, catalog_path, ema_manifest_path):
+        _reset(catalog_path)
+        build_catalog(manifest_path, catalog_path, ema_manifest_path)
+    if catalog_path not in _connections:
+        connection = sqlite3.connect(catalog_path)
+        if connection.execute("SELECT name FROM sqlite_master WHERE name = 'meta'").fetchone() is None:
+            # Written before catalogs recorded their build
+            connection.close()
+            build_catalog(manifest_path, catalog_path, ema_manifest_path)
+            connection = sqlite3.connect(catalog_path)
+        connection.row_factory = sqlite3.Row
+        _connections[catalog_path] = connection
+    return _connections[catalog_path]
+
+
+def _reset(catalog_path):
+    # Drop the connection and everything derived from the old catalog
+    global _phone_index, _rows_by_path
+    connection = _connections.pop(catalog_path, None)
+    if connection is not None:
+        connection.close()
+    _phone_index = None
+    _rows_by_path = None
+
+
+def version():
+    """
+    Build stamp of the catalog in use, it changes with every rebuild. The
+    stores record it to notice that they were written from older manifests.
+    """
+
+    return connect().execute("SELECT value FROM meta WHERE key = 'built'").fetchone()[0]
+
+
+def query(**filters):
+    """
+    Occurrences matching every given column, e.g. query(phone='f', code='T1').
+    A list or tuple value matches any of its items. Rows come back in manifest
+    order as dictionaries.
+    """
+
+    clauses = []
+    parameters = []
+    for column, value in filters.items():
+        if column not in columns:
+            raise ValueError(f"Unknown catalog column '{column}'")
+        if isinstance(value, (list, tuple, set)):
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            parameters.extend(value)
+        else:
+            clauses.append(f"{column} = ?")
+            parameters.append(value)
+    sql = "SELECT * FROM occurrences"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return [dict(row) for row in connect().execute(sql + " ORDER BY rowid", parameters)]
+
+
+class PhoneIndex:
+    """
+    Inverted phone -> speaker -> prompt code -> [occurrences] index built in
+    one pass over the catalog rows. Rows are only bucketed by phone up front,
+    the nested dictionary of a phone is built the first time it is asked for.
+    """
+
+    def __init__(self, rows):
+        self._rows = {}
+        for row in rows:
+            self._rows.setdefault(row['phone'], []).append(row)
+        self._phones = {}
+
+    def __contains__(self, phone):
+        return phone in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __getitem__(self, phone):
+        if phone not in self._phones:
+            speakers = {}
+            for row in self._rows.get(phone, []):
+                speakers.setdefault(row['speaker'], {}).setdefault(row['code'], []).append(row)
+            self._phones[phone] = speakers
+        return self._phones[phone]
+
+    def counts(self):
+        # Occurrences per phone, no matrix or path is touched
+        return {phone: len(rows) for phone, rows in self._rows.items()}
+
+    def paths(self, phone, path_column='mfcc_path'):
+        # {'M04_T1_f': [path, ...]} of one phone, in manifest order. Occurrences
+        # without a path (ema_path is NULL where the EMA manifest has no slice
+        # of the same interval) are left out, and so are keys left empty
+        paths = {}
+        for speaker, codes in self[phone].items():
+            for code, rows in codes.items():
+                column = [row[path_column] for row in rows if row[path_column] is not None]
+                if column:
+                    paths[speaker + '_' + code + '_' + phone] = column
+        return paths
+
+    def flat_paths(self, phone, path_column='mfcc_path'):
+        return [row[path_column] for row in self._rows.get(phone, []) if row[path_column] is not None]
+
+
+_phone_index = None
+
+
+def phone_index():
+    # Index of the whole catalog, built once per process
+    global _phone_index
+    if _phone_index is None:
+        _phone_index = PhoneIndex(query())
+    return _phone_index
+
+
+def phone_paths(phones, path_column='mfcc_path'):
+    """
+    {phone: {'M04_T1_f': [path, ...]}} for the given phones, the dictionary
+    the process_json functions used to rebuild from the manifest.
+    """
+
+    index = phone_index()
+    return {phone: index.paths(phone, path_column) for phone in phones}
+
+
+# Utterance matrices opened for slicing, by path
+_utterances = {}
+
+
+def frame_range(row):
+    # The rounding csv_to_json.extract_sliced_matrix slices with
+    return round(float(row['start_frame'])), round(float(row['end_frame']))
+
+
+def token_matrix(row):
+    """
+    Stored (features, frames) MFCC matrix of one occurrence as a view into its
+    utterance matrix, the same values as the sliced .npy file without reading
+    or needing it. The utterance matrix is memory-mapped once per path.
+    """
+
+    if row['matrix_file_path'] not in _utterances:
+        _utterances[row['matrix_file_path']] = np.load(row['matrix_file_path'], mmap_mode='r')
+    start_frame, end_frame = frame_range(row)
+    return _utterances[row['matrix_file_path']][:, start_frame:end_frame]
+
+
+_rows_by_path = None
+
+
+def occurrence_row(mfcc_path):
+    # Catalog row of a sliced MFCC path, None for paths the catalog does not know
+    global _rows_by_path
+    if _rows_by_path is None:
+        _rows_by_path = {row['mfcc_path']: row for row in query()}
+    return _rows_by_path.get(mfcc_path)
+
+
+def word_matrix_paths(prompt):
+    # Full utterance matrix of every speaker who read `prompt`
+    matrix_dict = {}
+    for row in query(prompt=prompt):
+        matrix_dict.setdefault(row['speaker'], row['matrix_file_path'])
+    return matrix_dict
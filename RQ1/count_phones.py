@@ -2,6 +2,7 @@ import parselmouth
 from parselmouth.praat import call
 import pandas as pd
 import os
+import torgo_inventory
 
 directories = ['M','MC']
 ROOT_DIRECTORY = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Dataset/'
@@ -31,36 +32,27 @@ def count_phones(file_path):
 
 
 def extract_phone_paths():
+    inventory = torgo_inventory.load_inventory(ROOT_DIRECTORY)
     for dir_name in directories:
-        sub_directory = os.path.join(ROOT_DIRECTORY, dir_name)
+        for sub_dir_name in inventory.speakers(dir_name):
+            for session_name in inventory.speaker_sessions(dir_name, sub_dir_name):
+                session_path = inventory.session_path(dir_name, sub_dir_name, session_name)
+                phn_dir_name = ''
+                if inventory.has_channel(sub_dir_name, session_name, 'phn_arrayMic'):
+                    phn_dir_name = 'phn_arrayMic'
+                elif inventory.has_channel(sub_dir_name, session_name, 'phn_headMic'):
+                    phn_dir_name = 'phn_headMic'
 
-        for sub_dir_name in os.listdir(sub_directory):
+                if phn_dir_name != '':
+                    phn_dir = os.path.join(session_path, phn_dir_name)
 
-            if not sub_dir_name.startswith('.'):
-                partial_path = os.path.join(sub_directory, sub_dir_name)
-                # print(partial_path)
-                for session_name in os.listdir(partial_path):
-                    if session_name.startswith("Session"):
+                    for phn_file in inventory.listdir(sub_dir_name, session_name, phn_dir_name):
+                        if len(phn_file.split('.')[0]) == 4:
+                            full_path = os.path.join(phn_dir, phn_file)
 
-                        session_path = os.path.join(partial_path, session_name)
-                        # print(session_path)
-                        file_name = ''
-                        if os.path.isdir(os.path.join(session_path, 'phn_arrayMic')):
-                            file_name = os.path.join(session_path, 'phn_arrayMic')
-                        elif os.path.isdir(os.path.join(session_path, 'phn_headMic')):
-                            file_name = os.path.join(session_path, 'phn_headMic')
+                            print(full_path)
 
-                        if file_name != '':
-                            phn_dir = os.path.join(session_path, file_name)
-
-                            for phn_file in os.listdir(phn_dir):
-                                # print(phn_file)
-                                if len(phn_file.split('.')[0]) == 4:
-                                    full_path = os.path.join(phn_dir, phn_file)
-
-                                    print(full_path)
-
-                                    count_phones(full_path)
+                            count_phones(full_path)
 
 
 extract_phone_paths()
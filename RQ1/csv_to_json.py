@@ -4,11 +4,15 @@ import os
 import csv
 import re
 import numpy as np
+import pandas as pd
 import shlex
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 csv_file_path = '/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/file_paths.csv'
 json_file_path = '/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/master_data.json'
 directory = "/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/"
+state_file_path = directory + 'manifest_state.json'
 
 
 def convert_csv_to_json():
@@ -30,82 +34,191 @@ def convert_csv_to_json():
     print(f'CSV file "{csv_file_path}" converted to JSON file "{json_file_path}".')
 
 
-def extract_sliced_matrix(sub_dir_path, save_dir_name, prompt, phone, start_frame, end_frame, count_dict):
-    for dir_name in os.listdir(sub_dir_path):
-        if (os.path.isfile(os.path.join(sub_dir_path, dir_name)) and dir_name.split('_')[
-            1] == prompt and not dir_name.endswith('.npy')):
-            # print(prompt)
-            matrix_path = os.path.join(sub_dir_path, dir_name)
-            if not os.path.exists(os.path.join(sub_dir_path, dir_name + '.npy')):
-                matrix = np.loadtxt(matrix_path)
-                np.save(os.path.join(sub_dir_path, dir_name + '.npy'), matrix)
-                print("matrix saved")
-            else:
-                matrix = np.load(os.path.join(sub_dir_path, dir_name + '.npy'))
-            # print(start_frame), round(float(end_frame)))
-            sliced_matrix = matrix[:, round(float(start_frame)):round(float(end_frame))]
-            if not os.path.exists(sub_dir_path + '/' + prompt):
-                os.makedirs(sub_dir_path + '/' + prompt)
-            sliced_matrix_path = os.path.join(sub_dir_path, prompt, phone + '_sliced' + '.npy')
-            if os.path.exists(sliced_matrix_path):
-                print(save_dir_name + '_' + prompt + '_' + phone)
-                count_dict[save_dir_name + '_' + prompt + '_' + phone] += 1
-                value = count_dict[save_dir_name + '_' + prompt + '_' + phone]
-                sliced_matrix_path = os.path.join(sub_dir_path, prompt, phone + '_sliced' + '_' + str(value) + '.npy')
-            else:
-                count_dict[save_dir_name + '_' + prompt + '_' + phone] = 1
-            np.save(sliced_matrix_path, sliced_matrix)
-            return sliced_matrix_path
-
-
-def extract_frame(phone_dir, json_data, save=True):
+def read_praat_matrix(matrix_path):
+    # Praat text matrix (one feature per line, whitespace separated frames)
+    # with pandas' C parser, far faster than np.loadtxt on long utterances
+    return pd.read_csv(matrix_path, sep=r'\s+', header=None, dtype=np.float32, engine='c').to_numpy()
+
+
+def convert_matrix(matrix_path):
+    np.save(matrix_path + '.npy', read_praat_matrix(matrix_path))
+    print("matrix saved", matrix_path)
+    return matrix_path
+
+
+def is_text_matrix(dir_name, entry):
+    # <speaker>_<prompt> files without an extension, next to the .npy copies
+    # and the _time_frame.txt files
+    return entry.is_file() and entry.name.startswith(dir_name + '_') and '.' not in entry.name
+
+
+def convert_matrices(phone_dir, processes=None):
+    """
+    Converts every Praat text matrix under <speaker>/matrix/ to a float32
+    .npy next to it, once. Each matrix directory is scanned a single time,
+    matrices whose .npy is newer than the text file are skipped and the rest
+    are parsed in a process pool.
+    """
+
+    pending = []
+    for speaker in os.scandir(phone_dir):
+        sub_dir_path = os.path.join(speaker.path, 'matrix')
+        if not speaker.is_dir() or not os.path.isdir(sub_dir_path):
+            continue
+        entries = {entry.name: entry for entry in os.scandir(sub_dir_path)}
+        for name, entry in entries.items():
+            if not is_text_matrix(speaker.name, entry):
+                continue
+            converted = entries.get(name + '.npy')
+            if converted is None or converted.stat().st_mtime_ns < entry.stat().st_mtime_ns:
+                pending.append(entry.path)
+
+    print(f"{len(pending)} text matrices to convert")
+    if processes == 1 or len(pending) < 2:
+        for matrix_path in pending:
+            convert_matrix(matrix_path)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(convert_matrix, pending))
+
+
+def extract_sliced_matrix(sub_dir_path, save_dir_name, prompt, phone, start_frame, end_frame, count_dict,
+                          write_slices=True):
+    # The utterance matrix is <speaker>_<prompt>, converted by convert_matrices
+    matrix_path = os.path.join(sub_dir_path, save_dir_name + '_' + prompt)
+    if not os.path.isfile(matrix_path) and not os.path.isfile(matrix_path + '.npy'):
+        return None
+    # print(start_frame), round(float(end_frame)))
+    sliced_matrix_path = os.path.join(sub_dir_path, prompt, phone + '_sliced' + '.npy')
+    # Repeated phones of a prompt are numbered by the count of this run,
+    # the slice files of an earlier run do not shift the numbering
+    if save_dir_name + '_' + prompt + '_' + phone in count_dict:
+        print(save_dir_name + '_' + prompt + '_' + phone)
+        count_dict[save_dir_name + '_' + prompt + '_' + phone] += 1
+        value = count_dict[save_dir_name + '_' + prompt + '_' + phone]
+        sliced_matrix_path = os.path.join(sub_dir_path, prompt, phone + '_sliced' + '_' + str(value) + '.npy')
+    else:
+        count_dict[save_dir_name + '_' + prompt + '_' + phone] = 1
+    if write_slices:
+        # The catalog can cut the same token from the utterance matrix
+        # (catalog.token_matrix), so the copy is optional
+        if not os.path.exists(matrix_path + '.npy'):
+            convert_matrix(matrix_path)
+        matrix = np.load(matrix_path + '.npy', mmap_mode='r')
+        sliced_matrix = matrix[:, round(float(start_frame)):round(float(end_frame))]
+        if not os.path.exists(sub_dir_path + '/' + prompt):
+            os.makedirs(sub_dir_path + '/' + prompt)
+        np.save(sliced_matrix_path, sliced_matrix)
+    return sliced_matrix_path
+
+
+def extract_speaker(phone_dir, dir_name, json_data, write_slices=True):
+    print("*" * 10, dir_name, "*" * 10)
+    text_details = {}
+    counter_dictionary = {}
+    sub_dir_path = os.path.join(phone_dir, dir_name, 'matrix')
+    time_frame_path = os.path.join(phone_dir, dir_name, 'matrix', dir_name + '_time_frame.txt')
+    if os.path.exists(time_frame_path):
+        # print(dir_name+'_time_frame.txt')
+
+        with open(time_frame_path, 'r') as file:
+            for line in file:
+                single_line = line.strip()
+                # print(single_line)
+                word = ' '.join(re.findall(r"'([^']*)'", single_line))
+                phone = shlex.split(single_line)[1].split('-')[1]
+                start_time = shlex.split(single_line)[2].split(':')[1]
+                end_time = shlex.split(single_line)[3].split(':')[1]
+                start_frame = shlex.split(single_line)[4].split(':')[1]
+                end_frame = shlex.split(single_line)[5].split(':')[1]
+                # print(f"prompt: {word}, phone: {phone}, start_time: {start_time}, end_time: {end_time}, "
+                # f"start_frame: {start_frame}, end_frame: {end_frame}")
+                if word not in text_details.keys():
+                    text_details[word] = []
+
+                sliced_matrix_path = extract_sliced_matrix(sub_dir_path, dir_name, word, phone, start_frame,
+                                                           end_frame, counter_dictionary, write_slices)
+
+                text_details[word].append(
+                    {'prompt': word, 'phone': phone, 'start_time': start_time, 'end_time': end_time,
+                     'start_frame': start_frame, 'end_frame': end_frame,
+                     'sliced_matrix_path': sliced_matrix_path})
+
+        for index, person_details in enumerate(json_data[dir_name]):
+            json_data[dir_name][index]['matrix_file_path'] = os.path.join(sub_dir_path, dir_name + '_' + text_details[person_details['text']][0]['prompt'] + '.npy')
+            json_data[dir_name][index]['text'] = text_details[person_details['text']]
+        # print(json_data)
+
+
+def extract_frame(phone_dir, json_data, save=True, write_slices=True, speakers=None):
+    # `speakers` limits the slicing to those speaker directories
     for dir_name in os.listdir(phone_dir):
-        if dir_name != ".DS_Store":
-            print("*" * 10, dir_name, "*" * 10)
-            text_details = {}
-            counter_dictionary = {}
-            sub_dir_path = os.path.join(phone_dir, dir_name, 'matrix')
-            time_frame_path = os.path.join(phone_dir, dir_name, 'matrix', dir_name + '_time_frame.txt')
-            if os.path.exists(time_frame_path):
-                # print(dir_name+'_time_frame.txt')
-
-                with open(time_frame_path, 'r') as file:
-                    for line in file:
-                        single_line = line.strip()
-                        # print(single_line)
-                        word = ' '.join(re.findall(r"'([^']*)'", single_line))
-                        phone = shlex.split(single_line)[1].split('-')[1]
-                        start_time = shlex.split(single_line)[2].split(':')[1]
-                        end_time = shlex.split(single_line)[3].split(':')[1]
-                        start_frame = shlex.split(single_line)[4].split(':')[1]
-                        end_frame = shlex.split(single_line)[5].split(':')[1]
-                        # print(f"prompt: {word}, phone: {phone}, start_time: {start_time}, end_time: {end_time}, "
-                        # f"start_frame: {start_frame}, end_frame: {end_frame}")
-                        if word not in text_details.keys():
-                            text_details[word] = []
-
-                        sliced_matrix_path = extract_sliced_matrix(sub_dir_path, dir_name, word, phone, start_frame,
-                                                                   end_frame, counter_dictionary)
-
-                        text_details[word].append(
-                            {'prompt': word, 'phone': phone, 'start_time': start_time, 'end_time': end_time,
-                             'start_frame': start_frame, 'end_frame': end_frame,
-                             'sliced_matrix_path': sliced_matrix_path})
-
-                for index, person_details in enumerate(json_data[dir_name]):
-                    json_data[dir_name][index]['matrix_file_path'] = os.path.join(sub_dir_path, dir_name + '_' + text_details[person_details['text']][0]['prompt'] + '.npy')
-                    json_data[dir_name][index]['text'] = text_details[person_details['text']]
-                # print(json_data)
+        if dir_name != ".DS_Store" and (speakers is None or dir_name in speakers):
+            extract_speaker(phone_dir, dir_name, json_data, write_slices)
     if save:
         with open(directory + '/master_sliced_data.json', 'w') as json_file:
             json.dump(json_data, json_file, indent=2)
 
 
-def main():
+def speaker_fingerprint(phone_dir, dir_name, speaker_rows):
+    """
+    Hash of everything a speaker's manifest entries are built from: the
+    speaker's file_paths.csv rows, and the size and modification time of every
+    input file in its matrix directory (the _time_frame.txt and the Praat
+    utterance matrices). The .npy files written by the slicing are left out.
+    """
+
+    digest = hashlib.sha1(json.dumps(speaker_rows, sort_keys=True).encode())
+    sub_dir_path = os.path.join(phone_dir, dir_name, 'matrix')
+    if os.path.isdir(sub_dir_path):
+        for entry in sorted(os.scandir(sub_dir_path), key=lambda entry: entry.name):
+            if entry.is_file() and not entry.name.endswith('.npy'):
+                stat = entry.stat()
+                digest.update(f'{entry.name}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()
+
+
+def incremental_extract(phone_dir, json_data, write_slices=True):
+    """
+    Rebuilds master_sliced_data.json re-slicing only the speakers whose inputs
+    changed since the last run (see speaker_fingerprint). The other speakers'
+    entries are taken from the existing manifest. The fingerprints are kept in
+    manifest_state.json next to it.
+    """
+
+    sliced_json_path = directory + '/master_sliced_data.json'
+    previous_data = {}
+    previous_state = {}
+    if os.path.exists(sliced_json_path) and os.path.exists(state_file_path):
+        with open(sliced_json_path, 'r') as json_file:
+            previous_data = json.load(json_file)
+        with open(state_file_path, 'r') as state_file:
+            previous_state = json.load(state_file)
+
+    # The fingerprints are taken from the CSV rows before extraction fills them in
+    state = {dir_name: speaker_fingerprint(phone_dir, dir_name, rows) for dir_name, rows in json_data.items()}
+    changed = {dir_name for dir_name in json_data
+               if dir_name not in previous_data or previous_state.get(dir_name) != state[dir_name]}
+    for dir_name in json_data:
+        if dir_name not in changed:
+            json_data[dir_name] = previous_data[dir_name]
+    print(f"{len(changed)} of {len(json_data)} speakers changed: {sorted(changed)}")
+
+    extract_frame(phone_dir, json_data, write_slices=write_slices, speakers=changed)
+    with open(state_file_path, 'w') as state_file:
+        json.dump(state, state_file, indent=2)
+
+
+def main(write_slices=True, incremental=False, processes=None):
     convert_csv_to_json()
     json_file = open(json_file_path, 'r')
     json_data = json.load(json_file)
-    extract_frame(directory + 'phone_data', json_data)
+    # All text matrices are parsed here, the slicing only reads .npy files
+    convert_matrices(directory + 'phone_data', processes)
+    if incremental:
+        incremental_extract(directory + 'phone_data', json_data, write_slices=write_slices)
+    else:
+        extract_frame(directory + 'phone_data', json_data, write_slices=write_slices)
     json_file.close()
 
 
@@ -0,0 +1,186 @@
+import numpy as np
+import os
+import itertools
+import pickle
+import pandas as pd
+import plotly.express as px
+from concurrent.futures import ProcessPoolExecutor
+import dtw_engine
+import dtw_mfcc_phone
+import dtw_ema_ms_phone
+import feature_store
+import matrix_cache
+
+output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+
+# Sequences of the matrix being computed, set once in every worker process
+_worker_sequences = {}
+
+
+def _init_worker(sequences):
+    global _worker_sequences
+    _worker_sequences = sequences
+
+
+def unit_frames(matrix):
+    # Stored (features, frames) MFCC matrix as unit (frames, features) rows
+    return dtw_engine.normalize_rows(matrix.T)
+
+
+def mfcc_phone_cost(root_unit, other_unit):
+    # Same cost as compare_phone_matrix, pairs DTW cannot align get nan
+    try:
+        return dtw_engine.dtw_cost(dtw_engine.local_cost_matrix(root_unit, other_unit, normalized=True))
+    except ValueError as error:
+        print(f"DTW failed: {error}")
+        return np.nan
+
+
+def mfcc_word_cost(root_unit, other_unit):
+    # Same cost as compare_word_matrix
+    return dtw_engine.sequence_dtw_cost(root_unit, other_unit, normalized=True)
+
+
+pair_costs = {'mfcc': mfcc_phone_cost, 'mfcc_word': mfcc_word_cost, 'ema': dtw_ema_ms_phone.pair_cost}
+
+# Applied once to every speaker's matrix before the pairs are dealt out. The
+# EMA sensors are picked per pair, so those matrices are used as they are.
+sequence_preparers = {'mfcc': unit_frames, 'mfcc_word': unit_frames}
+
+
+def _pair_worker(task):
+    feature, first, second = task
+    return pair_costs[feature](_worker_sequences[first], _worker_sequences[second])
+
+
+def distance_matrix(sequences, feature='mfcc', processes=None):
+    """
+    Symmetric speaker x speaker DTW cost matrix. `sequences` maps a speaker to
+    its matrix in the stored layout, `feature` picks the pair cost from
+    `pair_costs`. Only the upper triangle is computed, the pairs are spread
+    over a process pool and every matrix is sent to each worker once.
+    """
+
+    speakers = sorted(sequences.keys())
+    if feature in sequence_preparers:
+        sequences = {speaker: sequence_preparers[feature](sequence) for speaker, sequence in sequences.items()}
+    tasks = [(feature, first, second) for first, second in itertools.combinations(speakers, 2)]
+    if processes == 1:
+        _init_worker(sequences)
+        costs = [_pair_worker(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(sequences,)) as executor:
+            costs = list(executor.map(_pair_worker, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    matrix = pd.DataFrame(0.0, index=speakers, columns=speakers)
+    for (feature, first, second), cost in zip(tasks, costs):
+        matrix.loc[first, second] = cost
+        matrix.loc[second, first] = cost
+    return matrix
+
+
+def mfcc_phone_sequences(phone_dict, phone, word):
+    # One token per speaker like the root runs, the chosen tokens are saved for
+    # every speaker so the EMA runs pick the same ones
+    unique_phone_dict = dtw_mfcc_phone.get_unique_matrix_dict(phone_dict)
+    for speaker in unique_phone_dict.keys():
+        dtw_mfcc_phone.save_keys(unique_phone_dict, speaker, phone, word)
+    return {speaker: feature_store.load_matrix(path) for speaker, path in unique_phone_dict.items()}
+
+
+def ema_phone_sequences(ema_phone_dict, phone, word, root_person):
+    matrix_path_dict = dtw_ema_ms_phone.get_acoustic_keys(ema_phone_dict, root_person, word, phone)
+    return dtw_ema_ms_phone.extract_ema_matrix(matrix_path_dict, phone)
+
+
+def save_matrix(matrix, word, label, feature):
+    with open(os.path.join(output_directory, 'phone_data', f'{word}_{label}_{feature}_matrix.pkl'), 'wb') as file:
+        pickle.dump(matrix, file)
+
+
+def root_slice(matrix, root_person, prompt):
+    """
+    The row of `root_person` in the layout compare_phone_matrix and
+    stack_matrix return: one row per other speaker.
+    """
+
+    row = matrix.loc[root_person].drop(root_person)
+    return pd.DataFrame({'audio_files': row.index, 'alignment_cost': row.values, 'prompt': prompt})
+
+
+def bar_chart(data, root_person, label, graph_dir, file_name):
+    sorted_data = data.sort_values(by='audio_files')
+    fig = px.bar(sorted_data, x='audio_files', y='alignment_cost')
+    fig.update_layout(title_text=f'{root_person} similarity Bar plot for \'{label}\'')
+    fig.write_image(os.path.join(output_directory, graph_dir, root_person, file_name + '.png'))
+
+
+def mfcc_main(phone_list, word, processes=None, save=False):
+    phones_dict, word_dict = dtw_mfcc_phone.process_json(word)
+    word_matrix = distance_matrix({speaker: matrix_cache.load(path) for speaker, path in word_dict.items()}, 'mfcc_word',
+                                  processes)
+    save_matrix(word_matrix, word, word, 'mfcc')
+    phone_matrices = {}
+    for phone in phone_list:
+        phone_matrices[phone] = distance_matrix(mfcc_phone_sequences(phones_dict[phone], phone, word), 'mfcc',
+                                                processes)
+        save_matrix(phone_matrices[phone], word, phone, 'mfcc')
+
+    # The per-root charts of dtw_mfcc_phone.main are slices of the matrices
+    for root_person in word_matrix.index:
+        master_frame = root_slice(word_matrix, root_person, word)
+        for phone, matrix in phone_matrices.items():
+            if root_person in matrix.index:
+                data = root_slice(matrix, root_person, phone)
+                if save:
+                    bar_chart(data, root_person, phone, 'acoustic_graph', phone + '_T1')
+                master_frame = pd.concat([master_frame, data], ignore_index=True)
+        dtw_mfcc_phone.save_df(master_frame, root_person, word)
+        dtw_mfcc_phone.line_graph(master_frame, root_person, word)
+    return word_matrix, phone_matrices
+
+
+def saved_keys_speaker(phone_list, word):
+    # First speaker with the {word}_{phone}_list.pkl token lists of every phone,
+    # the lists mfcc_main saves are the same for all speakers
+    phone_data_directory = os.path.join(output_directory, 'phone_data')
+    for speaker in sorted(os.listdir(phone_data_directory)):
+        if all(os.path.exists(os.path.join(phone_data_directory, speaker, f'{word}_{phone}_list.pkl'))
+               for phone in phone_list):
+            return speaker
+    raise FileNotFoundError(f"No saved '{word}' token lists of {phone_list} in {phone_data_directory}, "
+                            f"run main with feature='mfcc' first")
+
+
+def ema_main(phone_list, word, root_person=None, processes=None):
+    if root_person is None:
+        root_person = saved_keys_speaker(phone_list, word)
+    ema_path_dict = dtw_ema_ms_phone.process_json()
+    phone_matrices = {}
+    for phone in phone_list:
+        sequences = ema_phone_sequences(ema_path_dict[phone], phone, word, root_person)
+        phone_matrices[phone] = distance_matrix(sequences, 'ema', processes)
+        save_matrix(phone_matrices[phone], word, phone, 'ema')
+
+    for speaker in phone_matrices[phone_list[0]].index:
+        master_frame = pd.DataFrame()
+        for phone, matrix in phone_matrices.items():
+            if speaker in matrix.index:
+                master_frame = pd.concat([master_frame, root_slice(matrix, speaker, 'ema_' + phone)],
+                                         ignore_index=True)
+        dtw_ema_ms_phone.bar_chart(master_frame, speaker, word)
+    return phone_matrices
+
+
+def main(phone_list, word, feature='mfcc', root_person=None, processes=None):
+    if feature == 'mfcc':
+        return mfcc_main(phone_list, word, processes)
+    # The EMA tokens are the ones saved by the MFCC run, any speaker's list
+    # works. Without a root_person the first speaker with saved lists is used
+    return ema_main(phone_list, word, root_person, processes)
+
+
+if __name__ == '__main__':
+    main(['f', 'iy', 'd'], 'feed', 'mfcc')
+    main(['f', 'iy', 'd'], 'feed', 'ema', root_person='MC04')
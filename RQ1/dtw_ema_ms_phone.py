@@ -1,17 +1,17 @@
 import h5py
-import json
 import random
 import numpy as np
 import pandas as pd
-from dtwParallel import dtw_functions
-from scipy.spatial import distance as d
 import os
 import sys
 import plotly.express as px
 import plotly.graph_objects as go
 import pickle
-
-json_file_path = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/master_sliced_ema_data.json'
+import dtw_engine
+import ema_store
+import catalog
+import matrix_cache
+import cartesian_spherical
 
 phones_list = ["ih", "iy", "eh", "ah", "ae", "ao", "ay", "ax", "aa", "er", "ey", "uw", "ow", "aw", "uh", "oy", "t", "r",
                "n", "l", "s", "d", "k", "p", "m", "z", "w", "b", "f", "dh", "g", "v", "y", "ng", "sh", "ch", "jh", "th",
@@ -31,58 +31,76 @@ num_to_sensorMapping = {0: 'Tongue back', 1: 'Tongue middle', 2: 'Tongue tip',
                         6: 'Right lip'}
 
 
-def check_zero(matrix, sensor_name):
-    # Check if any row is filled with zeros
-    any_row_filled_with_zeros = np.any((matrix == 0).all(axis=1))
+def sensor_mask(ema):
+    # Sensors of a (sensors, channels, frames) recording without an all-zero
+    # frame, checked for all sensors at once
+    return ~np.any(np.all(ema == 0, axis=1), axis=1)
+
+
+def stack_pair(root_ema, other_ema, other_person=None, root_mask=None, other_mask=None, dtype=np.float32):
+    """
+    Side by side (frames, channels * sensors) matrices of the sensors that
+    have no zero frame in either recording, in sensor order, gathered into
+    preallocated arrays. The first valid sensor keeps only its last channel:
+    the original hstack onto a 3 column np.empty seed cut off [:, 5:], and
+    the costs depend on those columns.
+    """
+
+    if root_mask is None:
+        root_mask = sensor_mask(root_ema)
+    if other_mask is None:
+        other_mask = sensor_mask(other_ema)
+    valid = root_mask & other_mask
+    if other_person is not None:
+        for sensor_num in np.flatnonzero(~valid):
+            print('!' * 10, f'{other_person} OTHER DATA {num_to_sensorMapping[sensor_num]} MATRIX HAS ZERO\'S',
+                  '!' * 10)
+
+    channels = root_ema.shape[1]
+    rows = (np.flatnonzero(valid)[:, None] * channels + np.arange(channels)).ravel()[2:]
+    stacked = []
+    for ema in (root_ema, other_ema):
+        matrix = np.empty((ema.shape[2], len(rows)), dtype=dtype)
+        matrix.T[...] = ema.reshape(-1, ema.shape[2])[rows]
+        stacked.append(matrix)
+    return stacked[0], stacked[1]
 
-    # Print the result
-    if any_row_filled_with_zeros:
-        # print(f" IGNORING {sensor_name}: At least one row is filled with zeros")
-        return True
-    else:
-        # print("No row is filled with zeros.")
-        return False
 
+def pair_dtw_cost(root_matrix, other_matrix):
+    # Cosine DTW of two stacked matrices, the local distances come from one
+    # matrix product instead of a scipy call per frame pair
+    return dtw_engine.dtw_cost(dtw_engine.local_cost_matrix(root_matrix, other_matrix, 'cosine'))
 
-def dtw(root_matrix, other_matrix, root_person, other_person, row_list, phone):
-    dtw_distance = dtw_functions.dtw(root_matrix, other_matrix, type_dtw="d",
-                                     local_dissimilarity=d.cosine, MTS=True)
-    print("#" * 10, f"DTW DISTANCE FOR {root_person} AND {other_person} IS {dtw_distance}", "#" * 10)
-    row_list.append({'audio_files': other_person, 'alignment_cost': dtw_distance, 'prompt': 'ema_' + phone})
 
+def pair_cost(root_ema, other_ema):
+    root_matrix, other_matrix = stack_pair(root_ema, other_ema)
+    return pair_dtw_cost(root_matrix, other_matrix)
 
-def stack_matrix(ema_matrix_dict, root_person, phone, master_frame, save=False):
-    root_data = {}
-    root_matrix = []
-    del_col = 5
+
+def stack_matrix(ema_matrix_dict, root_person, phone, master_frame, save=False, masks=None):
+    root_ema = None
     for key, value in ema_matrix_dict.items():
         if root_person in key:
             print('*' * 10, f" ROOT PERSON {key}", '*' * 10)
-            root_matrix = np.empty((ema_matrix_dict[key][0, :, :].transpose().shape))
-            for num, sensor_name in num_to_sensorMapping.items():
-                if not check_zero(ema_matrix_dict[key][num, :, :].transpose(), sensor_name):
-                    root_data[sensor_name] = ema_matrix_dict[key][num, :, :].transpose()
-                else:
-                    print('!' * 10, f'CAUTION ROOT DATA {sensor_name} MATRIX HAS ZERO\'S', '!' * 10)
+            root_ema = ema_matrix_dict[key]
+            root_mask = masks[key] if masks is not None else sensor_mask(root_ema)
+            for num in np.flatnonzero(~root_mask):
+                print('!' * 10, f'CAUTION ROOT DATA {num_to_sensorMapping[num]} MATRIX HAS ZERO\'S', '!' * 10)
             del ema_matrix_dict[key]
             break
     row_list = []
+    local_costs = []
     for key, value in ema_matrix_dict.items():
         print("*" * 10, f"{key} OTHER SENSOR DATA", "*" * 10)
-        root_matrix_copy = root_matrix
-        other_matrix = np.empty((value[0, :, :].transpose().shape))
-        for sensor_num in num_to_sensorMapping.keys():
-            sensor_name = num_to_sensorMapping[sensor_num]
-            other_data = value[sensor_num, :, :].transpose()
-            if not check_zero(other_data, sensor_name) and sensor_name in root_data.keys():
-                root_matrix_copy = np.hstack((root_matrix_copy, root_data[sensor_name]))
-                other_matrix = np.hstack((other_matrix, other_data))
-            else:
-                print('!' * 10, f'{key} OTHER DATA {sensor_name} MATRIX HAS ZERO\'S', '!' * 10)
-        root_matrix_copy = root_matrix_copy[:, 5:]
-        other_matrix = other_matrix[:, 5:]
+        other_mask = masks[key] if masks is not None else sensor_mask(value)
+        root_matrix_copy, other_matrix = stack_pair(root_ema, value, key, root_mask, other_mask)
         print('-' * 20, f"SHAPE OF THE {root_person} AND {key}", root_matrix_copy.shape, other_matrix.shape, '-' * 20)
-        dtw(root_matrix_copy, other_matrix, root_person, key, row_list, phone)
+        local_costs.append(dtw_engine.local_cost_matrix(root_matrix_copy, other_matrix, 'cosine'))
+    # Every pair is compared on its own sensors, so the local costs are built
+    # per pair and all the alignments run in one batched sweep
+    for key, dtw_distance in zip(ema_matrix_dict.keys(), dtw_engine.padded_dtw_costs(local_costs)):
+        print("#" * 10, f"DTW DISTANCE FOR {root_person} AND {key} IS {dtw_distance}", "#" * 10)
+        row_list.append({'audio_files': key, 'alignment_cost': dtw_distance, 'prompt': 'ema_' + phone})
     print(row_list)
 
     df = pd.DataFrame(row_list)
@@ -111,16 +129,39 @@ def prep_ema(data):
     return sliced_ema_sd
 
 
-def extract_ema_matrix(ema_dict, phone):
+def read_ema(ema_file_path, phone):
+    with h5py.File(ema_file_path, 'r') as file:
+        data = file[phone]
+        return prep_ema(data[:])
+
+
+def extract_ema_matrix(ema_dict, phone, coordinates='cartesian'):
     ema_matrix_dict = {}
-    for key, ema_file_path in ema_dict.items():
-        with h5py.File(ema_file_path, 'r') as file:
-            data = file[phone]
-            ema_matrix_dict[key.split('_')[0]] = prep_ema(data[:])
+    if ema_store.has_slices(list(ema_dict.values())):
+        # Already sliced to the used sensors and channels, read in one bulk call
+        for key, ema in zip(ema_dict.keys(), ema_store.read_slices(list(ema_dict.values()))):
+            ema_matrix_dict[key.split('_')[0]] = ema
+    else:
+        for key, ema_file_path in ema_dict.items():
+            ema_matrix_dict[key.split('_')[0]] = matrix_cache.load(ema_file_path, lambda path: read_ema(path, phone),
+                                                    kind='ema')
+    if coordinates != 'cartesian':
+        # Compare the sensors in another coordinate system, e.g. 'spherical'
+        ema_matrix_dict = {key: cartesian_spherical.ema_coordinates(ema, coordinates)
+                           for key, ema in ema_matrix_dict.items()}
     print("EMA matrix is extracted and sliced successfully")
     return ema_matrix_dict
 
 
+def sensor_masks(ema_dict, ema_matrix_dict):
+    # Valid sensors of every recording, looked up in the EMA store's health
+    # index; only files the store does not cover are scanned for zero frames
+    dropouts = ema_store.sensor_dropouts(list(ema_dict.values()))
+    if dropouts is None:
+        return {key: sensor_mask(ema) for key, ema in ema_matrix_dict.items()}
+    return {key.split('_')[0]: fractions == 0 for key, fractions in zip(ema_dict.keys(), dropouts)}
+
+
 def sort_dictionary_keys(dictionary):
     sorted_keys = sorted(dictionary.keys())
     sorted_dict = {key: dictionary[key] for key in sorted_keys}
@@ -146,27 +187,8 @@ def get_acoustic_keys(phone_path_dict, root_person, word, phone):
 
 
 def process_json():
-    # Create a dictionary with keys and empty lists as values
-    phones_dictionary = {key: [] for key in phones_list}
-    person_dictionary = {}
-    with open(json_file_path, 'r') as json_file:
-        data_dict = json.load(json_file)
-        for dir_name, values in data_dict.items():
-            for person_prompts in values:
-                # print(type(person_prompts), dir_name)
-                for phones in person_prompts['text']:
-                    # print(phones)
-                    code = prompt_to_code[phones['prompt']]
-                    if dir_name + '_' + code + '_' + phones['phone'] not in person_dictionary.keys():
-                        person_dictionary[dir_name + '_' + code + '_' + phones['phone']] = []
-                    # print("KEY ", dir_name + '_' + phones['phone'], "VALUE ", phones['ema_file_path'])
-                    person_dictionary[dir_name + '_' + code + '_' + phones['phone']].append(phones['ema_file_path'])
-
-        for root_key in phones_dictionary.keys():
-            phones_dictionary[root_key] = {key: value for key, value in person_dictionary.items() if
-                                           root_key == key.split('_')[2]}
-
-    return phones_dictionary
+    # EMA slice paths per phone from the corpus catalog
+    return catalog.phone_paths(phones_list, 'ema_path')
 
 
 def line_graph(master_frame, root_person, word):
@@ -213,16 +235,18 @@ def bar_chart(master_frame, root_person, word):
     fig.write_image(os.path.join(output_directory, 'ema_graph', root_person, word + '_ema' + '.png'))
 
 
-def main(root_person, phone_list, word):
+def main(root_person, phone_list, word, coordinates='cartesian'):
     ema_path_dict = process_json()
     master_frame = pd.DataFrame()
     for phone in phone_list:
         matrix_path_dict = get_acoustic_keys(ema_path_dict[phone], root_person, word, phone)
-        ema_matrix_dict = extract_ema_matrix(matrix_path_dict, phone)
+        ema_matrix_dict = extract_ema_matrix(matrix_path_dict, phone, coordinates)
         sorted_ema_dict = sort_dictionary_keys(ema_matrix_dict)
         # print(sorted_ema_dict.keys())
-        master_frame = stack_matrix(sorted_ema_dict, root_person, phone, master_frame)
+        master_frame = stack_matrix(sorted_ema_dict, root_person, phone, master_frame,
+                                    masks=sensor_masks(matrix_path_dict, ema_matrix_dict))
     bar_chart(master_frame, root_person, word)
+    print("Matrix cache", matrix_cache.stats())
 
 
 if __name__ == '__main__':
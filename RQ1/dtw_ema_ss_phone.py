@@ -1,16 +1,16 @@
 import h5py
-import json
 import random
 import numpy as np
 import pandas as pd
-from dtwParallel import dtw_functions
-from scipy.spatial import distance as d
 import os
 import sys
 import plotly.express as px
 import pickle
-
-json_file_path = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/master_sliced_ema_data.json'
+import dtw_engine
+import ema_store
+import catalog
+import matrix_cache
+import cartesian_spherical
 
 phones_list = ["ih", "iy", "eh", "ah", "ae", "ao", "ay", "ay", "aa", "er", "ey", "uw", "ow", "aw", "uh", "oy", "t", "r",
                "n", "l", "s", "d", "k", "p", "m", "z", "w", "b", "f", "dh", "g", "v", "y", "ng", "sh", "ch", "jh", "th",
@@ -30,62 +30,74 @@ num_to_sensorMapping = {0: 'Tongue back', 1: 'Tongue middle', 2: 'Tongue tip',
                         6: 'Right lip'}
 
 
-def check_zero(matrix, sensor_name):
-    # Check if any row is filled with zeros
-    any_row_filled_with_zeros = np.any((matrix == 0).all(axis=1))
-
-    # Print the result
-    if any_row_filled_with_zeros:
-        #print(f" IGNORING {sensor_name}: At least one row is filled with zeros")
-        return True
+def sensor_costs(ema_matrix_dict, root_person, masks=None):
+    """
+    Cosine DTW cost of every sensor between the root speaker and every other
+    speaker, in one batched pass. The other recordings are stacked into a
+    zero padded (speakers, sensors, frames, 3) array and all sensor x speaker
+    local cost matrices come from one matmul. Returns a tidy table with one
+    row per sensor and speaker. Pairs where either recording has an all-zero
+    frame for the sensor get a nan score. `masks` gives the valid sensors of
+    every recording (see sensor_masks), else the arrays are scanned.
+    """
+
+    root_key = next((key for key in ema_matrix_dict if root_person in key), None)
+    if root_key is None:
+        print('!' * 10, f'NO EMA DATA FOR ROOT PERSON {root_person}', '!' * 10)
+        return pd.DataFrame(columns=['sensor', 'person_name', 'alignment_score'])
+    print('*' * 10, f" ROOT PERSON {root_key}", '*' * 10)
+    root_ema = np.asarray(ema_matrix_dict[root_key])
+    root_valid = masks[root_key] if masks is not None else ema_store.dropout_fraction(root_ema) == 0
+    for num in np.flatnonzero(~root_valid):
+        print('!' * 10, f'CAUTION ROOT DATA {num_to_sensorMapping[num]} MATRIX HAS ZERO\'S', '!' * 10)
+
+    other_keys = [key for key in ema_matrix_dict if key != root_key]
+    if not other_keys:
+        return pd.DataFrame(columns=['sensor', 'person_name', 'alignment_score'])
+    lengths = np.array([ema_matrix_dict[key].shape[2] for key in other_keys])
+    stacked = np.zeros((len(other_keys), len(num_to_sensorMapping), lengths.max(), 3))
+    for position, key in enumerate(other_keys):
+        stacked[position, :, :lengths[position]] = np.transpose(ema_matrix_dict[key], (0, 2, 1))
+    if masks is not None:
+        valid = np.array([masks[key] for key in other_keys]) & root_valid
     else:
-        #print("No row is filled with zeros.")
-        return False
-
-
-def compare_matrix(ema_matrix_dict, root_person, phone):
-    root_data = {}
-
-    for key, value in ema_matrix_dict.items():
-        if root_person in key:
-            print('*'*10, f" ROOT PERSON {key}", '*'*10)
-            for num, sensor_name in num_to_sensorMapping.items():
-                if not check_zero(ema_matrix_dict[key][num, :, :].transpose(), sensor_name):
-                    root_data[sensor_name] = ema_matrix_dict[key][num, :, :].transpose()
-                else:
-                    print('!' * 10, f'CAUTION ROOT DATA {sensor_name} MATRIX HAS ZERO\'S', '!' * 10)
-            del ema_matrix_dict[key]
-            break
-
-    for sensor_num in num_to_sensorMapping.keys():
-        row_list = []
-        sensor_flag = False
-        for key, value in ema_matrix_dict.items():
-            print("*" * 10, f"{key} OTHER SENSOR DATA", "*" * 10)
-            sensor_name = num_to_sensorMapping[sensor_num]
-            other_data = value[sensor_num, :, :].transpose()
-            if not check_zero(other_data, sensor_name) and sensor_name in root_data.keys():
-                sensor_flag = True
-                #print("Sensor name is ", sensor_name, "\tSensor data shape is ", other_data.shape)
-                dtw_distance = dtw_functions.dtw(root_data[sensor_name], other_data, type_dtw="d",
-                                                 local_dissimilarity=d.cosine, MTS=True)
-                print("#" * 10, f"DTW DISTANCE FOR {sensor_name} between {root_person} AND {key} IS {dtw_distance}", "#" * 10)
-                row_list.append({'person_name': key, 'alignment_score': dtw_distance})
-            else:
-                print('!' * 10, f' OTHER DATA {sensor_name} MATRIX HAS ZERO\'S', '!' * 10)
-
-        if sensor_flag:
-            df = pd.DataFrame(row_list)
+        valid = ~np.any(np.all(stacked == 0, axis=3), axis=2, where=np.arange(lengths.max()) < lengths[:, None, None])
+        valid &= root_valid
+
+    # (speakers, sensors, root frames, other frames) cosine distances
+    with np.errstate(invalid='ignore'):
+        root_unit = dtw_engine.normalize_rows(np.transpose(root_ema, (0, 2, 1)))
+        other_unit = dtw_engine.normalize_rows(stacked)
+        local_cost = np.clip(1.0 - root_unit[None] @ np.swapaxes(other_unit, 2, 3), 0.0, 2.0)
+    speakers, sensors, N, M = local_cost.shape
+    costs = dtw_engine.batched_dtw_costs(local_cost.reshape(-1, N, M), np.full(speakers * sensors, N),
+                                         np.repeat(lengths, sensors)).reshape(speakers, sensors)
+    costs[~valid] = np.nan
+
+    return pd.DataFrame({'sensor': np.tile(list(num_to_sensorMapping.values()), speakers),
+                         'person_name': np.repeat(other_keys, sensors),
+                         'alignment_score': costs.ravel()})
+
+
+def compare_matrix(ema_matrix_dict, root_person, phone, masks=None):
+    table = sensor_costs(ema_matrix_dict, root_person, masks)
+    print(table)
+
+    for sensor_name in num_to_sensorMapping.values():
+        df = table[(table['sensor'] == sensor_name) & table['alignment_score'].notna()]
+        if len(df):
             fig = px.bar(df, x='person_name', y='alignment_score')
             # Add a title to the graph
             fig.update_layout(
-                title_text=f'{root_person} Bar plot of {num_to_sensorMapping[sensor_num]} for the phone \'{phone}\'')
+                title_text=f'{root_person} Bar plot of {sensor_name} for the phone \'{phone}\'')
             # fig.show()
             root_person_graph_path = os.path.join(output_directory, 'ema_graph', root_person)
-            if num_to_sensorMapping[sensor_num] not in os.listdir(root_person_graph_path):
+            if sensor_name not in os.listdir(root_person_graph_path):
                 # Create the directory
-                os.makedirs(os.path.join(root_person_graph_path, num_to_sensorMapping[sensor_num]), exist_ok=False)
-            fig.write_image(os.path.join(root_person_graph_path, num_to_sensorMapping[sensor_num], phone + '.png'))
+                os.makedirs(os.path.join(root_person_graph_path, sensor_name), exist_ok=False)
+            fig.write_image(os.path.join(root_person_graph_path, sensor_name, phone + '.png'))
+        else:
+            print('!' * 10, f' OTHER DATA {sensor_name} MATRIX HAS ZERO\'S', '!' * 10)
 
 
 def prep_ema(data):
@@ -98,17 +110,39 @@ def prep_ema(data):
     return sliced_ema_sd
 
 
-def extract_ema_matrix(ema_dict, phone):
+def read_ema(ema_file_path, phone):
+    with h5py.File(ema_file_path, 'r') as file:
+        data = file[phone]
+        return prep_ema(data[:])
 
+
+def extract_ema_matrix(ema_dict, phone, coordinates='cartesian'):
     ema_matrix_dict = {}
-    for key, ema_file_path in ema_dict.items():
-        with h5py.File(ema_file_path, 'r') as file:
-            data = file[phone]
-            ema_matrix_dict[key] = prep_ema(data[:])
+    if ema_store.has_slices(list(ema_dict.values())):
+        # Already sliced to the used sensors and channels, read in one bulk call
+        for key, ema in zip(ema_dict.keys(), ema_store.read_slices(list(ema_dict.values()))):
+            ema_matrix_dict[key] = ema
+    else:
+        for key, ema_file_path in ema_dict.items():
+            ema_matrix_dict[key] = matrix_cache.load(ema_file_path, lambda path: read_ema(path, phone),
+                                                    kind='ema')
+    if coordinates != 'cartesian':
+        # Compare the sensors in another coordinate system, e.g. 'spherical'
+        ema_matrix_dict = {key: cartesian_spherical.ema_coordinates(ema, coordinates)
+                           for key, ema in ema_matrix_dict.items()}
     print("EMA matrix is extracted and sliced successfully")
     return ema_matrix_dict
 
 
+def sensor_masks(ema_dict, ema_matrix_dict):
+    # Valid sensors of every recording, looked up in the EMA store's health
+    # index; only files the store does not cover are scanned for zero frames
+    dropouts = ema_store.sensor_dropouts(list(ema_dict.values()))
+    if dropouts is None:
+        return {key: ema_store.dropout_fraction(ema) == 0 for key, ema in ema_matrix_dict.items()}
+    return {key: fractions == 0 for key, fractions in zip(ema_dict.keys(), dropouts)}
+
+
 def sort_dictionary_keys(dictionary):
     sorted_keys = sorted(dictionary.keys())
     sorted_dict = {key: dictionary[key] for key in sorted_keys}
@@ -133,35 +167,16 @@ def get_acoustic_keys(phone_path_dict, root_person, phone):
 
 
 def process_json():
-    # Create a dictionary with keys and empty lists as values
-    phones_dictionary = {key: [] for key in phones_list}
-    person_dictionary = {}
-    with open(json_file_path, 'r') as json_file:
-        data_dict = json.load(json_file)
-        for dir_name, values in data_dict.items():
-            for person_prompts in values:
-                # print(type(person_prompts), dir_name)
-                for phones in person_prompts['text']:
-                    # print(phones)
-                    code = prompt_to_code[phones['prompt']]
-                    if dir_name + '_' + code + '_' + phones['phone'] not in person_dictionary.keys():
-                        person_dictionary[dir_name + '_' + code + '_' + phones['phone']] = []
-                    # print("KEY ", dir_name + '_' + phones['phone'], "VALUE ", phones['ema_file_path'])
-                    person_dictionary[dir_name + '_' + code + '_' + phones['phone']].append(phones['ema_file_path'])
-
-        for root_key in phones_dictionary.keys():
-            phones_dictionary[root_key] = {key: value for key, value in person_dictionary.items() if
-                                           root_key == key.split('_')[2]}
-
-    return phones_dictionary
-
-
-def main(root_person, phone):
+    # EMA slice paths per phone from the corpus catalog
+    return catalog.phone_paths(phones_list, 'ema_path')
+
+
+def main(root_person, phone, coordinates='cartesian'):
     ema_path_dict = process_json()
     matrix_path_dict = get_acoustic_keys(ema_path_dict[phone], root_person, phone)
-    ema_matrix_dict = extract_ema_matrix(matrix_path_dict, phone)
+    ema_matrix_dict = extract_ema_matrix(matrix_path_dict, phone, coordinates)
     sorted_ema_dict = sort_dictionary_keys(ema_matrix_dict)
-    compare_matrix(sorted_ema_dict, root_person, phone)
+    compare_matrix(sorted_ema_dict, root_person, phone, sensor_masks(matrix_path_dict, ema_matrix_dict))
 
 
 if __name__ == '__main__':
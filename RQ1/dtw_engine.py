@@ -0,0 +1,763 @@
+import numpy as np
+import os
+import glob
+import time
+import itertools
+import pandas as pd
+import scipy.spatial.distance as dist
+import matrix_cache
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+
+
+def dtw_reference(dist_mat):
+    """
+    Original cell-by-cell DTW from dtw_mfcc_phone. Kept as the reference the
+    vectorized engine is checked against, it is too slow for the phone sweeps.
+    """
+
+    N, M = dist_mat.shape
+
+    # Initialize the cost matrix
+    cost_mat = np.zeros((N + 1, M + 1))
+    for i in range(1, N + 1):
+        cost_mat[i, 0] = np.inf
+    for i in range(1, M + 1):
+        cost_mat[0, i] = np.inf
+
+    # Fill the cost matrix while keeping traceback information
+    traceback_mat = np.zeros((N, M))
+    for i in range(N):
+        for j in range(M):
+            penalty = [
+                cost_mat[i, j],  # match (0)
+                cost_mat[i, j + 1],  # insertion (1)
+                cost_mat[i + 1, j]]  # deletion (2)
+            i_penalty = np.argmin(penalty)
+            cost_mat[i + 1, j + 1] = dist_mat[i, j] + penalty[i_penalty]
+            traceback_mat[i, j] = i_penalty
+
+    return _traceback(traceback_mat), cost_mat[1:, 1:]
+
+
+def _traceback(traceback_mat):
+    # Traceback from bottom right
+    N, M = traceback_mat.shape
+    i = N - 1
+    j = M - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        tb_type = traceback_mat[i, j]
+        if tb_type == 0:
+            # Match
+            i = i - 1
+            j = j - 1
+        elif tb_type == 1:
+            # Insertion
+            i = i - 1
+        elif tb_type == 2:
+            # Deletion
+            j = j - 1
+        path.append((i, j))
+    return path[::-1]
+
+
+def _init_cost_mat(N, M):
+    cost_mat = np.zeros((N + 1, M + 1))
+    cost_mat[1:, 0] = np.inf
+    cost_mat[0, 1:] = np.inf
+    return cost_mat
+
+
+def _fill_wavefront(dist_mat, cost_mat, traceback_mat):
+    # Cell (i, j) only depends on cells of the two previous anti-diagonals, so
+    # every cell with the same i + j can be filled in a single numpy step.
+    N, M = dist_mat.shape
+    width = M + 1
+    flat_cost = cost_mat.ravel()
+    flat_dist = dist_mat.ravel()
+    flat_tb = traceback_mat.ravel()
+    for diag in range(N + M - 1):
+        i = np.arange(max(0, diag - M + 1), min(N, diag + 1))
+        j = diag - i
+        # Index of cell (i + 1, j + 1) in the padded cost matrix
+        cell = (i + 1) * width + j + 1
+        penalty = np.stack((flat_cost[cell - width - 1],  # match (0)
+                            flat_cost[cell - width],  # insertion (1)
+                            flat_cost[cell - 1]))  # deletion (2)
+        # argmin keeps the first minimum (and the first nan) like the reference
+        i_penalty = np.argmin(penalty, axis=0)
+        flat_cost[cell] = flat_dist[i * M + j] + penalty[i_penalty, np.arange(len(i))]
+        flat_tb[i * M + j] = i_penalty
+
+
+if numba is not None:
+    @numba.njit(cache=True, inline='always')
+    def _argmin3(match, insertion, deletion):
+        # Same choice as np.argmin: first nan, otherwise first minimum
+        if np.isnan(match):
+            return 0, match
+        if np.isnan(insertion):
+            return 1, insertion
+        if np.isnan(deletion):
+            return 2, deletion
+        i_penalty, penalty = 0, match
+        if insertion < penalty:
+            i_penalty, penalty = 1, insertion
+        if deletion < penalty:
+            i_penalty, penalty = 2, deletion
+        return i_penalty, penalty
+
+    @numba.njit(cache=True)
+    def _fill_numba(dist_mat, cost_mat, traceback_mat):
+        N, M = dist_mat.shape
+        for i in range(N):
+            for j in range(M):
+                i_penalty, penalty = _argmin3(cost_mat[i, j], cost_mat[i, j + 1], cost_mat[i + 1, j])
+                cost_mat[i + 1, j + 1] = dist_mat[i, j] + penalty
+                traceback_mat[i, j] = i_penalty
+
+    @numba.njit(cache=True)
+    def _band_value(band_cost, lo, hi, i, j):
+        if i < 0 or j < 0:
+            return np.inf
+        if j < lo[i] or j >= hi[i]:
+            return np.inf
+        return band_cost[i, j - lo[i]]
+
+    @numba.njit(cache=True)
+    def _fill_band_numba(local_cost, lo, hi, band_cost, traceback_band):
+        N = local_cost.shape[0]
+        for i in range(N):
+            for j in range(lo[i], hi[i]):
+                if i == 0 and j == 0:
+                    match = 0.0
+                else:
+                    match = _band_value(band_cost, lo, hi, i - 1, j - 1)
+                i_penalty, penalty = _argmin3(match, _band_value(band_cost, lo, hi, i - 1, j),
+                                              _band_value(band_cost, lo, hi, i, j - 1))
+                band_cost[i, j - lo[i]] = local_cost[i, j - lo[i]] + penalty
+                traceback_band[i, j - lo[i]] = i_penalty
+
+    @numba.njit(cache=True)
+    def _row_step(previous, current, dist_row):
+        # One row (or column) of the padded cost matrix from the previous one
+        current[0] = np.inf
+        for j in range(len(dist_row)):
+            i_penalty, penalty = _argmin3(previous[j], previous[j + 1], current[j])
+            current[j + 1] = dist_row[j] + penalty
+
+    @numba.njit(cache=True)
+    def _subsequence_step(previous, previous_start, current, current_start, dist_col, j):
+        # Column j of the subsequence cost matrix (one value per template frame)
+        # from column j - 1. The first template frame may start at any frame,
+        # the start frame of the best path into each cell travels with it.
+        current[0] = dist_col[0]
+        current_start[0] = j
+        for i in range(1, len(dist_col)):
+            i_penalty, penalty = _argmin3(previous[i - 1], current[i - 1], previous[i])
+            current[i] = dist_col[i] + penalty
+            if i_penalty == 0:
+                current_start[i] = previous_start[i - 1]
+            elif i_penalty == 1:
+                current_start[i] = current_start[i - 1]
+            else:
+                current_start[i] = previous_start[i]
+
+
+def _subsequence_step_numpy(previous, previous_start, current, current_start, dist_col, j):
+    # Same column update as the numba _subsequence_step, the template frames
+    # depend on each other so the loop stays in Python
+    current[0] = dist_col[0]
+    current_start[0] = j
+    for i in range(1, len(dist_col)):
+        penalty = [previous[i - 1], current[i - 1], previous[i]]
+        i_penalty = np.argmin(penalty)
+        current[i] = dist_col[i] + penalty[i_penalty]
+        current_start[i] = (previous_start[i - 1], current_start[i - 1], previous_start[i])[i_penalty]
+
+
+def _resolve_backend(backend):
+    if backend is None:
+        return 'numba' if numba is not None else 'numpy'
+    if backend == 'numba' and numba is None:
+        raise ImportError("numba backend requested but numba is not installed")
+    if backend not in ('numba', 'numpy'):
+        raise ValueError(f"Unknown DTW backend '{backend}'")
+    return backend
+
+
+def dtw(dist_mat, backend=None):
+    """
+    Find minimum-cost path through matrix `dist_mat` using dynamic programming.
+
+    Same contract as `dtw_reference`: returns a list of path indices and the
+    cost matrix with the infinity edges stripped. The cost matrix is filled one
+    anti-diagonal at a time with numpy, or with a compiled loop when
+    `backend='numba'` (the default whenever numba is installed).
+    """
+
+    dist_mat = np.ascontiguousarray(dist_mat, dtype=np.float64)
+    N, M = dist_mat.shape
+
+    cost_mat = _init_cost_mat(N, M)
+    # The traceback only holds 0, 1 or 2
+    traceback_mat = np.zeros((N, M), dtype=np.uint8)
+    if _resolve_backend(backend) == 'numba':
+        _fill_numba(dist_mat, cost_mat, traceback_mat)
+    else:
+        _fill_wavefront(dist_mat, cost_mat, traceback_mat)
+
+    return _traceback(traceback_mat), cost_mat[1:, 1:]
+
+
+def _rolling_cost(N, M, local_cost, backend):
+    # Accumulated cost of cell (N - 1, M - 1) keeping O(min(N, M)) values.
+    # `local_cost(i, j)` returns the local distances of the cells (i, j), for
+    # index arrays on the numpy path and for the whole column j (i=None) on the
+    # numba path. Callers pass N <= M.
+    if _resolve_backend(backend) == 'numba':
+        # Two columns of the padded cost matrix, swapped after every column
+        previous = np.full(N + 1, np.inf)
+        current = np.empty(N + 1)
+        previous[0] = 0.0
+        for j in range(M):
+            _row_step(previous, current, np.ascontiguousarray(local_cost(None, j), dtype=np.float64))
+            previous, current = current, previous
+        return previous[N]
+
+    # Three anti-diagonals of the padded cost matrix, indexed by the row i
+    before_last = np.full(N + 1, np.inf)
+    last = np.full(N + 1, np.inf)
+    current = np.full(N + 1, np.inf)
+    before_last[0] = 0.0
+    for diag in range(2, N + M + 1):
+        i = np.arange(max(1, diag - M), min(N, diag - 1) + 1)
+        j = diag - i
+        current.fill(np.inf)
+        penalty = np.minimum(np.minimum(before_last[i - 1], last[i - 1]), last[i])
+        current[i] = local_cost(i - 1, j - 1) + penalty
+        before_last, last, current = last, current, before_last
+    return last[N]
+
+
+def dtw_cost(dist_mat, backend=None):
+    """
+    Alignment cost of `dist_mat` without the cost and traceback matrices, for
+    callers that only read cost_mat[-1, -1] of `dtw`. Keeps O(min(N, M))
+    accumulated costs.
+    """
+
+    dist_mat = np.asarray(dist_mat, dtype=np.float64)
+    if dist_mat.shape[0] > dist_mat.shape[1]:
+        dist_mat = dist_mat.T
+    N, M = dist_mat.shape
+    if N == 0:
+        raise ValueError("DTW needs at least one frame in each sequence")
+
+    def local_cost(i, j):
+        return dist_mat[:, j] if i is None else dist_mat[i, j]
+
+    return _rolling_cost(N, M, local_cost, backend)
+
+
+def sequence_dtw_cost(x_seq, y_seq, metric='cosine', backend=None, normalized=False):
+    """
+    Alignment cost between two (frames, features) sequences. The local
+    distances are computed on the fly, so neither the N x M distance matrix
+    nor any N x M cost matrix is allocated. Used for the sentence prompts.
+    The frames are normalized once up front unless `normalized` says the
+    sequences come from `normalize_rows` (or `normalized_matrix`) already.
+    """
+
+    if not normalized:
+        x_seq, y_seq = normalize_rows(x_seq, metric), normalize_rows(y_seq, metric)
+    if len(x_seq) > len(y_seq):
+        x_seq, y_seq = y_seq, x_seq
+    if len(x_seq) == 0:
+        raise ValueError("DTW needs at least one frame in each sequence")
+
+    def local_cost(i, j):
+        if i is None:
+            return pair_distance(x_seq, y_seq[j], metric, normalized=True)
+        return pair_distance(x_seq[i], y_seq[j], metric, normalized=True)
+
+    return _rolling_cost(len(x_seq), len(y_seq), local_cost, backend)
+
+
+def _connect_window(lo, hi, M):
+    # Make the per-row column ranges monotone and overlapping so that at least
+    # one warping path from (0, 0) to (N - 1, M - 1) stays inside the window.
+    lo = np.maximum.accumulate(np.clip(lo, 0, M - 1))
+    hi = np.maximum.accumulate(np.clip(hi, 1, M))
+    lo[0] = 0
+    hi[-1] = M
+    hi = np.maximum(hi, lo + 1)
+    hi[:-1] = np.maximum(hi[:-1], lo[1:])
+    return lo.astype(np.intp), hi.astype(np.intp)
+
+
+def sakoe_chiba_window(N, M, radius):
+    """
+    Column range [lo, hi) of every row for a Sakoe-Chiba band of `radius`
+    frames around the diagonal joining (0, 0) and (N - 1, M - 1).
+    """
+
+    i = np.arange(N)
+    center = i * (M - 1) / (N - 1) if N > 1 else np.zeros(N)
+    lo = np.ceil(center - radius).astype(np.intp)
+    hi = np.floor(center + radius).astype(np.intp) + 1
+    return _connect_window(lo, hi, M)
+
+
+def itakura_window(N, M, max_slope):
+    """
+    Column range [lo, hi) of every row for an Itakura parallelogram with local
+    slope between 1 / `max_slope` and `max_slope`. When the length ratio of the
+    two sequences is larger than `max_slope` the parallelogram has no path, the
+    window is then widened just enough to connect the two corners.
+    """
+
+    if max_slope <= 1:
+        raise ValueError("Itakura max_slope has to be larger than 1")
+    i = np.arange(N)
+    lower = np.maximum(i / max_slope, (M - 1) - max_slope * (N - 1 - i))
+    upper = np.minimum(max_slope * i, (M - 1) - (N - 1 - i) / max_slope)
+    lo = np.ceil(lower - 1e-9).astype(np.intp)
+    hi = np.floor(upper + 1e-9).astype(np.intp) + 1
+    return _connect_window(lo, hi, M)
+
+
+def get_window(N, M, window, band):
+    if window == 'sakoe_chiba':
+        return sakoe_chiba_window(N, M, band)
+    if window == 'itakura':
+        return itakura_window(N, M, band)
+    raise ValueError(f"Unknown DTW window '{window}'")
+
+
+def window_label(window, band):
+    # Value stored next to each alignment_cost so results of different runs
+    # can be told apart
+    if window is None:
+        return 'full'
+    return f'{window}_{band}'
+
+
+def normalize_rows(sequence, metric='cosine'):
+    """
+    Rows of a (frames, features) sequence prepared once for `metric`: unit
+    rows for cosine, centred unit rows for correlation, unchanged for
+    euclidean. Cosine and correlation distances are then 1 - dot product.
+    All-zero frames become nan rows, like scipy's distances for them.
+    """
+
+    sequence = np.asarray(sequence, dtype=np.float64)
+    if metric == 'correlation':
+        sequence = sequence - sequence.mean(axis=-1, keepdims=True)
+    if metric in ('cosine', 'correlation'):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sequence / np.linalg.norm(sequence, axis=-1, keepdims=True)
+    if metric == 'euclidean':
+        return sequence
+    raise ValueError(f"Unknown local distance '{metric}'")
+
+
+def normalized_matrix(path, metric='cosine', loader=np.load, version=None):
+    # Stored (features, frames) matrix of `path` as normalized frames. Kept in
+    # the matrix cache, so every file is normalized once however many pairs
+    # it is part of. A custom `loader` needs the `version` of its source, see
+    # matrix_cache.load
+    return matrix_cache.load(path, lambda path: normalize_rows(loader(path).T, metric),
+                             kind='normalized_' + metric, version=version)
+
+
+def local_cost_matrix(x_seq, y_seq, metric='cosine', normalized=False):
+    """
+    N x M local distances between two (frames, features) sequences as one
+    matrix product, the same values as scipy's cdist. Pass `normalized=True`
+    when both sequences already went through `normalize_rows`.
+    """
+
+    if not normalized:
+        x_seq, y_seq = normalize_rows(x_seq, metric), normalize_rows(y_seq, metric)
+    if metric in ('cosine', 'correlation'):
+        return np.clip(1.0 - x_seq @ y_seq.T, 0.0, 2.0)
+    if metric == 'euclidean':
+        squared = (np.einsum('nd,nd->n', x_seq, x_seq)[:, None] + np.einsum('md,md->m', y_seq, y_seq)[None, :]
+                   - 2.0 * (x_seq @ y_seq.T))
+        return np.sqrt(np.maximum(squared, 0.0))
+    raise ValueError(f"Unknown local distance '{metric}'")
+
+
+def pair_distance(x_rows, y_rows, metric, normalized=False):
+    # Distance between matching rows of x_rows and y_rows (broadcast over the
+    # leading axes), scipy's cosine distance gives nan for all-zero frames too
+    if not normalized:
+        x_rows, y_rows = normalize_rows(x_rows, metric), normalize_rows(y_rows, metric)
+    if metric in ('cosine', 'correlation'):
+        return 1.0 - np.einsum('...d,...d->...', x_rows, y_rows)
+    if metric == 'euclidean':
+        diff = x_rows - y_rows
+        return np.sqrt(np.einsum('...d,...d->...', diff, diff))
+    raise ValueError(f"Unknown local distance '{metric}'")
+
+
+def band_local_cost(x_seq, y_seq, lo, hi, metric='cosine'):
+    """
+    Local distances of the in-band cells only, stored as an (N, W) array where
+    column k of row i is frame lo[i] + k of `y_seq`. Cells past hi[i] are inf.
+    """
+
+    x_seq, y_seq = normalize_rows(x_seq, metric), normalize_rows(y_seq, metric)
+    width = int((hi - lo).max())
+    cols = lo[:, None] + np.arange(width)
+    in_band = cols < hi[:, None]
+    local_cost = pair_distance(x_seq[:, None, :], y_seq[np.minimum(cols, len(y_seq) - 1)], metric, normalized=True)
+    local_cost[~in_band] = np.inf
+    return local_cost
+
+
+def _fill_band_wavefront(local_cost, lo, hi, band_cost, traceback_band):
+    # Same anti-diagonal sweep as _fill_wavefront, restricted to the rows whose
+    # band intersects the diagonal. Since lo and hi are non-decreasing these
+    # rows form one contiguous range. The band is read through a copy padded
+    # with an inf row on top and an inf column on each side, so neighbours that
+    # fall outside the window need no masking.
+    N, W = local_cost.shape
+    M = hi[-1]
+    padded = np.full((N + 1, W + 2), np.inf)
+    flat_padded = padded.ravel()
+    row_lo = np.concatenate(([0], lo))
+    rows = np.arange(N)
+    first_cell = rows + lo
+    end_cell = rows + hi
+    for diag in range(N + M - 1):
+        start = np.searchsorted(end_cell, diag, side='right')
+        stop = np.searchsorted(first_cell, diag, side='right')
+        i = rows[start:stop]
+        j = diag - i
+        above = i * (W + 2) + 1
+        here = above + W + 2
+        penalty = np.stack((
+            flat_padded[above + np.clip(j - 1 - row_lo[i], -1, W)],  # match (0)
+            flat_padded[above + np.clip(j - row_lo[i], -1, W)],  # insertion (1)
+            flat_padded[here + np.clip(j - 1 - lo[i], -1, W)]))  # deletion (2)
+        penalty[0, (i == 0) & (j == 0)] = 0.0
+        i_penalty = np.argmin(penalty, axis=0)
+        k = j - lo[i]
+        cost = local_cost[i, k] + penalty[i_penalty, np.arange(len(i))]
+        flat_padded[here + k] = cost
+        band_cost[i, k] = cost
+        traceback_band[i, k] = i_penalty
+
+
+def _band_traceback(traceback_band, lo, M):
+    N = traceback_band.shape[0]
+    i = N - 1
+    j = M - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        tb_type = traceback_band[i, j - lo[i]]
+        if tb_type == 0:
+            i = i - 1
+            j = j - 1
+        elif tb_type == 1:
+            i = i - 1
+        elif tb_type == 2:
+            j = j - 1
+        path.append((i, j))
+    return path[::-1]
+
+
+def dtw_band(local_cost, lo, hi, backend=None):
+    """
+    DTW restricted to the window given by the per-row column ranges [lo, hi).
+    `local_cost` is the compact (N, W) array from `band_local_cost`, so memory
+    is O(N * W) instead of O(N * M). Returns the path and the alignment cost.
+    """
+
+    local_cost = np.ascontiguousarray(local_cost, dtype=np.float64)
+    band_cost = np.full(local_cost.shape, np.inf)
+    traceback_band = np.zeros(local_cost.shape, dtype=np.uint8)
+    if _resolve_backend(backend) == 'numba':
+        _fill_band_numba(local_cost, lo, hi, band_cost, traceback_band)
+    else:
+        _fill_band_wavefront(local_cost, lo, hi, band_cost, traceback_band)
+
+    M = int(hi[-1])
+    return _band_traceback(traceback_band, lo, M), band_cost[-1, M - 1 - lo[-1]]
+
+
+def banded_dtw(x_seq, y_seq, window='sakoe_chiba', band=None, metric='cosine', backend=None):
+    """
+    Window-constrained DTW between two (frames, features) sequences. `window`
+    is 'sakoe_chiba' (`band` is the radius in frames), 'itakura' (`band` is
+    the maximum slope) or 'fastdtw' (`band` is the refinement radius, see
+    `fast_dtw`). Only the in-band local distances are computed.
+    Returns the path and the alignment cost.
+    """
+
+    if band is None:
+        raise ValueError(f"A band has to be given for the '{window}' window")
+    if window == 'fastdtw':
+        return fast_dtw(x_seq, y_seq, band, metric=metric, backend=backend)
+    lo, hi = get_window(len(x_seq), len(y_seq), window, band)
+    return dtw_band(band_local_cost(x_seq, y_seq, lo, hi, metric), lo, hi, backend=backend)
+
+
+def subsequence_costs(template, frames, metric='cosine', backend=None):
+    """
+    Open-begin/open-end DTW of a (frames, features) `template` against a
+    stream of feature vectors. For every incoming frame yields the start frame
+    and the cost of the best alignment of the whole template that ends on that
+    frame. Only two columns of template length are kept, so `frames` can be a
+    full utterance matrix or any iterable of frames.
+    """
+
+    template = normalize_rows(template, metric)
+    if len(template) == 0:
+        raise ValueError("Subsequence DTW needs at least one template frame")
+    step = _subsequence_step if _resolve_backend(backend) == 'numba' else _subsequence_step_numpy
+    previous = np.full(len(template), np.inf)
+    current = np.empty(len(template))
+    previous_start = np.zeros(len(template), dtype=np.intp)
+    current_start = np.zeros(len(template), dtype=np.intp)
+    for j, frame in enumerate(frames):
+        dist_col = np.ascontiguousarray(pair_distance(template, normalize_rows(frame, metric), metric,
+                                                      normalized=True), dtype=np.float64)
+        step(previous, previous_start, current, current_start, dist_col, j)
+        yield int(current_start[-1]), float(current[-1])
+        previous, current = current, previous
+        previous_start, current_start = current_start, previous_start
+
+
+def subsequence_dtw(template, utterance, metric='cosine', backend=None):
+    """
+    Locate `template` inside `utterance`, both (frames, features). Returns the
+    start frame, the end frame (exclusive, the same convention as the
+    matrix[:, start_frame:end_frame] slices of csv_to_json) and the cost of the
+    best match. Ends with a nan cost are skipped.
+    """
+
+    best_start, best_end, best_cost = 0, 0, np.nan
+    for end, (start, cost) in enumerate(subsequence_costs(template, utterance, metric, backend)):
+        if not np.isnan(cost) and (np.isnan(best_cost) or cost < best_cost):
+            best_start, best_end, best_cost = start, end + 1, cost
+    return best_start, best_end, best_cost
+
+
+def coarsen(sequence):
+    # Half resolution sequence, every pair of frames is averaged and an odd
+    # last frame is kept as it is
+    half = len(sequence) // 2
+    shrunk = (sequence[0:2 * half:2] + sequence[1:2 * half:2]) / 2
+    if len(sequence) % 2:
+        shrunk = np.vstack((shrunk, sequence[-1:]))
+    return shrunk
+
+
+def project_window(path, N, M, radius):
+    """
+    Column range [lo, hi) of every row of the N x M grid covered by the
+    low-resolution `path` projected to twice the resolution and widened by
+    `radius` cells in every direction.
+    """
+
+    path = np.asarray(path)
+    low_rows = path[:, 0].max() + 1
+    # First and last column the low-resolution path visits in each of its rows
+    first_col = np.full(low_rows, np.iinfo(np.intp).max)
+    last_col = np.full(low_rows, -1)
+    np.minimum.at(first_col, path[:, 0], path[:, 1])
+    np.maximum.at(last_col, path[:, 0], path[:, 1])
+
+    # Low-resolution row k covers high-resolution rows 2k - radius ... 2k + 1 +
+    # radius, the path is monotone so the extreme columns of the rows covering
+    # row r come from the first and the last of them
+    rows = np.arange(N)
+    first_row = np.clip((rows - radius) // 2, 0, low_rows - 1)
+    last_row = np.clip((rows + radius) // 2, 0, low_rows - 1)
+    lo = 2 * first_col[first_row] - radius
+    hi = 2 * last_col[last_row] + 2 + radius
+    return _connect_window(lo, hi, M)
+
+
+def fast_dtw(x_seq, y_seq, radius=1, metric='cosine', backend=None):
+    """
+    Approximate DTW in the style of FastDTW (Salvador and Chan, 2007). Both
+    sequences are halved recursively, aligned at the coarsest level with full
+    DTW, and the path is projected back up one level at a time, only the cells
+    within `radius` of the projected path are evaluated. Runs in time linear
+    in the sequence length for a fixed radius. Returns the path and the cost.
+    """
+
+    x_seq = np.asarray(x_seq, dtype=np.float64)
+    y_seq = np.asarray(y_seq, dtype=np.float64)
+    N, M = len(x_seq), len(y_seq)
+    min_size = radius + 2
+    if N <= min_size or M <= min_size:
+        lo, hi = np.zeros(N, dtype=np.intp), np.full(N, M, dtype=np.intp)
+    else:
+        low_path, low_cost = fast_dtw(coarsen(x_seq), coarsen(y_seq), radius, metric, backend)
+        lo, hi = project_window(low_path, N, M, radius)
+    return dtw_band(band_local_cost(x_seq, y_seq, lo, hi, metric), lo, hi, backend=backend)
+
+
+def fast_dtw_report(phone_data_dir, radii=(1, 5, 10, 20), metric='cosine'):
+    """
+    Error of `fast_dtw` against exact DTW on the utterance matrices in
+    `phone_data_dir` (<speaker>/matrix/<speaker>_<prompt>.npy), every pair of
+    speakers per prompt. Returns one row per prompt and radius with the mean
+    and maximum relative error and the time spent, to pick a radius per prompt.
+    """
+
+    by_prompt = {}
+    for path in sorted(glob.glob(os.path.join(phone_data_dir, '*', 'matrix', '*.npy'))):
+        speaker, prompt = os.path.basename(path)[:-len('.npy')].split('_', 1)
+        by_prompt.setdefault(prompt, {})[speaker] = np.load(path).T
+
+    row_list = []
+    for prompt, matrices in by_prompt.items():
+        pairs = list(itertools.combinations(sorted(matrices.keys()), 2))
+        start = time.perf_counter()
+        exact = [sequence_dtw_cost(matrices[first], matrices[second], metric) for first, second in pairs]
+        exact_time = time.perf_counter() - start
+        for radius in radii:
+            start = time.perf_counter()
+            approx = [fast_dtw(matrices[first], matrices[second], radius, metric)[1] for first, second in pairs]
+            approx_time = time.perf_counter() - start
+            error = (np.array(approx) - np.array(exact)) / np.array(exact)
+            row_list.append({'prompt': prompt, 'radius': radius, 'pairs': len(pairs),
+                             'mean_relative_error': error.mean(), 'max_relative_error': error.max(),
+                             'exact_seconds': exact_time, 'fastdtw_seconds': approx_time})
+    report = pd.DataFrame(row_list)
+    print(report.to_string(index=False))
+    return report
+
+
+def pack_sequences(sequences, dtype=np.float32):
+    """
+    Pack variable-length (frames, features) sequences into one zero padded
+    tensor of shape (K, max_frames, features), float32 unless `dtype` says
+    otherwise. Returns the tensor, the length of every sequence and the
+    (K, max_frames) mask of real frames.
+    """
+
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.intp)
+    n_features = max(np.shape(sequence)[1] for sequence in sequences)
+    packed = np.zeros((len(sequences), max(lengths.max(), 1), n_features), dtype=dtype)
+    for k, sequence in enumerate(sequences):
+        packed[k, :lengths[k], :np.shape(sequence)[1]] = sequence
+    mask = np.arange(packed.shape[1]) < lengths[:, None]
+    return packed, lengths, mask
+
+
+def batched_local_cost(x_seq, packed, mask, metric='cosine'):
+    # (K, N, max_frames) local distances between the root and every packed
+    # candidate, padded frames are set to inf
+    x_seq = np.asarray(x_seq, dtype=np.float32)
+    if metric == 'cosine':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_unit = x_seq / np.linalg.norm(x_seq, axis=1, keepdims=True)
+            packed_unit = packed / np.linalg.norm(packed, axis=2, keepdims=True)
+            local_cost = 1.0 - np.einsum('nd,kmd->knm', x_unit, packed_unit)
+    else:
+        local_cost = pair_distance(x_seq[None, :, None, :], packed[:, None, :, :], metric)
+    local_cost[~np.broadcast_to(mask[:, None, :], local_cost.shape)] = np.inf
+    return local_cost
+
+
+def batched_dtw_costs(local_cost, x_lengths, y_lengths):
+    """
+    Alignment costs of K pairs from their (K, N, M) local cost matrices, all
+    swept one anti-diagonal at a time. Pair k uses the top-left
+    x_lengths[k] x y_lengths[k] corner of its matrix and the padding values
+    never reach that corner, so they do not matter.
+    """
+
+    K, N, M = local_cost.shape
+    cost = np.full((K, N + 1, M + 1), np.inf)
+    cost[:, 0, 0] = 0.0
+    for diag in range(N + M - 1):
+        i = np.arange(max(0, diag - M + 1), min(N, diag + 1))
+        j = diag - i
+        penalty = np.minimum(np.minimum(cost[:, i, j], cost[:, i, j + 1]), cost[:, i + 1, j])
+        cost[:, i + 1, j + 1] = local_cost[:, i, j] + penalty
+    return cost[np.arange(K), x_lengths, y_lengths]
+
+
+def batched_dtw(x_seq, sequences, metric='cosine'):
+    """
+    Alignment cost of `x_seq` against every sequence in `sequences` in one
+    vectorized pass. The candidates are packed with `pack_sequences` and the
+    anti-diagonal sweep runs over all of them at once. Cells past a candidate's
+    length never feed cells before it, so its cost is read at its own length.
+    Candidates with no frames get nan, like the failed pairs in
+    compare_phone_matrix. Returns a cost vector in the order of `sequences`.
+    """
+
+    packed, lengths, mask = pack_sequences(sequences)
+    local_cost = batched_local_cost(x_seq, packed, mask, metric)
+    K, N, M = local_cost.shape
+    costs = batched_dtw_costs(local_cost, np.full(K, N), lengths)
+    costs[(lengths == 0) | (N == 0)] = np.nan
+    return costs
+
+
+def padded_dtw_costs(local_costs):
+    """
+    Alignment costs of pairs that each come with their own (N, M) local cost
+    matrix, e.g. EMA pairs compared on different sensors, in one batched
+    sweep. The matrices are padded into a (K, max N, max M) tensor for
+    `batched_dtw_costs`. Pairs with no frames get nan.
+    """
+
+    if not local_costs:
+        return np.empty(0)
+    x_lengths = np.array([np.shape(local_cost)[0] for local_cost in local_costs], dtype=np.intp)
+    y_lengths = np.array([np.shape(local_cost)[1] for local_cost in local_costs], dtype=np.intp)
+    padded = np.full((len(local_costs), max(x_lengths.max(), 1), max(y_lengths.max(), 1)), np.inf)
+    for k, local_cost in enumerate(local_costs):
+        padded[k, :x_lengths[k], :y_lengths[k]] = local_cost
+    costs = batched_dtw_costs(padded, x_lengths, y_lengths)
+    costs[(x_lengths == 0) | (y_lengths == 0)] = np.nan
+    return costs
+
+
+def verify_against_reference(phone_data_dir, backend=None, max_pairs=None):
+    """
+    Run `dtw` and `dtw_reference` on pairs of sliced phone matrices in
+    `phone_data_dir` and check that paths and cost matrices are identical.
+    Returns the number of pairs compared.
+    """
+
+    sliced_paths = sorted(glob.glob(os.path.join(phone_data_dir, '*', 'matrix', '*', '*_sliced*.npy')))
+    by_phone = {}
+    for path in sliced_paths:
+        phone = os.path.basename(path).split('_sliced')[0]
+        by_phone.setdefault(phone, []).append(path)
+
+    compared = 0
+    for phone, paths in sorted(by_phone.items()):
+        for root_path, other_path in zip(paths, paths[1:]):
+            dist_mat = dist.cdist(np.load(root_path).T, np.load(other_path).T, "cosine")
+            ref_path, ref_cost = dtw_reference(dist_mat)
+            path, cost_mat = dtw(dist_mat, backend=backend)
+            if path != ref_path or not np.array_equal(cost_mat, ref_cost, equal_nan=True):
+                raise AssertionError(f"DTW mismatch for '{phone}' between {root_path} and {other_path}")
+            compared += 1
+            if max_pairs is not None and compared >= max_pairs:
+                return compared
+    print(f"DTW engine matches the reference on {compared} phone pairs")
+    return compared
+
+
+if __name__ == '__main__':
+    verify_against_reference(os.path.join(output_directory, 'phone_data'))
+    fast_dtw_report(os.path.join(output_directory, 'phone_data'))
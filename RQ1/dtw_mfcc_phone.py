@@ -1,15 +1,13 @@
 import numpy as np
 import os
 import random
-import scipy.spatial.distance as dist
 import pandas as pd
 import plotly.express as px
-import json
 import pickle
-from dtwParallel import dtw_functions
-from scipy.spatial import distance as d
-
-json_file_path = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/master_sliced_data.json'
+import dtw_engine
+import catalog
+import feature_store
+import matrix_cache
 
 phones_list = ["ih", "iy", "eh", "ah", "ae", "ao", "ay", "ay", "aa", "er", "ey", "uw", "ow", "aw", "uh", "oy", "t", "r",
                "n",
@@ -37,53 +35,12 @@ def dtw(dist_mat):
     - http://en.wikipedia.org/wiki/Dynamic_time_warping
     - https://www.ee.columbia.edu/~dpwe/resources/matlab/dtw/dp.m
 
-    The notation in the first reference was followed, while Dan Ellis's code
-    (second reference) was used to check for correctness. Returns a list of
-    path indices and the cost matrix.
+    The cost matrix is filled by the vectorized engine in dtw_engine, which is
+    checked against the original cell-by-cell version (dtw_engine.dtw_reference).
+    Returns a list of path indices and the cost matrix.
     """
 
-    N, M = dist_mat.shape
-
-    # Initialize the cost matrix
-    cost_mat = np.zeros((N + 1, M + 1))
-    for i in range(1, N + 1):
-        cost_mat[i, 0] = np.inf
-    for i in range(1, M + 1):
-        cost_mat[0, i] = np.inf
-
-    # Fill the cost matrix while keeping traceback information
-    traceback_mat = np.zeros((N, M))
-    for i in range(N):
-        for j in range(M):
-            penalty = [
-                cost_mat[i, j],  # match (0)
-                cost_mat[i, j + 1],  # insertion (1)
-                cost_mat[i + 1, j]]  # deletion (2)
-            i_penalty = np.argmin(penalty)
-            cost_mat[i + 1, j + 1] = dist_mat[i, j] + penalty[i_penalty]
-            traceback_mat[i, j] = i_penalty
-
-    # Traceback from bottom right
-    i = N - 1
-    j = M - 1
-    path = [(i, j)]
-    while i > 0 or j > 0:
-        tb_type = traceback_mat[i, j]
-        if tb_type == 0:
-            # Match
-            i = i - 1
-            j = j - 1
-        elif tb_type == 1:
-            # Insertion
-            i = i - 1
-        elif tb_type == 2:
-            # Deletion
-            j = j - 1
-        path.append((i, j))
-
-    # Strip infinity edges from cost_mat before returning
-    cost_mat = cost_mat[1:, 1:]
-    return path[::-1], cost_mat
+    return dtw_engine.dtw(dist_mat)
 
 
 def random_choice(my_dict):
@@ -128,47 +85,64 @@ def sort_dictionary(dictionary_list):
     # return sorted_data
 
 
-def compare_phone_matrix(phone_dict, root_person, phone, master_frame, save=False):
+def compare_phone_matrix(phone_dict, root_person, phone, master_frame, save=False, window=None, band=None,
+                         batched=False):
     root_matrix = []
 
     print("length before deleting", len(phone_dict))
     for key, value in phone_dict.items():
         if root_person in key:
-            root_matrix = np.load(value)
+            root_matrix = feature_store.load_matrix(value)
             del phone_dict[key]
             break
     print("length after deleting", len(phone_dict))
 
     alignment_cost = []
 
-    for key, value in phone_dict.items():
-
-        read_matrix = np.load(value)
-        # Distance matrix
-        x_seq = root_matrix.T
-        # print("Transposed x_seq matrix shape ", x_seq.shape)
-        y_seq = read_matrix.T
-        # print("Transposed  y_seq matrix shape ", y_seq.shape)
-
-        dist_mat = dist.cdist(x_seq, y_seq, "cosine")
-        # print("Spatial distance shape", dist_mat.shape)
-
-        try:
-            path, cost_mat = dtw(dist_mat)
-
-            print("Alignment cost: {:.4f}".format(cost_mat[-1, -1]))
-            alignment_cost.append(cost_mat[-1, -1])
-            M = y_seq.shape[0]
-            N = x_seq.shape[0]
-            print(
-                "Normalized alignment cost: {:.8f}".format(
-                    cost_mat[-1, -1] / (M + N))
-            )
-            print()
-        except Exception as E:
-            alignment_cost.append(0)
-
-    data = pd.DataFrame({'audio_files': phone_dict.keys(), 'alignment_cost': alignment_cost, 'prompt': phone})
+    if batched and window is None:
+        # All candidates are packed into one padded tensor and aligned with the
+        # root in a single vectorized pass
+        alignment_cost = list(dtw_engine.batched_dtw(root_matrix.T, [feature_store.load_matrix(value).T
+                                                                     for value in phone_dict.values()]))
+    else:
+        root_unit = dtw_engine.normalize_rows(root_matrix.T)
+        for key, value in phone_dict.items():
+
+            read_matrix = feature_store.load_matrix(value)
+            # Distance matrix
+            x_seq = root_matrix.T
+            # print("Transposed x_seq matrix shape ", x_seq.shape)
+            y_seq = read_matrix.T
+            # print("Transposed  y_seq matrix shape ", y_seq.shape)
+
+            try:
+                if window is None:
+                    # One matrix product of the unit frames, each file is normalized once
+                    dist_mat = dtw_engine.local_cost_matrix(root_unit, feature_store.normalized_matrix(value),
+                                                            normalized=True)
+                    # print("Spatial distance shape", dist_mat.shape)
+                    # Only the final cost is used, no cost or traceback matrix is kept
+                    cost = dtw_engine.dtw_cost(dist_mat)
+                else:
+                    # Only the cells inside the window are computed and stored
+                    path, cost = dtw_engine.banded_dtw(x_seq, y_seq, window, band, metric='cosine')
+
+                print("Alignment cost: {:.4f}".format(cost))
+                alignment_cost.append(cost)
+                M = y_seq.shape[0]
+                N = x_seq.shape[0]
+                print(
+                    "Normalized alignment cost: {:.8f}".format(
+                        cost / (M + N))
+                )
+                print()
+            except ValueError as error:
+                # A pair DTW cannot align (no frames) has no cost, it is not a perfect match
+                print(f"DTW failed for {key}: {error}")
+                alignment_cost.append(np.nan)
+
+    data = pd.DataFrame({'audio_files': phone_dict.keys(), 'alignment_cost': alignment_cost, 'prompt': phone,
+                         'window': dtw_engine.window_label(window, band)})
     master_frame = pd.concat([master_frame, data], ignore_index=True)
     if save:
         sorted_data = data.sort_values(by='audio_files')
@@ -180,19 +154,48 @@ def compare_phone_matrix(phone_dict, root_person, phone, master_frame, save=Fals
     return master_frame
 
 
-def compare_word_matrix(word_dict, root_person, word, master_frame, save=False):
+def compare_phone_utterance(phone_dict, word_dict, root_person, phone, master_frame):
+    """
+    Scores the root speaker's phone token directly against the full utterance
+    matrix (`matrix_file_path`) of every other speaker with subsequence DTW,
+    so no sliced copies of the other speakers are needed. The matched frame
+    range is kept next to the cost.
+    """
+
+    root_matrix = []
+    for key, value in phone_dict.items():
+        if root_person in key:
+            root_matrix = feature_store.load_matrix(value)
+            break
+
+    row_list = []
+    for key, value in word_dict.items():
+        if key == root_person:
+            continue
+        start_frame, end_frame, cost = dtw_engine.subsequence_dtw(root_matrix.T, matrix_cache.load(value).T, metric='cosine')
+        print("#" * 10, f"'{phone}' of {root_person} found in {key} at frames {start_frame}-{end_frame}, "
+                        f"alignment cost {cost:.4f}", "#" * 10)
+        row_list.append({'audio_files': key, 'alignment_cost': cost, 'prompt': phone, 'window': 'subsequence',
+                         'start_frame': start_frame, 'end_frame': end_frame})
+
+    data = pd.DataFrame(row_list)
+    return pd.concat([master_frame, data], ignore_index=True)
+
+
+def compare_word_matrix(word_dict, root_person, word, master_frame, save=False, window=None, band=None):
     root_matrix = []
 
     print("length before deleting", len(word_dict))
     for key, value in word_dict.items():
         if root_person in key:
-            root_matrix = np.load(value)
+            root_matrix = matrix_cache.load(value)
             del word_dict[key]
             break
     print("length after deleting", len(word_dict))
+    root_unit = dtw_engine.normalize_rows(root_matrix.T)
     row_list = []
     for key, value in word_dict.items():
-        read_matrix = np.load(value)
+        read_matrix = matrix_cache.load(value)
         # Distance matrix
         x_seq = root_matrix.T
         # print("Transposed x_seq matrix shape ", x_seq.shape)
@@ -200,10 +203,18 @@ def compare_word_matrix(word_dict, root_person, word, master_frame, save=False):
 
         print(x_seq.shape, y_seq.shape)
 
-        dtw_distance = dtw_functions.dtw(x_seq, y_seq, type_dtw="d", local_dissimilarity=d.cosine, MTS=True)
+        if window is None:
+            # Sentence prompts reach thousands of frames, so the cosine distances are
+            # computed on the fly from the cached unit frames and only O(min(N, M))
+            # costs are kept
+            dtw_distance = dtw_engine.sequence_dtw_cost(root_unit, dtw_engine.normalized_matrix(value),
+                                                        normalized=True)
+        else:
+            path, dtw_distance = dtw_engine.banded_dtw(x_seq, y_seq, window, band, metric='cosine')
 
         print("#" * 10, f"DTW DISTANCE FOR '{word}' between {root_person} AND {key} IS {dtw_distance}", "#" * 10)
-        row_list.append({'audio_files': key, 'alignment_cost': dtw_distance, 'prompt': word})
+        row_list.append({'audio_files': key, 'alignment_cost': dtw_distance, 'prompt': word,
+                         'window': dtw_engine.window_label(window, band)})
 
     data = pd.DataFrame(row_list)
     master_frame = pd.concat([master_frame, data], ignore_index=True)
@@ -218,31 +229,9 @@ def compare_word_matrix(word_dict, root_person, word, master_frame, save=False):
 
 
 def process_json(filter_word):
-    word_dictionary = {}
-    word_set = set()
-    # Create a dictionary with keys and empty lists as values
-    phones_dictionary = {key: [] for key in phones_list}
-    person_dictionary = {}
-    with open(json_file_path, 'r') as json_file:
-        data_dict = json.load(json_file)
-        for dir_name, values in data_dict.items():
-            for person_prompts in values:
-                for phones in person_prompts['text']:
-                    if phones['prompt'] == filter_word and dir_name not in word_set:
-                        word_set.add(dir_name)
-                        word_dictionary[dir_name] = person_prompts['matrix_file_path']
-                    # print(phones)
-                    code = prompt_to_code[phones['prompt']]
-                    if dir_name + '_' + code + '_' + phones['phone'] not in person_dictionary.keys():
-                        person_dictionary[dir_name + '_' + code + '_' + phones['phone']] = []
-                    # print("KEY ", dir_name + '_' + code + '_' + phones['phone'], "VALUE ", phones['sliced_matrix_path'])
-                    person_dictionary[dir_name + '_' + code + '_' + phones['phone']].append(
-                        phones['sliced_matrix_path'])
-        for root_key in phones_dictionary.keys():
-            phones_dictionary[root_key] = {key: value for key, value in person_dictionary.items() if
-                                           root_key == key.split('_')[2]}
-
-    return phones_dictionary, word_dictionary
+    # Sliced MFCC paths per phone and the utterance matrix of every speaker who
+    # read `filter_word`, both from the corpus catalog
+    return catalog.phone_paths(phones_list), catalog.word_matrix_paths(filter_word)
 
 
 def line_graph(master_frame, root_person, word):
@@ -258,17 +247,23 @@ def save_df(df, root_person, word):
         pickle.dump(df, file)
 
 
-def main(root_person, phone_list, word):
+def main(root_person, phone_list, word, window=None, band=None, batched=False, subsequence=False):
     phones_dict, word_dict = process_json(word)
     print(phones_dict, word_dict)
     master_frame = pd.DataFrame()
-    master_frame = compare_word_matrix(word_dict, root_person, word, master_frame)
+    master_frame = compare_word_matrix(dict(word_dict), root_person, word, master_frame, window=window, band=band)
     for phone in phone_list:
         unique_phone_dict = get_unique_matrix_dict(phones_dict[phone])
         save_keys(unique_phone_dict, root_person, phone, word)
-        master_frame = compare_phone_matrix(unique_phone_dict, root_person, phone, master_frame)
+        if subsequence:
+            # Other speakers are searched in their full utterance matrices
+            master_frame = compare_phone_utterance(unique_phone_dict, word_dict, root_person, phone, master_frame)
+            continue
+        master_frame = compare_phone_matrix(unique_phone_dict, root_person, phone, master_frame, window=window,
+                                            band=band, batched=batched)
     save_df(master_frame,root_person,word)
     line_graph(master_frame, root_person, word)
+    print("Matrix cache", matrix_cache.stats())
 
 
 if __name__ == '__main__':
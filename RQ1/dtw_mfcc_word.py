@@ -4,12 +4,10 @@ import random
 import scipy.spatial.distance as dist
 import pandas as pd
 import plotly.express as px
-import json
 import pickle
-from dtwParallel import dtw_functions
-from scipy.spatial import distance as d
-
-json_file_path = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/master_sliced_ema_data.json'
+import dtw_engine
+import catalog
+import matrix_cache
 
 phones_list = ["ih", "iy", "eh", "ah", "ae", "ao", "ay", "ay", "aa", "er", "ey", "uw", "ow", "aw", "uh", "oy", "t", "r",
                "n",
@@ -25,19 +23,20 @@ code_to_prompt = {'T1': 'feed', 'T2': 'horn', 'T3': 'the quick brown fox jumps o
 output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
 
 
-def dtw_parallel(word_dict, root_person, word):
+def dtw_parallel(word_dict, root_person, word, window=None, band=None):
     root_matrix = []
 
     print("length before deleting", len(word_dict))
     for key, value in word_dict.items():
         if root_person in key:
-            root_matrix = np.load(value)
+            root_matrix = matrix_cache.load(value)
             del word_dict[key]
             break
     print("length after deleting", len(word_dict))
+    root_unit = dtw_engine.normalize_rows(root_matrix.T)
     row_list = []
     for key, value in word_dict.items():
-        read_matrix = np.load(value)
+        read_matrix = matrix_cache.load(value)
         # Distance matrix
         x_seq = root_matrix.T
         # print("Transposed x_seq matrix shape ", x_seq.shape)
@@ -45,10 +44,18 @@ def dtw_parallel(word_dict, root_person, word):
 
         print(x_seq.shape, y_seq.shape)
 
-        dtw_distance = dtw_functions.dtw(x_seq, y_seq, type_dtw="d", local_dissimilarity=d.cosine, MTS=True)
+        if window is None:
+            # Cosine distances computed on the fly from the cached unit frames,
+            # only O(min(N, M)) costs are kept
+            dtw_distance = dtw_engine.sequence_dtw_cost(root_unit, dtw_engine.normalized_matrix(value),
+                                                        normalized=True)
+        else:
+            # Sakoe-Chiba or Itakura window, only the in-band cells are computed
+            path, dtw_distance = dtw_engine.banded_dtw(x_seq, y_seq, window, band, metric='cosine')
 
         print("#" * 10, f"DTW DISTANCE FOR '{word}' between {root_person} AND {key} IS {dtw_distance}", "#" * 10)
-        row_list.append({'audio_files': key, 'alignment_cost': dtw_distance})
+        row_list.append({'audio_files': key, 'alignment_cost': dtw_distance,
+                         'window': dtw_engine.window_label(window, band)})
     data = pd.DataFrame(row_list)
     sorted_data = data.sort_values(by='audio_files')
     fig = px.bar(sorted_data, x='audio_files', y='alignment_cost')
@@ -58,23 +65,13 @@ def dtw_parallel(word_dict, root_person, word):
 
 
 def process_json(filter_word):
-    matrix_path_dictionary = {}
-    with open(json_file_path, 'r') as json_file:
-        data_dict = json.load(json_file)
-        for dir_name, values in data_dict.items():
-            for person_prompts in values:
-                for phone in person_prompts['text']:
-                    if phone['prompt'] == filter_word:
-                        matrix_path_dictionary[dir_name] = person_prompts['matrix_file_path']
-                        break
-
-    return matrix_path_dictionary
+    return catalog.word_matrix_paths(filter_word)
 
 
-def main(root_person, word):
+def main(root_person, word, window=None, band=None):
     matrix_dict = process_json(word)
     print(matrix_dict)
-    dtw_parallel(matrix_dict, root_person, word)
+    dtw_parallel(matrix_dict, root_person, word, window=window, band=band)
 
 
 if __name__ == '__main__':
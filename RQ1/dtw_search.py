@@ -0,0 +1,177 @@
+import numpy as np
+import os
+import scipy.spatial.distance as dist
+import dtw_engine
+import dtw_mfcc_phone
+import feature_store
+
+# Relative slack used when comparing a lower bound with the current k-th best
+# cost, the bounds and the DTW use slightly different floating point sums
+bound_tolerance = 1e-9
+
+
+def full_window(N, M):
+    return np.zeros(N, dtype=np.intp), np.full(N, M, dtype=np.intp)
+
+
+def lb_kim(x_seq, y_seq, metric='cosine'):
+    """
+    Every warping path starts at (0, 0) and ends at (N - 1, M - 1), so the
+    local distances of these two cells bound the DTW cost from below.
+    """
+
+    bound = dtw_engine.pair_distance(x_seq[0], y_seq[0], metric)
+    if len(x_seq) > 1 or len(y_seq) > 1:
+        bound += dtw_engine.pair_distance(x_seq[-1], y_seq[-1], metric)
+    return float(bound)
+
+
+def _range_reduce(ufunc, matrix, start, stop):
+    # ufunc.reduce over matrix[start[k]:stop[k]] for every k in one reduceat call
+    indices = np.empty(2 * len(start), dtype=np.intp)
+    indices[0::2] = start
+    indices[1::2] = stop
+    padded = np.vstack((matrix, matrix[-1:]))
+    return ufunc.reduceat(padded, indices, axis=0)[0::2]
+
+
+def query_envelope(x_seq, lo, hi, M, metric='cosine'):
+    """
+    Upper and lower envelope of the query frames each candidate frame can be
+    aligned with. `lo`/`hi` are the per-row column ranges of the DTW window,
+    column j of the candidate can only meet rows i with lo[i] <= j < hi[i].
+    """
+
+    if metric == 'cosine':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_seq = x_seq / np.linalg.norm(x_seq, axis=1, keepdims=True)
+    j = np.arange(M)
+    start = np.searchsorted(hi, j, side='right')
+    stop = np.searchsorted(lo, j, side='right')
+    return _range_reduce(np.maximum, x_seq, start, stop), _range_reduce(np.minimum, x_seq, start, stop)
+
+
+def lb_keogh(upper, lower, y_seq, metric='cosine'):
+    """
+    LB_Keogh of a candidate against the query envelope. The path visits every
+    candidate frame at least once, and each visit costs at least the distance
+    from that frame to the envelope box of the query frames it may meet.
+    """
+
+    if metric == 'cosine':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            y_unit = y_seq / np.linalg.norm(y_seq, axis=1, keepdims=True)
+        # Largest cosine similarity any unit vector inside the box can reach
+        best_similarity = np.maximum(y_unit * upper, y_unit * lower).sum(axis=1)
+        return float(np.sum(1.0 - best_similarity))
+    if metric == 'euclidean':
+        gap = y_seq - np.clip(y_seq, lower, upper)
+        return float(np.sum(np.sqrt(np.sum(gap ** 2, axis=1))))
+    raise ValueError(f"LB_Keogh is not available for '{metric}'")
+
+
+def dtw_cost(x_seq, y_seq, window=None, band=None, metric='cosine'):
+    if window is None:
+        path, cost_mat = dtw_engine.dtw(dist.cdist(x_seq, y_seq, metric))
+        return cost_mat[-1, -1]
+    path, cost = dtw_engine.banded_dtw(x_seq, y_seq, window, band, metric=metric)
+    return cost
+
+
+def _rank(result):
+    # Sort key for (cost, index, key): nan costs last, ties by candidate order
+    cost, index = result[0], result[1]
+    return np.isnan(cost), 0.0 if np.isnan(cost) else cost, index
+
+
+def _prunable(bound, threshold):
+    return bound > threshold + bound_tolerance * abs(threshold)
+
+
+def nearest_neighbours(x_seq, candidates, k=1, window=None, band=None, metric='cosine'):
+    """
+    Top-k candidates by DTW cost to the query `x_seq`. `candidates` maps a key
+    to a (frames, features) sequence. Candidates are visited in LB_Kim order,
+    LB_Kim and then LB_Keogh are checked against the current k-th best cost and
+    full DTW only runs on the candidates that survive both bounds.
+
+    Returns the [(key, cost), ...] list, best first, and a dictionary with the
+    number of candidates pruned by each bound and the number of DTW calls.
+    """
+
+    x_seq = np.asarray(x_seq, dtype=np.float64)
+    keys = list(candidates.keys())
+    sequences = [np.asarray(candidates[key], dtype=np.float64) for key in keys]
+    stats = {'candidates': len(keys), 'pruned_kim': 0, 'pruned_keogh': 0, 'dtw_computed': 0}
+
+    kim = np.array([lb_kim(x_seq, y_seq, metric) for y_seq in sequences])
+    order = np.argsort(kim, kind='stable')
+    best = []
+    for position, index in enumerate(order):
+        threshold = best[-1][0] if len(best) == k else np.inf
+        if _prunable(kim[index], threshold):
+            # Candidates come in LB_Kim order, so every later one is pruned too
+            stats['pruned_kim'] += len(order) - position
+            break
+
+        y_seq = sequences[index]
+        if window is None or window == 'fastdtw':
+            # FastDTW never goes below the exact cost, the full-window bound holds
+            lo, hi = full_window(len(x_seq), len(y_seq))
+        else:
+            lo, hi = dtw_engine.get_window(len(x_seq), len(y_seq), window, band)
+        upper, lower = query_envelope(x_seq, lo, hi, len(y_seq), metric)
+        if _prunable(lb_keogh(upper, lower, y_seq, metric), threshold):
+            stats['pruned_keogh'] += 1
+            continue
+
+        stats['dtw_computed'] += 1
+        best.append((dtw_cost(x_seq, y_seq, window, band, metric), index, keys[index]))
+        best = sorted(best, key=_rank)[:k]
+
+    return [(key, cost) for cost, index, key in best], stats
+
+
+def brute_force_neighbours(x_seq, candidates, k=1, window=None, band=None, metric='cosine'):
+    results = [(dtw_cost(x_seq, np.asarray(y_seq, dtype=np.float64), window, band, metric), index, key)
+               for index, (key, y_seq) in enumerate(candidates.items())]
+    return [(key, cost) for cost, index, key in sorted(results, key=_rank)[:k]]
+
+
+def nearest_speakers(phone_dict, root_person, k=1, window=None, band=None):
+    """
+    Closest tokens to the root speaker's token for one phone. `phone_dict` is
+    one entry of dtw_mfcc_phone.process_json, speaker_prompt_phone -> paths of
+    the sliced MFCC matrices. The first token of the root speaker is the query
+    and every token of the other speakers is a candidate.
+    """
+
+    root_matrix = None
+    candidates = {}
+    for key, values in phone_dict.items():
+        for value in values:
+            if root_person == key.split('_')[0]:
+                if root_matrix is None:
+                    root_matrix = feature_store.load_matrix(value)
+                continue
+            # Same 'M04_T1_dh_sliced_2' naming as dtw_mfcc_phone.save_keys
+            candidate_key = key.rsplit('_', 1)[0] + '_' + value.split('/')[-1].split('.')[0]
+            candidates[candidate_key] = feature_store.load_matrix(value).T
+    if root_matrix is None:
+        raise KeyError(f"No token of {root_person} for this phone")
+
+    results, stats = nearest_neighbours(root_matrix.T, candidates, k=k, window=window, band=band)
+    print(f"Pruned {stats['pruned_kim']} candidates with LB_Kim and {stats['pruned_keogh']} with LB_Keogh, "
+          f"{stats['dtw_computed']} of {stats['candidates']} needed full DTW")
+    return results, stats
+
+
+def main(root_person, phone, word, k=3, window=None, band=None):
+    phones_dict, word_dict = dtw_mfcc_phone.process_json(word)
+    results, stats = nearest_speakers(phones_dict[phone], root_person, k=k, window=window, band=band)
+    for key, cost in results:
+        print("#" * 10, f"'{phone}' closest to {root_person}: {key} with alignment cost {cost:.4f}", "#" * 10)
+
+
+if __name__ == '__main__':
+    main('M04', 'iy', 'feed')
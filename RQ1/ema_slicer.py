@@ -0,0 +1,144 @@
+import h5py
+import json
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+import catalog
+import ema_store
+
+output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+save_directory = os.path.join(output_directory, 'phone_data')
+json_file_path = os.path.join(output_directory, 'master_sliced_data.json')
+ema_json_file_path = os.path.join(output_directory, 'master_sliced_ema_data.json')
+
+# AG500 .pos files are headerless little-endian float32 records of 12 sensors
+# x 7 values (x, y, z, phi, theta, rms, extra). AG501 files start with a text
+# header giving its total length and the number of sensors.
+sample_rate = 200
+pos_channels = 12
+pos_dimensions = 7
+
+
+def pos_layout(pos_file_path):
+    # (data offset in bytes, number of sensors) of a .pos file
+    with open(pos_file_path, 'rb') as file:
+        first_line = file.readline()
+        if not first_line.startswith(b'AG50xDATA'):
+            return 0, pos_channels
+        header_length = int(file.readline())
+        # The length counts from the start of the file
+        header = file.read(header_length - file.tell()).decode('latin-1')
+    channel_count = pos_channels
+    for line in header.splitlines():
+        if line.startswith('NumberOfChannels='):
+            channel_count = int(line.split('=')[1])
+    return header_length, channel_count
+
+
+def read_pos(pos_file_path):
+    """
+    Memory-mapped (samples, sensors, 7) float32 view of a .pos file, what
+    tapadm's loaddata returns as NumPoints x 7 x 12 without reading the file.
+    """
+
+    offset, channel_count = pos_layout(pos_file_path)
+    record_size = channel_count * pos_dimensions
+    values = np.memmap(pos_file_path, dtype='<f4', mode='r', offset=offset)
+    if values.size % record_size:
+        raise ValueError(f"Read {values.size} values from {pos_file_path}, "
+                         f"which is not a multiple of record size ({record_size})")
+    return values.reshape(-1, channel_count, pos_dimensions)
+
+
+def sample_index(sample_times, time):
+    # Index of the sample nearest to `time`, the earlier one on a tie, like
+    # the min(abs(t - time)) search of extract_ema.m
+    if len(sample_times) < 2:
+        return 0
+    position = np.clip(np.searchsorted(sample_times, time), 1, len(sample_times) - 1)
+    return position - 1 if abs(sample_times[position - 1] - time) <= abs(sample_times[position] - time) else position
+
+
+def slice_phone(data, sample_times, start_time, end_time):
+    """
+    (sensors, 7, frames) view of the samples nearest to start_time through
+    end_time inclusive, the layout h5py reads the MATLAB-written slices in.
+    """
+
+    start_index = sample_index(sample_times, start_time)
+    end_index = sample_index(sample_times, end_time)
+    return data[start_index:end_index + 1].transpose(1, 2, 0)
+
+
+def slice_file(task):
+    """
+    Slices every phone of one prompt recording from its .pos file. Writes the
+    <phone>_sliced[_n].h5 files when asked and returns (phone index, path,
+    slice) for each phone.
+    """
+
+    dir_name, pos_file_path, phones, names, write_files = task
+    data = read_pos(pos_file_path)
+    # Sample k (from 1) is taken at k / 200 s
+    sample_times = (1 / sample_rate) * np.arange(1, len(data) + 1)
+    slices = []
+    for index, (phones_row, name) in enumerate(zip(phones, names)):
+        sliced_data = slice_phone(data, sample_times, float(phones_row['start_time']), float(phones_row['end_time']))
+        prompt_dir = os.path.join(save_directory, dir_name, 'EMA', phones_row['prompt'])
+        ema_file_path = os.path.join(prompt_dir, name)
+        if write_files:
+            os.makedirs(prompt_dir, exist_ok=True)
+            with h5py.File(ema_file_path, 'w') as file:
+                file.create_dataset(phones_row['phone'], data=sliced_data.astype(np.float64))
+        slices.append((index, ema_file_path, np.array(sliced_data)))
+    print(f"Sliced {len(phones)} phones of {pos_file_path}")
+    return slices
+
+
+def extract_ema(json_path=json_file_path, write_files=True, build_store=True, processes=None):
+    """
+    Python replacement of extract_ema.m: slices every phone of every prompt
+    out of its .pos file, in a process pool over the files, and writes the
+    manifest with an ema_file_path per phone. The slices also go straight into
+    the EMA store, so the .h5 files are optional (write_files=False).
+    """
+
+    with open(json_path, 'r') as json_file:
+        data_dict = json.load(json_file)
+
+    tasks = []
+    for dir_name, values in data_dict.items():
+        count_dict = {}
+        for person_prompts in values:
+            names = []
+            for phones_row in person_prompts['text']:
+                # <phone>_sliced.h5, then _sliced_2.h5, ... per speaker, prompt and phone
+                count = count_dict.get((phones_row['prompt'], phones_row['phone']), 0) + 1
+                count_dict[(phones_row['prompt'], phones_row['phone'])] = count
+                names.append(f"{phones_row['phone']}_sliced.h5" if count == 1
+                             else f"{phones_row['phone']}_sliced_{count}.h5")
+            tasks.append((dir_name, person_prompts['pos_file_path'], person_prompts['text'], names, write_files))
+
+    if processes == 1 or len(tasks) < 2:
+        results = [slice_file(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(slice_file, tasks))
+
+    slices = {}
+    for task, file_slices in zip(tasks, results):
+        for index, ema_file_path, sliced_data in file_slices:
+            task[2][index]['ema_file_path'] = ema_file_path
+            slices[ema_file_path] = sliced_data
+
+    with open(ema_json_file_path, 'w') as json_file:
+        json.dump(data_dict, json_file)
+    print(f'EMA slices added to "{ema_json_file_path}"')
+
+    if build_store:
+        rows = [dict(zip(catalog.columns, row)) for row in catalog.manifest_rows(data_dict)]
+        ema_store.write_store((row['ema_path'], slices[row['ema_path']]) for row in ema_store.store_order(rows))
+
+
+if __name__ == '__main__':
+    extract_ema()
@@ -0,0 +1,191 @@
+import h5py
+import numpy as np
+import os
+import pandas as pd
+import catalog
+
+output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+store_path = os.path.join(output_directory, 'ema_store.h5')
+
+# Same selection as prep_ema in the EMA modules: the seven sensors used and
+# their x, y, z position channels
+sensor_list = [1, 2, 3, 6, 7, 9, 10]
+sensor_names = ['Tongue back', 'Tongue middle', 'Tongue tip', 'Upper lip', 'Lower lip', 'Left lip',
+                'Right lip']
+channels = 3
+
+# Frames per HDF5 chunk, a phone slice is a few dozen frames
+chunk_frames = 512
+
+# Requested slices closer than this many frames are read in one call
+max_gap = 4096
+
+
+def write_store(slices, path=store_path):
+    """
+    Writes (ema_path, (12, 7, frames) EMA slice) pairs, in the given order,
+    into one chunked HDF5 file. The slices are concatenated along the frame
+    axis of a single (sensors, channels, frames) dataset with the sensors and
+    channels already selected. `paths`, `offsets` and `frames` say where each
+    source file's slice starts and how long it is, `dropouts` is the sensor
+    health index: the fraction of all-zero frames of every sensor. The
+    catalog version the slices belong to is kept in the `catalog` attribute.
+    """
+
+    built_from = catalog.version()
+    paths = []
+    offsets = []
+    frames = []
+    dropouts = []
+    with h5py.File(path + '.tmp', 'w') as store:
+        data = store.create_dataset('slices', shape=(len(sensor_list), channels, 0), dtype=np.float64,
+                                    maxshape=(len(sensor_list), channels, None),
+                                    chunks=(len(sensor_list), channels, chunk_frames))
+        for ema_path, ema in slices:
+            ema = ema[sensor_list, :channels, :]
+            paths.append(ema_path)
+            offsets.append(data.shape[2])
+            frames.append(ema.shape[2])
+            dropouts.append(dropout_fraction(ema))
+            data.resize(data.shape[2] + ema.shape[2], axis=2)
+            data[:, :, offsets[-1]:] = ema
+        store.create_dataset('paths', data=paths, dtype=h5py.string_dtype())
+        store.create_dataset('offsets', data=np.array(offsets, dtype=np.int64))
+        store.create_dataset('frames', data=np.array(frames, dtype=np.int64))
+        store.create_dataset('dropouts', data=np.array(dropouts, dtype=np.float32).reshape(-1, len(sensor_list)))
+        store.attrs['catalog'] = built_from
+    os.replace(path + '.tmp', path)
+    _stores.pop(path, None)
+    print(f"Stored {len(paths)} EMA slices in {path}")
+
+
+def dropout_fraction(ema):
+    # Fraction of the frames of every sensor of a (sensors, channels, frames)
+    # slice with all channels zero, the frames a sensor is rejected for
+    zero_frames = np.all(ema == 0, axis=1)
+    if zero_frames.shape[1] == 0:
+        return np.zeros(zero_frames.shape[0])
+    return zero_frames.mean(axis=1)
+
+
+def store_order(rows):
+    # Tokens of a phone next to each other: phone, speaker, prompt code, occurrence
+    return sorted(rows, key=lambda row: (row['phone'], row['speaker'], row['code'], row['occurrence']))
+
+
+def read_slice(row):
+    with h5py.File(row['ema_path'], 'r') as file:
+        return file[row['phone']][:]
+
+
+def build_store(path=store_path):
+    # Copies every sliced EMA file of the catalog into the store
+    rows = [row for row in store_order(catalog.query()) if row['ema_path']]
+    write_store(((row['ema_path'], read_slice(row)) for row in rows), path)
+
+
+# store path -> (open file, slices dataset, source path -> (offset, frames),
+# source path -> dropout fraction per sensor or None for stores without them),
+# None for a store that is out of date
+_stores = {}
+
+
+def open_store(path=store_path):
+    """
+    One handle for the whole run, None when the store was never built or was
+    written from another catalog build (the EMA manifest changed since). The
+    callers then read the sliced .h5 files until the store is rebuilt.
+    """
+
+    if path not in _stores:
+        if not os.path.exists(path):
+            return None
+        store = h5py.File(path, 'r')
+        if store.attrs.get('catalog') != catalog.version():
+            store.close()
+            print(f"Ignoring {path}, it was not built from the current catalog. Rebuild it with build_store()")
+            _stores[path] = None
+            return None
+        index = {source.decode() if isinstance(source, bytes) else source: (int(offset), int(length))
+                 for source, offset, length in zip(store['paths'][:], store['offsets'][:], store['frames'][:])}
+        dropouts = None
+        if 'dropouts' in store:
+            dropouts = dict(zip(index, store['dropouts'][:]))
+        _stores[path] = (store, store['slices'], index, dropouts)
+    return _stores[path]
+
+
+def read_slices(ema_paths, path=store_path):
+    """
+    (7, 3, frames) arrays of many sliced EMA files, in the order of
+    `ema_paths`. Slices that lie close together in the store are read with a
+    single HDF5 call and split in memory.
+    """
+
+    store, data, index, dropouts = open_store(path)
+    order = sorted(range(len(ema_paths)), key=lambda position: index[ema_paths[position]][0])
+    # Runs of [start, stop, positions] that are read with one call each
+    runs = []
+    for position in order:
+        offset, length = index[ema_paths[position]]
+        if runs and offset - runs[-1][1] <= max_gap:
+            runs[-1][1] = max(runs[-1][1], offset + length)
+            runs[-1][2].append(position)
+        else:
+            runs.append([offset, offset + length, [position]])
+
+    matrices = [None] * len(ema_paths)
+    for start, stop, positions in runs:
+        block = data[:, :, start:stop]
+        for position in positions:
+            offset, length = index[ema_paths[position]]
+            matrices[position] = block[:, :, offset - start:offset - start + length]
+    return matrices
+
+
+def has_slices(ema_paths, path=store_path):
+    # True when every path can be served from the store
+    store = open_store(path)
+    return store is not None and all(ema_path in store[2] for ema_path in ema_paths)
+
+
+def sensor_dropouts(ema_paths, path=store_path):
+    """
+    (paths, sensors) dropout fractions of sliced EMA files from the health
+    index, without reading any slice. None when the store or its index does
+    not cover every path, the callers then check the arrays themselves.
+    """
+
+    store = open_store(path)
+    if store is None or store[3] is None or not all(ema_path in store[3] for ema_path in ema_paths):
+        return None
+    return np.array([store[3][ema_path] for ema_path in ema_paths]).reshape(-1, len(sensor_list))
+
+
+def sensor_health(path=store_path):
+    """
+    The health index as a table with one row per speaker, prompt, phone
+    occurrence and sensor: whether the slice has dropouts and the fraction
+    of frames affected. Meant for dropping bad sessions or sensors before
+    any DTW work, e.g. table[table['dropout_fraction'] < .1].
+    """
+
+    store = open_store(path)
+    if store is None:
+        raise FileNotFoundError(f"No current EMA store at {path}, build it with build_store() first")
+    rows = [row for row in catalog.query() if row['ema_path'] in store[2]]
+    fractions = sensor_dropouts([row['ema_path'] for row in rows], path)
+    if fractions is None:
+        # Written before the health index, work it out from the stored slices
+        fractions = np.array([dropout_fraction(ema)
+                              for ema in read_slices([row['ema_path'] for row in rows], path)]).reshape(-1, len(sensor_list))
+    table = pd.DataFrame({column: np.repeat([row[column] for row in rows], len(sensor_list))
+                          for column in ['speaker', 'prompt', 'code', 'phone', 'occurrence', 'ema_path']})
+    table['sensor'] = np.tile(sensor_names, len(rows))
+    table['dropout_fraction'] = fractions.ravel()
+    table['has_dropout'] = table['dropout_fraction'] > 0
+    return table
+
+
+if __name__ == '__main__':
+    build_store()
@@ -0,0 +1,182 @@
+import json
+import numpy as np
+import os
+import catalog
+import dtw_engine
+import matrix_cache
+
+output_directory = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+store_directory = os.path.join(output_directory, 'feature_store')
+
+# Catalog column holding the slice path of every feature type
+path_columns = {'mfcc': 'mfcc_path'}
+
+
+def data_path(feature):
+    return os.path.join(store_directory, feature + '.f32')
+
+
+def table_path(feature):
+    return os.path.join(store_directory, feature + '_table.npy')
+
+
+def meta_path(feature):
+    return os.path.join(store_directory, feature + '_meta.json')
+
+
+def build_store(feature='mfcc'):
+    """
+    Packs every token of `feature` into one contiguous float32 file. The
+    tokens are cut from the utterance matrices by the catalog frame ranges and
+    ordered by phone, speaker, prompt code and occurrence so that all tokens
+    of a phone sit next to each other. The table holds the key, the slice
+    path, the offset (in values), the stored (features, frames) shape and the
+    utterance matrix (path and mtime) of every token. The catalog version the
+    store was packed from goes to the meta file.
+    """
+
+    _stores.pop(feature, None)
+    built_from = catalog.version()
+    rows = sorted(catalog.query(), key=lambda row: (row['phone'], row['speaker'], row['code'], row['occurrence']))
+    rows = [row for row in rows if row[path_columns[feature]]]
+    # An empty memmap cannot be opened, so there has to be at least one frame
+    if not any(end_frame > start_frame for start_frame, end_frame in map(catalog.frame_range, rows)):
+        raise ValueError(f"No {feature} tokens with frames in the catalog of {catalog.json_file_path}, "
+                         f"nothing to pack")
+    path_length = max(len(row[path_columns[feature]]) for row in rows)
+    source_length = max(len(row['matrix_file_path']) for row in rows)
+    table = np.zeros(len(rows), dtype=[('speaker', 'U8'), ('code', 'U4'), ('phone', 'U4'), ('occurrence', 'i4'),
+                                       ('path', f'U{path_length}'), ('offset', 'i8'), ('features', 'i4'),
+                                       ('frames', 'i4'), ('source', f'U{source_length}'), ('source_mtime', 'i8')])
+    os.makedirs(store_directory, exist_ok=True)
+    offset = 0
+    with open(data_path(feature) + '.tmp', 'wb') as file:
+        for position, row in enumerate(rows):
+            matrix = np.asarray(catalog.token_matrix(row), dtype=np.float32)
+            file.write(np.ascontiguousarray(matrix).tobytes())
+            table[position] = (row['speaker'], row['code'], row['phone'], row['occurrence'],
+                               row[path_columns[feature]], offset, matrix.shape[0], matrix.shape[1],
+                               row['matrix_file_path'], os.stat(row['matrix_file_path']).st_mtime_ns)
+            offset += matrix.size
+    os.replace(data_path(feature) + '.tmp', data_path(feature))
+    np.save(table_path(feature), table)
+    with open(meta_path(feature), 'w') as json_file:
+        json.dump({'catalog': built_from}, json_file)
+    print(f"Packed {len(rows)} {feature} slices ({offset * 4 / 1e6:.1f} MB) into {data_path(feature)}")
+
+
+# feature -> (memmap of the packed values, table, path -> table row)
+_stores = {}
+
+
+def stale_reason(table, feature='mfcc'):
+    """
+    Why a packed store no longer matches its sources, None when it is current:
+    it was packed from another catalog build, before the store recorded its
+    sources, or an utterance matrix changed since.
+    """
+
+    if not os.path.exists(meta_path(feature)) or 'source_mtime' not in table.dtype.names:
+        return 'it predates the source checks'
+    with open(meta_path(feature), 'r') as json_file:
+        if json.load(json_file).get('catalog') != catalog.version():
+            return 'the catalog was rebuilt since'
+    sources, positions = np.unique(table['source'], return_index=True)
+    for source, source_mtime in zip(sources, table['source_mtime'][positions]):
+        if not os.path.exists(source) or os.stat(source).st_mtime_ns != source_mtime:
+            return f'"{source}" changed since'
+    return None
+
+
+def open_store(feature='mfcc'):
+    """
+    The packed file, mapped once per process, None when it was never built. A
+    store that no longer matches the catalog or its utterance matrices is
+    repacked before it is used.
+    """
+
+    if feature not in _stores:
+        if not os.path.exists(table_path(feature)):
+            return None
+        table = np.load(table_path(feature))
+        reason = stale_reason(table, feature)
+        if reason is not None:
+            print(f"Rebuilding the {feature} store, {reason}")
+            build_store(feature)
+            table = np.load(table_path(feature))
+        values = np.memmap(data_path(feature), dtype=np.float32, mode='r')
+        _stores[feature] = (values, table, {path: row for row, path in enumerate(table['path'])})
+    return _stores[feature]
+
+
+def _view(values, entry):
+    size = int(entry['features']) * int(entry['frames'])
+    return values[entry['offset']:entry['offset'] + size].reshape(entry['features'], entry['frames'])
+
+
+def _source(path, feature):
+    # Where load_matrix reads `path` from: ('store', table row),
+    # ('utterance', catalog row) or ('file', None)
+    store = open_store(feature)
+    if store is not None and path in store[2]:
+        return 'store', store[2][path]
+    row = catalog.occurrence_row(path) if feature == 'mfcc' else None
+    if row is not None and row['matrix_file_path'] and os.path.exists(row['matrix_file_path']):
+        return 'utterance', row
+    return 'file', None
+
+
+def load_matrix(path, feature='mfcc'):
+    """
+    Drop-in for np.load of a sliced matrix: a zero-copy (features, frames)
+    view into the packed store, else a view into the utterance matrix by the
+    catalog's frame range, so the slice file itself is optional. np.load is
+    only used for paths neither of them knows.
+    """
+
+    source, entry = _source(path, feature)
+    if source == 'store':
+        values, table, rows = open_store(feature)
+        return _view(values, table[entry])
+    if source == 'utterance':
+        return catalog.token_matrix(entry)
+    return matrix_cache.load(path)
+
+
+def source_version(path, feature='mfcc'):
+    # Identity of the data load_matrix serves for `path`, for cache keys: the
+    # slice file may not exist
+    source, entry = _source(path, feature)
+    if source == 'store':
+        return source, os.stat(data_path(feature)).st_mtime_ns, entry
+    if source == 'utterance':
+        return (source, entry['matrix_file_path'], os.stat(entry['matrix_file_path']).st_mtime_ns,
+                catalog.frame_range(entry))
+    return source, os.stat(path).st_mtime_ns
+
+
+def normalized_matrix(path, metric='cosine', feature='mfcc'):
+    # dtw_engine.normalized_matrix of a token served by load_matrix
+    return dtw_engine.normalized_matrix(path, metric, loader=lambda path: load_matrix(path, feature),
+                                        version=source_version(path, feature))
+
+
+def phone_matrices(phone, feature='mfcc'):
+    """
+    Every packed token of `phone` as {'M04_T1_f_sliced_2': view}, the naming
+    of dtw_mfcc_phone.save_keys. The tokens are one contiguous range of the
+    store, so this is a single slice of the mapped file.
+    """
+
+    values, table, rows = open_store(feature)
+    start = np.searchsorted(table['phone'], phone, side='left')
+    stop = np.searchsorted(table['phone'], phone, side='right')
+    matrix_dict = {}
+    for entry in table[start:stop]:
+        name = os.path.splitext(os.path.basename(entry['path']))[0]
+        matrix_dict[f"{entry['speaker']}_{entry['code']}_{name}"] = _view(values, entry)
+    return matrix_dict
+
+
+if __name__ == '__main__':
+    build_store('mfcc')
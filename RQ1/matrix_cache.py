@@ -0,0 +1,73 @@
+import numpy as np
+import os
+from collections import OrderedDict
+
+# Upper bound of the bytes held by the cache, the least recently used
+# matrices are dropped first. Change with set_budget.
+budget_bytes = 1024 ** 3
+
+# (kind, path, mtime) -> matrix, most recently used last
+_matrices = OrderedDict()
+# (kind, path) -> the key of its cached version
+_versions = {}
+_held_bytes = 0
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def set_budget(max_bytes):
+    global budget_bytes
+    budget_bytes = max_bytes
+    _evict()
+
+
+def _evict():
+    global _held_bytes
+    while _held_bytes > budget_bytes and _matrices:
+        key, matrix = _matrices.popitem(last=False)
+        del _versions[key[:2]]
+        _held_bytes -= matrix.nbytes
+        _stats['evictions'] += 1
+
+
+def load(path, loader=np.load, kind='npy', version=None):
+    """
+    `loader(path)` through a process-wide LRU cache. Entries are keyed by
+    kind, path and modification time, so a rewritten file is read again.
+    When the loader does not read `path` itself (e.g. a packed store), pass
+    the `version` of what it does read instead, `path` need not exist then.
+    The cached arrays are shared between callers and are made read-only.
+    """
+
+    global _held_bytes
+    key = (kind, path, os.stat(path).st_mtime_ns if version is None else version)
+    if key in _matrices:
+        _stats['hits'] += 1
+        _matrices.move_to_end(key)
+        return _matrices[key]
+
+    _stats['misses'] += 1
+    if key[:2] in _versions:
+        # The file changed since it was cached
+        _held_bytes -= _matrices.pop(_versions.pop(key[:2])).nbytes
+    matrix = loader(path)
+    matrix.flags.writeable = False
+    if matrix.nbytes <= budget_bytes:
+        _matrices[key] = matrix
+        _versions[key[:2]] = key
+        _held_bytes += matrix.nbytes
+        _evict()
+    return matrix
+
+
+def stats():
+    # Hit/miss/eviction counts plus the current size of the cache
+    return dict(_stats, entries=len(_matrices), held_bytes=_held_bytes, budget_bytes=budget_bytes)
+
+
+def clear():
+    global _held_bytes
+    _matrices.clear()
+    _versions.clear()
+    _held_bytes = 0
+    for name in _stats:
+        _stats[name] = 0
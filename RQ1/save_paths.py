@@ -1,8 +1,10 @@
 import os
 
+import numpy as np
 import pandas as pd
 import parselmouth
 from parselmouth.praat import call
+import torgo_inventory
 
 ROOT_DIRECTORY = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Dataset/'
 OUTPUT_PATH = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
@@ -25,27 +27,24 @@ def extract_paths(dir_name, session_name, file_name, text, row_list, added_direc
 
     if dir_name not in added_directories:
 
+        inventory = torgo_inventory.load_inventory(ROOT_DIRECTORY)
         dir_path = os.path.join(root_path, dir_name)
+        stem = file_name.split('.')[0]
 
         session_path = os.path.join(dir_path, session_name)
-        if os.path.exists(session_path + '/' + 'wav_headMic' + '/' + file_name.split('.')[0] + '.wav'):
-            wav_file_path = session_path + '/' + 'wav_headMic' + '/' + file_name.split('.')[0] + '.wav'
+        if inventory.exists(dir_name, session_name, 'wav_headMic', stem + '.wav'):
+            wav_file_path = session_path + '/' + 'wav_headMic' + '/' + stem + '.wav'
         else:
-            wav_file_path = session_path + '/' + 'wav_arrayMic' + '/' + file_name.split('.')[0] + '.wav'
-        prompt_file_path = session_path + '/' + 'prompts' + '/' + file_name.split('.')[0] + '.txt'
+            wav_file_path = session_path + '/' + 'wav_arrayMic' + '/' + stem + '.wav'
+        prompt_file_path = session_path + '/' + 'prompts' + '/' + stem + '.txt'
         pos_file_path = None
-        if os.path.exists(session_path + '/' + 'pos' + '/' + file_name.split('.')[0] + '.pos'):
-            pos_file_path = True
-            pos_file_path = session_path + '/' + 'pos' + '/' + file_name.split('.')[0] + '.pos'
+        if inventory.exists(dir_name, session_name, 'pos', stem + '.pos'):
+            pos_file_path = session_path + '/' + 'pos' + '/' + stem + '.pos'
         phn_file_path = None  # Initialize phn_file_path
         for phn_dir in ['phn_arrayMic', 'phn_headMic']:
-            phn_file_candidates = [
-                os.path.join(session_path, phn_dir, file_name.split('.')[0] + '.phn'),
-                os.path.join(session_path, phn_dir, file_name.split('.')[0] + '.PHN')
-            ]
-            for candidate in phn_file_candidates:
-                if os.path.exists(candidate):
-                    phn_file_path = candidate
+            for candidate in [stem + '.phn', stem + '.PHN']:
+                if inventory.exists(dir_name, session_name, phn_dir, candidate):
+                    phn_file_path = os.path.join(session_path, phn_dir, candidate)
                     break
 
         if phn_file_path is not None and pos_file_path is not None:
@@ -62,30 +61,71 @@ def extract_paths(dir_name, session_name, file_name, text, row_list, added_direc
             added_directories.append(dir_name)
 
 
-def filter_files():
+def speaker_groups(dir_names):
+    # The group folder extract_paths resolves each speaker to, None when skipped
+    return pd.Series(np.where(dir_names.str.startswith('MC'), 'MC',
+                              np.where(dir_names.str.contains('M'), 'M', None)), index=dir_names.index)
+
+
+def resolve_paths(df, inventory):
+    """
+    The extract_paths rules applied to every prompt row at once: each
+    candidate file becomes a key that is looked up in the inventory, the
+    microphone and phone-file preferences are column rules, and the first
+    usable recording of every speaker and text is kept with a group-by.
+    """
+
+    df = df.assign(main_dir=speaker_groups(df['dir_name'])).dropna(subset=['main_dir'])
+    stem = df['file_name'].str.split('.').str[0]
+    files = inventory.file_index()
+
+    def exists(channel, extension):
+        keys = pd.MultiIndex.from_arrays([df['dir_name'], df['session_name'],
+                                          pd.Series(channel, index=df.index), stem + extension])
+        return keys.isin(files)
+
+    session_path = ROOT_DIRECTORY + df['main_dir'] + '/' + df['dir_name'] + '/' + df['session_name']
+    # phn_headMic wins over phn_arrayMic, .phn over .PHN
+    phn_candidates = [('phn_headMic', '.phn'), ('phn_headMic', '.PHN'), ('phn_arrayMic', '.phn'),
+                      ('phn_arrayMic', '.PHN')]
+    phn_file_path = np.select([exists(channel, extension) for channel, extension in phn_candidates],
+                              [session_path + '/' + channel + '/' + stem + extension
+                               for channel, extension in phn_candidates], default=None)
+    paths = pd.DataFrame({
+        'person_name': df['dir_name'], 'session_name': df['session_name'], 'file_number': stem,
+        'text': df['text'],
+        'wav_file_path': session_path + np.where(exists('wav_headMic', '.wav'), '/wav_headMic/', '/wav_arrayMic/')
+                         + stem + '.wav',
+        'prompt_file_path': session_path + '/prompts/' + stem + '.txt',
+        'phn_file_path': phn_file_path,
+        'pos_file_path': (session_path + '/pos/' + stem + '.pos').where(exists('pos', '.pos'))})
+    paths = paths.dropna(subset=['phn_file_path', 'pos_file_path'])
+    return paths.groupby(['text', 'person_name'], sort=False).head(1)
+
+
+def filter_files(texts=filter_text):
+    """
+    Writes the wav, prompt, phone and pos paths of the first complete
+    recording of every speaker for each of `texts` (all prompts when None),
+    grouped by text in the order given.
+    """
+
     df = pd.read_csv(
         r"/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/cleaned_prompt.csv")
 
     if os.path.exists(OUTPUT_PATH + 'file_paths.csv'):
         os.remove(OUTPUT_PATH + 'file_paths.csv')
 
-    new_df = pd.DataFrame(
-        columns=['person_name', 'session_name', 'file_number', 'text', 'wav_file_path', 'prompt_file_path',
-                 'phn_file_path', 'pos_file_path'])
-
-    row_list = []  # Create a list to store rows
-
-    for text in filter_text:
-        filtered_df = df[df["text"] == text]
+    if texts is None:
+        texts = list(df['text'].dropna().unique())
+    df = df[df['text'].isin(texts)]
+    for text, count in df['text'].value_counts().reindex(texts, fill_value=0).items():
         print("Filtering the text ", text)
-        print("Length of the filtered dataframe is ", len(filtered_df))
-        added_directories = []
-        for index, row in filtered_df.iterrows():
-            extract_paths(row['dir_name'], row['session_name'], row['file_name'], row['text'], row_list,
-                          added_directories)
-
-    # Concatenate the list of rows into a DataFrame
-    new_df = pd.concat([new_df, pd.DataFrame(row_list)], ignore_index=True)
+        print("Length of the filtered dataframe is ", count)
+
+    new_df = resolve_paths(df, torgo_inventory.load_inventory(ROOT_DIRECTORY))
+    order = pd.Categorical(new_df['text'], categories=list(dict.fromkeys(texts)), ordered=True)
+    new_df = new_df.iloc[np.argsort(order.codes, kind='stable')]
 
     new_df.to_csv(os.path.join(OUTPUT_PATH, 'file_paths_temp.csv'), index=False)
 
@@ -0,0 +1,229 @@
+import numpy as np
+from scipy.optimize import minimize
+import dtw_engine
+
+
+def _softmin3(a, b, c, gamma):
+    # -gamma * log(exp(-a / gamma) + exp(-b / gamma) + exp(-c / gamma)), shifted
+    # by the smallest value so nothing overflows
+    smallest = np.minimum(np.minimum(a, b), c)
+    with np.errstate(invalid='ignore'):
+        total = np.exp((smallest - a) / gamma) + np.exp((smallest - b) / gamma) + np.exp((smallest - c) / gamma)
+    return np.where(np.isinf(smallest), smallest, smallest - gamma * np.log(total))
+
+
+def squared_euclidean_cost(x_packed, y_packed):
+    # (K, N, M) squared euclidean local costs of K packed pairs, the cost
+    # tslearn's softdtw metric uses
+    return (np.einsum('knd,knd->kn', x_packed, x_packed)[:, :, None]
+            + np.einsum('kmd,kmd->km', y_packed, y_packed)[:, None, :]
+            - 2.0 * np.einsum('knd,kmd->knm', x_packed, y_packed))
+
+
+def soft_dtw_forward(local_cost, x_lengths, y_lengths, gamma=1.0):
+    """
+    Soft-DTW accumulated costs of K pairs at once, one anti-diagonal of every
+    pair per step. `local_cost` is (K, N, M) with each pair's real cells in
+    its top-left x_lengths[k] x y_lengths[k] corner. Cells past a pair's
+    lengths never feed the cells before them, so the padding values do not
+    matter. Returns the (K, N + 2, M + 2) padded accumulated cost matrix and
+    the soft-DTW value of every pair.
+    """
+
+    K, N, M = local_cost.shape
+    accumulated = np.full((K, N + 2, M + 2), np.inf)
+    accumulated[:, 0, 0] = 0.0
+    for diag in range(N + M - 1):
+        i = np.arange(max(0, diag - M + 1), min(N, diag + 1))
+        j = diag - i
+        accumulated[:, i + 1, j + 1] = local_cost[:, i, j] + _softmin3(
+            accumulated[:, i, j], accumulated[:, i, j + 1], accumulated[:, i + 1, j], gamma)
+    return accumulated, accumulated[np.arange(K), x_lengths, y_lengths]
+
+
+def soft_dtw_backward(local_cost, accumulated, x_lengths, y_lengths, gamma=1.0):
+    """
+    Gradient of every pair's soft-DTW value with respect to its local cost
+    matrix (the expected alignment matrix of Cuturi and Blondel, 2017), for all
+    K pairs at once. Zero outside each pair's own lengths.
+    """
+
+    K, N, M = local_cost.shape
+    pairs = np.arange(K)
+    cost = np.zeros((K, N + 2, M + 2))
+    cost[:, 1:N + 1, 1:M + 1] = local_cost
+    accumulated = accumulated.copy()
+    # Every pair starts its backward pass one cell past its own end
+    accumulated[:, 1:, 1:] = np.where(np.isinf(accumulated[:, 1:, 1:]), -np.inf, accumulated[:, 1:, 1:])
+    accumulated[pairs, x_lengths + 1, :] = -np.inf
+    accumulated[pairs, :, y_lengths + 1] = -np.inf
+    accumulated[pairs, x_lengths + 1, y_lengths + 1] = accumulated[pairs, x_lengths, y_lengths]
+    cost[pairs, x_lengths + 1, y_lengths + 1] = 0.0
+    alignment = np.zeros((K, N + 2, M + 2))
+    alignment[pairs, x_lengths + 1, y_lengths + 1] = 1.0
+
+    for diag in range(N + M - 2, -1, -1):
+        i = np.arange(max(0, diag - M + 1), min(N, diag + 1)) + 1
+        j = diag - i + 2
+        inside = (i[None, :] <= x_lengths[:, None]) & (j[None, :] <= y_lengths[:, None])
+        current = accumulated[:, i, j]
+        with np.errstate(invalid='ignore', over='ignore'):
+            down = np.exp((accumulated[:, i + 1, j] - current - cost[:, i + 1, j]) / gamma)
+            right = np.exp((accumulated[:, i, j + 1] - current - cost[:, i, j + 1]) / gamma)
+            diagonal = np.exp((accumulated[:, i + 1, j + 1] - current - cost[:, i + 1, j + 1]) / gamma)
+            value = (alignment[:, i + 1, j] * down + alignment[:, i, j + 1] * right
+                     + alignment[:, i + 1, j + 1] * diagonal)
+        alignment[:, i, j] = np.where(inside, np.nan_to_num(value), alignment[:, i, j])
+    alignment = alignment[:, 1:N + 1, 1:M + 1]
+    alignment[~((np.arange(N)[None, :, None] < x_lengths[:, None, None])
+                & (np.arange(M)[None, None, :] < y_lengths[:, None, None]))] = 0.0
+    return alignment
+
+
+def _soft_dtw_batch(x_sequences, y_sequences, gamma, gradient):
+    x_packed, x_lengths, x_mask = dtw_engine.pack_sequences(x_sequences, dtype=np.float64)
+    y_packed, y_lengths, y_mask = dtw_engine.pack_sequences(y_sequences, dtype=np.float64)
+    local_cost = squared_euclidean_cost(x_packed, y_packed)
+    accumulated, values = soft_dtw_forward(local_cost, x_lengths, y_lengths, gamma)
+    if not gradient:
+        return values, None
+
+    alignment = soft_dtw_backward(local_cost, accumulated, x_lengths, y_lengths, gamma)
+    # d/dx_i of sum_j E_ij * |x_i - y_j|^2
+    packed_gradient = 2.0 * (alignment.sum(axis=2)[:, :, None] * x_packed
+                             - np.einsum('knm,kmd->knd', alignment, y_packed))
+    return values, [packed_gradient[k, :x_lengths[k]] for k in range(len(x_sequences))]
+
+
+def soft_dtw_pairs(x_sequences, y_sequences, gamma=1.0, gradient=False, batch_size=1024):
+    """
+    Soft-DTW between x_sequences[k] and y_sequences[k] for every k. The
+    sequences are (frames, features) arrays of any length. Pairs of similar
+    lengths are packed together, `batch_size` pairs per batched pass, so
+    little time goes into padding. With `gradient=True` also returns the
+    gradient of every value with respect to its x sequence, as a list of
+    arrays shaped like the inputs.
+    """
+
+    order = np.lexsort(([len(y_seq) for y_seq in y_sequences], [len(x_seq) for x_seq in x_sequences]))
+    values = np.empty(len(order))
+    gradients = [None] * len(order)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        batch_values, batch_gradients = _soft_dtw_batch([x_sequences[k] for k in batch],
+                                                        [y_sequences[k] for k in batch], gamma, gradient)
+        values[batch] = batch_values
+        if gradient:
+            for k, grad in zip(batch, batch_gradients):
+                gradients[k] = grad
+    if gradient:
+        return values, gradients
+    return values
+
+
+def soft_dtw_matrix(x_sequences, y_sequences, gamma=1.0):
+    # len(x_sequences) x len(y_sequences) soft-DTW values in one batch
+    pairs = [(x_seq, y_seq) for x_seq in x_sequences for y_seq in y_sequences]
+    values = soft_dtw_pairs([x_seq for x_seq, y_seq in pairs], [y_seq for x_seq, y_seq in pairs], gamma)
+    return values.reshape(len(x_sequences), len(y_sequences))
+
+
+def soft_dtw_barycenter(sequences, init, gamma=1.0, max_iter=30, weights=None, tol=1e-3):
+    """
+    Soft-DTW barycenter of variable-length `sequences`, found with L-BFGS from
+    `init` (which also fixes the barycenter length). The objective and its
+    gradient against all sequences come from one batched pass per iteration.
+    """
+
+    init = np.asarray(init, dtype=np.float64)
+    weights = np.ones(len(sequences)) if weights is None else np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum()
+
+    def objective(flat):
+        barycenter = flat.reshape(init.shape)
+        values, gradients = soft_dtw_pairs([barycenter] * len(sequences), sequences, gamma, gradient=True)
+        total_gradient = sum(weight * grad for weight, grad in zip(weights, gradients))
+        return float(np.dot(weights, values)), total_gradient.ravel()
+
+    result = minimize(objective, init.ravel(), method='L-BFGS-B', jac=True, tol=tol,
+                      options={'maxiter': max_iter, 'disp': False})
+    return result.x.reshape(init.shape)
+
+
+def _kmeans_plus_plus(sequences, n_clusters, gamma, rng):
+    # k-means++ seeding with soft-DTW divergences as the distance
+    centroids = [sequences[rng.integers(len(sequences))]]
+    self_values = soft_dtw_pairs(sequences, sequences, gamma)
+    while len(centroids) < n_clusters:
+        divergence = soft_dtw_divergence(sequences, centroids, gamma, self_values).min(axis=1)
+        weights = np.maximum(divergence, 0.0)
+        if weights.sum() == 0:
+            weights = np.ones(len(sequences))
+        centroids.append(sequences[rng.choice(len(sequences), p=weights / weights.sum())])
+    return [np.array(centroid, dtype=np.float64) for centroid in centroids]
+
+
+def soft_dtw_divergence(x_sequences, y_sequences, gamma=1.0, x_self=None):
+    """
+    sdtw(x, y) - (sdtw(x, x) + sdtw(y, y)) / 2 for every x, y pair. Unlike the
+    raw soft-DTW value it is 0 between a sequence and itself, which is what
+    the silhouette score needs.
+    """
+
+    if x_self is None:
+        x_self = soft_dtw_pairs(x_sequences, x_sequences, gamma)
+    y_self = soft_dtw_pairs(y_sequences, y_sequences, gamma)
+    return soft_dtw_matrix(x_sequences, y_sequences, gamma) - (x_self[:, None] + y_self[None, :]) / 2
+
+
+def soft_dtw_kmeans(sequences, n_clusters=3, gamma=1.0, max_iter=50, max_iter_barycenter=30, tol=1e-6,
+                    random_state=None):
+    """
+    k-means with the soft-DTW metric on variable-length (frames, features)
+    sequences, the same scheme as tslearn's TimeSeriesKMeans(metric="softdtw"):
+    assign every series to the centroid with the smallest soft-DTW value, move
+    each centroid to the soft-DTW barycenter of its series, stop when the
+    inertia no longer improves by `tol`. Every assignment step is one batched
+    soft-DTW pass over all series x centroids. Returns the labels and the
+    centroids.
+    """
+
+    sequences = [np.asarray(sequence, dtype=np.float64) for sequence in sequences]
+    rng = np.random.default_rng(random_state)
+    centroids = _kmeans_plus_plus(sequences, n_clusters, gamma, rng)
+    inertia = np.inf
+    labels = np.zeros(len(sequences), dtype=np.intp)
+    for iteration in range(max_iter):
+        distances = soft_dtw_matrix(sequences, centroids, gamma)
+        labels = distances.argmin(axis=1)
+        # An empty cluster restarts from the series furthest from its centroid
+        for cluster in range(n_clusters):
+            if not np.any(labels == cluster):
+                far = distances[np.arange(len(sequences)), labels].argmax()
+                labels[far] = cluster
+                centroids[cluster] = sequences[far].copy()
+        new_inertia = distances[np.arange(len(sequences)), labels].mean()
+        if abs(inertia - new_inertia) < tol:
+            break
+        inertia = new_inertia
+        centroids = [soft_dtw_barycenter([sequences[k] for k in np.flatnonzero(labels == cluster)],
+                                         centroids[cluster], gamma, max_iter_barycenter)
+                     for cluster in range(n_clusters)]
+    return labels, centroids
+
+
+def silhouette(sequences, labels, gamma=1.0):
+    # Mean silhouette over all series with soft-DTW divergences as distances
+    sequences = [np.asarray(sequence, dtype=np.float64) for sequence in sequences]
+    distances = np.maximum(soft_dtw_divergence(sequences, sequences, gamma), 0.0)
+    np.fill_diagonal(distances, 0.0)
+    labels = np.asarray(labels)
+    scores = np.zeros(len(sequences))
+    for index in range(len(sequences)):
+        same = labels == labels[index]
+        if same.sum() == 1:
+            continue
+        within = distances[index, same].sum() / (same.sum() - 1)
+        between = min(distances[index, labels == other].mean() for other in np.unique(labels) if other != labels[index])
+        scores[index] = (between - within) / max(within, between)
+    return scores.mean()
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+import h5py
+import numpy as np
+import pytest
+
+# The RQ1 scripts import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import ema_store
+import feature_store
+import matrix_cache
+
+speakers = ['F01', 'M01', 'MC01']
+# (phone, start_frame, end_frame) of the 'feed' prompt, d occurs twice
+phones = [('f', 10, 25), ('iy', 25, 47), ('d', 47, 58), ('d', 60, 72)]
+frame_rate = 200
+
+
+def write_corpus(root, seed=0):
+    """
+    A small corpus in the layout of Output/: one 'feed' utterance matrix per
+    speaker, sliced EMA files and both manifests. The sliced MFCC .npy files
+    are never written, every token has to come from its utterance matrix.
+    """
+
+    rng = np.random.default_rng(seed)
+    acoustic = {}
+    ema = {}
+    for speaker in speakers:
+        matrix_path = os.path.join(root, 'phone_data', speaker, 'matrix', f'{speaker}_feed.npy')
+        os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+        np.save(matrix_path, rng.standard_normal((12, 80)).astype(np.float32))
+        acoustic_text = []
+        ema_text = []
+        counts = {}
+        for phone, start_frame, end_frame in phones:
+            counts[phone] = counts.get(phone, 0) + 1
+            name = f'{phone}_sliced' if counts[phone] == 1 else f'{phone}_sliced_{counts[phone]}'
+            phones_row = {'prompt': 'feed', 'phone': phone, 'start_time': str(start_frame / frame_rate),
+                          'end_time': str(end_frame / frame_rate), 'start_frame': str(start_frame),
+                          'end_frame': str(end_frame),
+                          'sliced_matrix_path': os.path.join(root, 'phone_data', speaker, 'matrix', 'feed',
+                                                             name + '.npy')}
+            acoustic_text.append(phones_row)
+            ema_file_path = os.path.join(root, 'phone_data', speaker, 'EMA', 'feed', name + '.h5')
+            os.makedirs(os.path.dirname(ema_file_path), exist_ok=True)
+            sliced = rng.standard_normal((12, 7, end_frame - start_frame))
+            # Sensor 3 (tongue tip) drops out for one frame in every d of MC01
+            if speaker == 'MC01' and phone == 'd':
+                sliced[3, :, 2] = 0
+            with h5py.File(ema_file_path, 'w') as file:
+                file.create_dataset(phone, data=sliced)
+            ema_text.append(dict(phones_row, ema_file_path=ema_file_path))
+        person = {'person_name': speaker, 'session_name': 'Session1', 'file_number': '0001',
+                  'matrix_file_path': matrix_path}
+        acoustic[speaker] = [dict(person, text=acoustic_text)]
+        ema[speaker] = [dict(person, text=ema_text)]
+
+    manifest_path = os.path.join(root, 'master_sliced_data.json')
+    ema_manifest_path = os.path.join(root, 'master_sliced_ema_data.json')
+    with open(ema_manifest_path, 'w') as json_file:
+        json.dump(ema, json_file)
+    with open(manifest_path, 'w') as json_file:
+        json.dump(acoustic, json_file)
+    return manifest_path, ema_manifest_path
+
+
+def backdate(path, seconds=10):
+    # Move the mtime of `path` back, as if everything else was written after
+    # it. A rewrite within the same clock tick would not be noticed otherwise
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10 ** 9))
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """
+    The synthetic corpus with the catalog and both stores pointed at it and
+    every per-process cache emptied. Returns the corpus paths.
+    """
+
+    manifest_path, ema_manifest_path = write_corpus(str(tmp_path))
+    catalog_path = str(tmp_path / 'catalog.sqlite')
+    monkeypatch.setattr(catalog, 'json_file_path', manifest_path)
+    monkeypatch.setattr(catalog, 'ema_json_file_path', ema_manifest_path)
+    monkeypatch.setattr(catalog, 'catalog_file_path', catalog_path)
+    monkeypatch.setattr(catalog, '_connections', {})
+    monkeypatch.setattr(catalog, '_catalog_in_use', None)
+    monkeypatch.setattr(catalog, '_phone_index', None)
+    monkeypatch.setattr(catalog, '_rows_by_path', None)
+    monkeypatch.setattr(catalog, '_utterances', {})
+    monkeypatch.setattr(feature_store, 'store_directory', str(tmp_path / 'feature_store'))
+    monkeypatch.setattr(feature_store, '_stores', {})
+    monkeypatch.setattr(ema_store, '_stores', {})
+    matrix_cache.clear()
+    yield {'root': str(tmp_path), 'manifest': manifest_path, 'ema_manifest': ema_manifest_path,
+           'catalog': catalog_path, 'ema_store': str(tmp_path / 'ema_store.h5')}
+    for connection in catalog._connections.values():
+        connection.close()
+    for store in ema_store._stores.values():
+        if store is not None:
+            store[0].close()
+    matrix_cache.clear()
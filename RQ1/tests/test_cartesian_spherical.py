@@ -0,0 +1,33 @@
+import math
+import numpy as np
+import pytest
+import cartesian_spherical
+
+
+def test_matches_the_scalar_formulas():
+    positions = np.random.default_rng(0).standard_normal((7, 3, 20)) * 40
+    positions[2, :, 5] = 0
+    spherical = cartesian_spherical.cartesian_to_spherical(positions)
+    for sensor, frame in [(0, 0), (3, 11), (6, 19), (2, 5)]:
+        x, y, z = positions[sensor, :, frame]
+        r = math.sqrt(x ** 2 + y ** 2 + z ** 2)
+        expected = (r, math.atan2(y, x), math.acos(z / r) if r != 0 else 0)
+        np.testing.assert_allclose(spherical[sensor, :, frame], expected, atol=1e-12)
+    # Dropped frames stay all-zero
+    assert not spherical[2, :, 5].any()
+
+
+def test_round_trip_in_place():
+    positions = np.random.default_rng(1).standard_normal((4, 3, 30))
+    converted = positions.copy()
+    assert cartesian_spherical.cartesian_to_spherical(converted, out=converted) is converted
+    np.testing.assert_allclose(cartesian_spherical.spherical_to_cartesian(converted), positions, atol=1e-12)
+
+
+def test_ema_coordinates():
+    positions = np.random.default_rng(2).standard_normal((7, 3, 10))
+    assert cartesian_spherical.ema_coordinates(positions) is positions
+    np.testing.assert_array_equal(cartesian_spherical.ema_coordinates(positions, 'spherical'),
+                                  cartesian_spherical.cartesian_to_spherical(positions))
+    with pytest.raises(ValueError):
+        cartesian_spherical.ema_coordinates(positions, 'polar')
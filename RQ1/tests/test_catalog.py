@@ -0,0 +1,111 @@
+import json
+import os
+import numpy as np
+import pytest
+import catalog
+from conftest import backdate, phones, speakers, write_corpus
+
+
+def test_catalog_round_trip(corpus):
+    rows = catalog.query()
+    assert len(rows) == len(speakers) * len(phones)
+    assert [row['occurrence'] for row in catalog.query(speaker='M01', phone='d')] == [1, 2]
+    assert len(catalog.query(speaker=['F01', 'M01'], phone='f')) == 2
+    row = catalog.query(speaker='F01', phone='iy')[0]
+    assert (row['code'], row['start_frame'], row['end_frame']) == ('T1', 25, 47)
+    assert row['mfcc_path'].endswith('iy_sliced.npy') and row['ema_path'].endswith('iy_sliced.h5')
+    assert catalog.word_matrix_paths('feed')['MC01'] == row['matrix_file_path'].replace('F01', 'MC01')
+
+
+def test_token_matrix(corpus):
+    row = catalog.query(speaker='F01', phone='iy')[0]
+    assert catalog.frame_range(row) == (25, 47)
+    np.testing.assert_array_equal(catalog.token_matrix(row), np.load(row['matrix_file_path'])[:, 25:47])
+    assert catalog.occurrence_row(row['mfcc_path']) == row
+    assert catalog.occurrence_row('unknown.npy') is None
+
+
+def test_catalog_rejects_unknown_columns(corpus):
+    with pytest.raises(ValueError):
+        catalog.query(person='M01')
+
+
+def test_phone_paths(corpus):
+    paths = catalog.phone_paths(['d', 'f'])
+    assert sorted(paths['d']) == ['F01_T1_d', 'M01_T1_d', 'MC01_T1_d']
+    assert paths['d']['MC01_T1_d'] == [row['mfcc_path'] for row in catalog.query(speaker='MC01', phone='d')]
+    assert catalog.phone_paths(['f'], 'ema_path')['f']['M01_T1_f'] == [
+        catalog.query(speaker='M01', phone='f')[0]['ema_path']]
+
+
+def test_catalog_is_rebuilt_when_the_manifest_changes(corpus):
+    assert len(catalog.query(speaker='F01')) == len(phones)
+    assert catalog.phone_index().counts()['f'] == len(speakers)
+    with open(corpus['manifest'], 'r') as json_file:
+        data_dict = json.load(json_file)
+    del data_dict['F01']
+    with open(corpus['manifest'], 'w') as json_file:
+        json.dump(data_dict, json_file)
+    backdate(corpus['catalog'])
+    assert catalog.query(speaker='F01') == []
+    assert len(catalog.query()) == (len(speakers) - 1) * len(phones)
+    assert catalog.phone_index().counts()['f'] == len(speakers) - 1
+
+
+def test_phone_index(corpus):
+    index = catalog.phone_index()
+    assert index is catalog.phone_index()
+    assert sorted(index) == ['d', 'f', 'iy'] and 'aa' not in index
+    assert index.counts() == {'f': 3, 'iy': 3, 'd': 6}
+    assert [row['occurrence'] for row in index['d']['M01']['T1']] == [1, 2]
+    assert index.flat_paths('d') == [row['mfcc_path'] for row in catalog.query(phone='d')]
+    assert index.paths('f', 'ema_path') == catalog.phone_paths(['f'], 'ema_path')['f']
+
+
+def test_catalog_is_rebuilt_when_either_manifest_changes(corpus):
+    built = catalog.version()
+    assert catalog.version() == built
+    # Only the acoustic manifest is newer than the catalog
+    backdate(corpus['ema_manifest'], seconds=20)
+    backdate(corpus['catalog'])
+    acoustic_rebuild = catalog.version()
+    assert acoustic_rebuild != built
+    # Only the EMA manifest is newer
+    backdate(corpus['manifest'], seconds=20)
+    backdate(corpus['ema_manifest'], seconds=-20)
+    backdate(corpus['catalog'])
+    assert catalog.version() != acoustic_rebuild
+    assert catalog.version() == catalog.version()
+
+
+def test_catalog_drops_ema_paths_of_other_intervals(corpus):
+    assert catalog.query(speaker='M01', phone='f')[0]['ema_path'] is not None
+    with open(corpus['ema_manifest'], 'r') as json_file:
+        data_dict = json.load(json_file)
+    data_dict['M01'][0]['text'][0]['end_time'] = '0.5'
+    with open(corpus['ema_manifest'], 'w') as json_file:
+        json.dump(data_dict, json_file)
+    backdate(corpus['catalog'])
+    assert catalog.query(speaker='M01', phone='f')[0]['ema_path'] is None
+    assert catalog.query(speaker='F01', phone='f')[0]['ema_path'] is not None
+
+
+def test_catalog_without_ema_manifest(corpus):
+    os.remove(corpus['ema_manifest'])
+    assert all(row['ema_path'] is None for row in catalog.query())
+
+
+def test_catalog_follows_the_path_settings(corpus, tmp_path, monkeypatch):
+    assert catalog.phone_index().counts()['f'] == len(speakers)
+    other_manifest, other_ema_manifest = write_corpus(str(tmp_path / 'other'))
+    with open(other_manifest, 'r') as json_file:
+        data_dict = json.load(json_file)
+    del data_dict['F01']
+    with open(other_manifest, 'w') as json_file:
+        json.dump(data_dict, json_file)
+    monkeypatch.setattr(catalog, 'json_file_path', other_manifest)
+    monkeypatch.setattr(catalog, 'ema_json_file_path', other_ema_manifest)
+    monkeypatch.setattr(catalog, 'catalog_file_path', str(tmp_path / 'other' / 'catalog.sqlite'))
+    assert catalog.query(speaker='F01') == []
+    assert catalog.phone_index().counts()['f'] == len(speakers) - 1
+    assert os.path.exists(tmp_path / 'other' / 'catalog.sqlite')
@@ -0,0 +1,57 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial import distance as dist
+import distance_matrix
+import dtw_engine
+
+
+def speaker_matrices(seed=37):
+    # (features, frames) matrices in the stored layout
+    rng = np.random.default_rng(seed)
+    return {speaker: rng.standard_normal((12, rng.integers(5, 20))) for speaker in ['F01', 'M01', 'M02', 'MC01']}
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_distance_matrix_matches_pair_costs(processes):
+    sequences = speaker_matrices()
+    matrix = distance_matrix.distance_matrix(sequences, 'mfcc', processes)
+    assert list(matrix.index) == sorted(sequences)
+    np.testing.assert_array_equal(matrix.values, matrix.values.T)
+    np.testing.assert_array_equal(np.diag(matrix.values), 0)
+    for first in sequences:
+        for second in sequences:
+            if first != second:
+                path, cost_mat = dtw_engine.dtw_reference(dist.cdist(sequences[first].T, sequences[second].T,
+                                                                     'cosine'))
+                assert matrix.loc[first, second] == pytest.approx(cost_mat[-1, -1])
+
+
+def test_root_slice_has_the_compare_layout():
+    matrix = distance_matrix.distance_matrix(speaker_matrices(), 'mfcc', processes=1)
+    data = distance_matrix.root_slice(matrix, 'M01', 'f')
+    assert list(data['audio_files']) == ['F01', 'M02', 'MC01']
+    assert (data['prompt'] == 'f').all()
+    pd.testing.assert_series_equal(data['alignment_cost'], matrix.loc['M01', ['F01', 'M02', 'MC01']].reset_index(
+        drop=True), check_names=False)
+
+
+def test_pairs_without_frames_are_nan():
+    root_unit = distance_matrix.unit_frames(np.random.default_rng(0).standard_normal((12, 9)))
+    assert np.isnan(distance_matrix.mfcc_phone_cost(root_unit, np.zeros((0, 12))))
+
+
+def test_ema_token_lists_of_any_speaker(tmp_path, monkeypatch):
+    monkeypatch.setattr(distance_matrix, 'output_directory', str(tmp_path))
+    os.makedirs(tmp_path / 'phone_data' / 'F01')
+    with pytest.raises(FileNotFoundError, match="feature='mfcc'"):
+        distance_matrix.saved_keys_speaker(['f', 'iy'], 'feed')
+    for speaker, phones in [('M01', ['f']), ('MC01', ['f', 'iy']), ('MC02', ['f', 'iy'])]:
+        os.makedirs(tmp_path / 'phone_data' / speaker)
+        for phone in phones:
+            with open(tmp_path / 'phone_data' / speaker / f'feed_{phone}_list.pkl', 'wb') as file:
+                pickle.dump([], file)
+    assert distance_matrix.saved_keys_speaker(['f', 'iy'], 'feed') == 'MC01'
+    assert distance_matrix.saved_keys_speaker(['f'], 'feed') == 'M01'
@@ -0,0 +1,152 @@
+import numpy as np
+import pytest
+from scipy.spatial import distance as dist
+import dtw_engine
+
+backends = ['numpy'] + (['numba'] if dtw_engine.numba is not None else [])
+# (N, M) shapes of the random pairs, square, tall, wide and single frames
+shapes = [(1, 1), (1, 7), (9, 1), (6, 6), (13, 21), (30, 17)]
+
+
+def random_pair(N, M, seed, features=12):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((N, features)), rng.standard_normal((M, features))
+
+
+def reference_cost(x_seq, y_seq, metric='cosine'):
+    path, cost_mat = dtw_engine.dtw_reference(dist.cdist(x_seq, y_seq, metric))
+    return cost_mat[-1, -1]
+
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('N, M', shapes)
+def test_dtw_matches_reference(N, M, backend):
+    dist_mat = np.random.default_rng(N * M).random((N, M))
+    path, cost_mat = dtw_engine.dtw(dist_mat, backend=backend)
+    reference_path, reference_cost_mat = dtw_engine.dtw_reference(dist_mat)
+    assert path == reference_path
+    np.testing.assert_allclose(cost_mat, reference_cost_mat)
+
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('window, band', [('sakoe_chiba', 1), ('sakoe_chiba', 4), ('sakoe_chiba', 40),
+                                          ('itakura', 1.5), ('itakura', 3)])
+def test_windows_match_masked_reference(window, band, backend):
+    # The reference on the full grid with every cell outside the window at inf
+    x_seq, y_seq = random_pair(17, 23, seed=5)
+    path, cost = dtw_engine.banded_dtw(x_seq, y_seq, window, band, backend=backend)
+    lo, hi = dtw_engine.get_window(17, 23, window, band)
+    columns = np.arange(23)
+    dist_mat = np.where((columns >= lo[:, None]) & (columns < hi[:, None]), dist.cdist(x_seq, y_seq, 'cosine'),
+                        np.inf)
+    reference_path, reference_cost_mat = dtw_engine.dtw_reference(dist_mat)
+    assert path == reference_path
+    assert cost == pytest.approx(reference_cost_mat[-1, -1])
+
+
+@pytest.mark.parametrize('backend', backends)
+def test_fast_dtw_with_a_wide_radius_matches_reference(backend):
+    x_seq, y_seq = random_pair(17, 23, seed=5)
+    path, cost = dtw_engine.fast_dtw(x_seq, y_seq, radius=40, backend=backend)
+    reference_path, reference_cost_mat = dtw_engine.dtw_reference(dist.cdist(x_seq, y_seq, 'cosine'))
+    assert path == reference_path
+    assert cost == pytest.approx(reference_cost_mat[-1, -1])
+
+
+@pytest.mark.parametrize('window, band', [('sakoe_chiba', 2), ('itakura', 2), ('fastdtw', 1)])
+def test_constrained_windows_never_beat_reference(window, band):
+    x_seq, y_seq = random_pair(40, 52, seed=7)
+    path, cost = dtw_engine.banded_dtw(x_seq, y_seq, window, band)
+    assert cost >= reference_cost(x_seq, y_seq) - 1e-9
+    assert path[0] == (0, 0) and path[-1] == (39, 51)
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_batched_dtw_matches_reference(metric):
+    rng = np.random.default_rng(11)
+    x_seq = rng.standard_normal((15, 12))
+    sequences = [rng.standard_normal((length, 12)) for length in (1, 9, 15, 28)]
+    costs = dtw_engine.batched_dtw(x_seq, sequences, metric)
+    # The batch runs in float32
+    np.testing.assert_allclose(costs, [reference_cost(x_seq, y_seq, metric) for y_seq in sequences], rtol=1e-4)
+
+
+def test_batched_dtw_gives_empty_candidates_nan():
+    costs = dtw_engine.batched_dtw(np.ones((3, 2)), [np.ones((0, 2)), np.ones((4, 2))])
+    assert np.isnan(costs[0]) and np.isfinite(costs[1])
+    assert np.isnan(dtw_engine.batched_dtw(np.ones((0, 2)), [np.ones((4, 2))])).all()
+
+
+def test_batched_dtw_costs_use_each_pairs_corner():
+    rng = np.random.default_rng(3)
+    local_cost = rng.random((4, 9, 11))
+    x_lengths = np.array([9, 1, 5, 9])
+    y_lengths = np.array([11, 4, 1, 7])
+    costs = dtw_engine.batched_dtw_costs(local_cost, x_lengths, y_lengths)
+    for k in range(4):
+        path, cost_mat = dtw_engine.dtw_reference(local_cost[k, :x_lengths[k], :y_lengths[k]])
+        assert costs[k] == pytest.approx(cost_mat[-1, -1])
+
+
+def test_padded_dtw_costs_match_reference():
+    rng = np.random.default_rng(4)
+    local_costs = [rng.random((7, 12)), rng.random((15, 3)), rng.random((1, 1)), rng.random((9, 9))]
+    costs = dtw_engine.padded_dtw_costs(local_costs)
+    for local_cost, cost in zip(local_costs, costs):
+        assert cost == pytest.approx(dtw_engine.dtw_reference(local_cost)[1][-1, -1])
+    costs = dtw_engine.padded_dtw_costs([rng.random((4, 5)), np.zeros((0, 5))])
+    assert np.isfinite(costs[0]) and np.isnan(costs[1])
+    assert dtw_engine.padded_dtw_costs([]).shape == (0,)
+
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('N, M', shapes)
+def test_dtw_cost_matches_reference(N, M, backend):
+    dist_mat = np.random.default_rng(N + M).random((N, M))
+    assert dtw_engine.dtw_cost(dist_mat, backend=backend) == pytest.approx(
+        dtw_engine.dtw_reference(dist_mat)[1][-1, -1])
+
+
+def test_dtw_cost_rejects_empty():
+    with pytest.raises(ValueError):
+        dtw_engine.dtw_cost(np.zeros((0, 4)))
+
+
+@pytest.mark.parametrize('backend', backends)
+@pytest.mark.parametrize('metric', ['cosine', 'correlation', 'euclidean'])
+@pytest.mark.parametrize('N, M', shapes)
+def test_sequence_dtw_cost_matches_reference(N, M, metric, backend):
+    x_seq, y_seq = random_pair(N, M, seed=N * 31 + M)
+    assert dtw_engine.sequence_dtw_cost(x_seq, y_seq, metric, backend=backend) == pytest.approx(
+        reference_cost(x_seq, y_seq, metric))
+
+
+@pytest.mark.parametrize('backend', backends)
+def test_subsequence_dtw_matches_reference(backend):
+    # The best match of the template against every segment of the utterance
+    rng = np.random.default_rng(17)
+    template = rng.standard_normal((4, 6))
+    utterance = rng.standard_normal((12, 6))
+    best = min((reference_cost(template, utterance[start:end]), start, end)
+               for start in range(len(utterance)) for end in range(start + 1, len(utterance) + 1))
+    start, end, cost = dtw_engine.subsequence_dtw(template, utterance, backend=backend)
+    assert cost == pytest.approx(best[0])
+    assert reference_cost(template, utterance[start:end]) == pytest.approx(cost)
+
+
+def test_subsequence_dtw_finds_planted_template():
+    rng = np.random.default_rng(19)
+    utterance = rng.standard_normal((50, 8))
+    start, end, cost = dtw_engine.subsequence_dtw(utterance[20:30], utterance)
+    assert (start, end) == (20, 30)
+    assert cost == pytest.approx(0, abs=1e-9)
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'correlation', 'euclidean'])
+def test_local_cost_matrix_matches_cdist(metric):
+    x_seq, y_seq = random_pair(11, 14, seed=3)
+    np.testing.assert_allclose(dtw_engine.local_cost_matrix(x_seq, y_seq, metric), dist.cdist(x_seq, y_seq, metric),
+                               atol=1e-12)
+    normalized = dtw_engine.local_cost_matrix(dtw_engine.normalize_rows(x_seq, metric),
+                                              dtw_engine.normalize_rows(y_seq, metric), metric, normalized=True)
+    np.testing.assert_allclose(normalized, dist.cdist(x_seq, y_seq, metric), atol=1e-12)
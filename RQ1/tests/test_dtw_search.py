@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import dtw_search
+
+
+def random_candidates(seed, count=10, features=12):
+    rng = np.random.default_rng(seed)
+    x_seq = rng.standard_normal((14, features))
+    candidates = {f'S{index}': rng.standard_normal((rng.integers(8, 20), features)) for index in range(count)}
+    candidates['S4'] = x_seq + 0.01 * rng.standard_normal(x_seq.shape)
+    return x_seq, candidates
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean'])
+def test_lower_bounds_never_exceed_dtw(metric):
+    x_seq, candidates = random_candidates(31)
+    for y_seq in candidates.values():
+        cost = dtw_search.dtw_cost(x_seq, y_seq, metric=metric)
+        lo, hi = dtw_search.full_window(len(x_seq), len(y_seq))
+        upper, lower = dtw_search.query_envelope(x_seq, lo, hi, len(y_seq), metric)
+        assert dtw_search.lb_kim(x_seq, y_seq, metric) <= cost + 1e-9
+        assert dtw_search.lb_keogh(upper, lower, y_seq, metric) <= cost + 1e-9
+
+
+@pytest.mark.parametrize('window, band', [(None, None), ('sakoe_chiba', 3)])
+def test_pruned_search_matches_brute_force(window, band):
+    x_seq, candidates = random_candidates(23)
+    neighbours, stats = dtw_search.nearest_neighbours(x_seq, candidates, k=3, window=window, band=band)
+    expected = dtw_search.brute_force_neighbours(x_seq, candidates, k=3, window=window, band=band)
+    assert [key for key, cost in neighbours] == [key for key, cost in expected]
+    np.testing.assert_allclose([cost for key, cost in neighbours], [cost for key, cost in expected])
+    assert neighbours[0][0] == 'S4'
+    assert stats['dtw_computed'] + stats['pruned_kim'] + stats['pruned_keogh'] == len(candidates)
@@ -0,0 +1,126 @@
+import json
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial import distance as dist
+import catalog
+import dtw_ema_ms_phone
+import dtw_ema_ss_phone
+import dtw_engine
+import ema_store
+from conftest import speakers
+
+
+def recording(frames, seed, dropped=()):
+    ema = np.random.default_rng(seed).standard_normal((7, 3, frames))
+    for sensor in dropped:
+        ema[sensor, :, 1] = 0
+    return ema
+
+
+def legacy_stack_pair(root_ema, other_ema):
+    # The hstack onto a 3 column np.empty seed that stack_pair replaced
+    root_matrix = np.empty((root_ema[0, :, :].transpose().shape))
+    other_matrix = np.empty((other_ema[0, :, :].transpose().shape))
+    for sensor_num in range(root_ema.shape[0]):
+        root_data = root_ema[sensor_num, :, :].transpose()
+        other_data = other_ema[sensor_num, :, :].transpose()
+        if not np.any(np.all(other_data == 0, axis=1)) and not np.any(np.all(root_data == 0, axis=1)):
+            root_matrix = np.hstack((root_matrix, root_data))
+            other_matrix = np.hstack((other_matrix, other_data))
+    return root_matrix[:, 5:], other_matrix[:, 5:]
+
+
+def test_sensor_mask():
+    np.testing.assert_array_equal(dtw_ema_ms_phone.sensor_mask(recording(10, 0, dropped=[2, 5])),
+                                  [True, True, False, True, True, False, True])
+
+
+def test_stack_pair_keeps_the_legacy_layout():
+    root_ema = recording(10, 1, dropped=[4])
+    other_ema = recording(14, 2, dropped=[0])
+    root_matrix, other_matrix = dtw_ema_ms_phone.stack_pair(root_ema, other_ema, dtype=np.float64)
+    expected_root, expected_other = legacy_stack_pair(root_ema, other_ema)
+    # Sensor 1 is the first valid one and keeps only its z channel
+    assert root_matrix.shape == (10, 13) and other_matrix.shape == (14, 13)
+    np.testing.assert_array_equal(root_matrix, expected_root)
+    np.testing.assert_array_equal(other_matrix, expected_other)
+    root_matrix, other_matrix = dtw_ema_ms_phone.stack_pair(root_ema, other_ema)
+    assert root_matrix.dtype == np.float32
+    np.testing.assert_allclose(other_matrix, expected_other, rtol=1e-6)
+
+
+def test_stack_matrix_matches_reference():
+    emas = {f'S{index}': recording(8 + 3 * index, index, dropped=[index % 7] if index % 2 else [])
+            for index in range(6)}
+    expected = {}
+    for key, ema in emas.items():
+        if key != 'S0':
+            root_matrix, other_matrix = dtw_ema_ms_phone.stack_pair(emas['S0'], ema)
+            expected[key] = dtw_engine.dtw_reference(dist.cdist(root_matrix, other_matrix, 'cosine'))[1][-1, -1]
+    frame = dtw_ema_ms_phone.stack_matrix(dict(emas), 'S0', 'f', pd.DataFrame())
+    costs = dict(zip(frame['audio_files'], frame['alignment_cost']))
+    assert sorted(costs) == sorted(expected)
+    for key, cost in costs.items():
+        assert cost == pytest.approx(expected[key])
+
+
+def test_sensor_costs_match_reference():
+    emas = {'F01_f': recording(9, 3), 'M01_f': recording(12, 4, dropped=[2]), 'MC01_f': recording(7, 5),
+            'MC02_f': recording(15, 6, dropped=[0, 6])}
+    table = dtw_ema_ss_phone.sensor_costs(emas, 'MC01')
+    assert len(table) == 3 * 7
+    for sensor_num, sensor_name in dtw_ema_ss_phone.num_to_sensorMapping.items():
+        for key in ['F01_f', 'M01_f', 'MC02_f']:
+            score = table[(table['sensor'] == sensor_name) & (table['person_name'] == key)]['alignment_score'].item()
+            if (key, sensor_num) in [('M01_f', 2), ('MC02_f', 0), ('MC02_f', 6)]:
+                assert np.isnan(score)
+                continue
+            path, cost_mat = dtw_engine.dtw_reference(dist.cdist(emas['MC01_f'][sensor_num].T, emas[key][sensor_num].T,
+                                                                 'cosine'))
+            assert score == pytest.approx(cost_mat[-1, -1])
+
+
+def test_sensor_costs_without_root():
+    table = dtw_ema_ss_phone.sensor_costs({'F01_f': recording(9, 3)}, 'MC01')
+    assert len(table) == 0 and list(table.columns) == ['sensor', 'person_name', 'alignment_score']
+
+
+def test_sensor_costs_with_indexed_masks():
+    emas = {'F01_f': recording(9, 3), 'M01_f': recording(12, 4, dropped=[2]), 'MC01_f': recording(7, 5, dropped=[1])}
+    masks = {key: ema_store.dropout_fraction(ema) == 0 for key, ema in emas.items()}
+    pd.testing.assert_frame_equal(dtw_ema_ss_phone.sensor_costs(emas, 'MC01', masks),
+                                  dtw_ema_ss_phone.sensor_costs(emas, 'MC01'))
+
+
+def write_key_lists(root, root_person):
+    # The token lists dtw_mfcc_phone.save_keys leaves for the EMA modules
+    directory = os.path.join(root, 'phone_data', root_person)
+    with open(os.path.join(directory, 'feed_f_list.pkl'), 'wb') as file:
+        pickle.dump([speaker + '_f_sliced' for speaker in speakers], file)
+    with open(os.path.join(directory, 'f_list.pkl'), 'wb') as file:
+        pickle.dump([speaker + '_T1_f_sliced' for speaker in speakers], file)
+
+
+def test_acoustic_only_occurrences_have_no_ema_keys(corpus, monkeypatch):
+    # M01's f was never sliced from the EMA recording
+    with open(corpus['ema_manifest'], 'r') as json_file:
+        data_dict = json.load(json_file)
+    del data_dict['M01'][0]['text'][0]
+    with open(corpus['ema_manifest'], 'w') as json_file:
+        json.dump(data_dict, json_file)
+    assert catalog.query(speaker='M01', phone='f')[0]['ema_path'] is None
+    write_key_lists(corpus['root'], 'F01')
+    monkeypatch.setattr(dtw_ema_ms_phone, 'output_directory', corpus['root'])
+    monkeypatch.setattr(dtw_ema_ss_phone, 'output_directory', corpus['root'])
+
+    ema_path_dict = dtw_ema_ms_phone.process_json()
+    assert sorted(ema_path_dict['f']) == ['F01_T1_f', 'MC01_T1_f']
+    assert sorted(dtw_ema_ms_phone.get_acoustic_keys(ema_path_dict['f'], 'F01', 'feed', 'f')) == ['F01_T1_f',
+                                                                                                   'MC01_T1_f']
+    ema_path_dict = dtw_ema_ss_phone.process_json()
+    assert sorted(dtw_ema_ss_phone.get_acoustic_keys(ema_path_dict['f'], 'F01', 'f')) == ['F01_T1_f', 'MC01_T1_f']
+    assert None not in catalog.phone_index().flat_paths('f', 'ema_path')
+    assert len(catalog.phone_index().flat_paths('f')) == len(speakers)
@@ -0,0 +1,67 @@
+import json
+import os
+import h5py
+import numpy as np
+import ema_slicer
+
+
+def write_pos(path, samples, channel_count=12, header=False, seed=0):
+    data = np.random.default_rng(seed).standard_normal((samples, channel_count, 7)).astype('<f4')
+    with open(path, 'wb') as file:
+        if header:
+            lines = f'NumberOfChannels={channel_count}\nSamplingFrequencyHz=250\n'.encode()
+            first_lines = b'AG50xDATA_V002\n'
+            header_length = len(first_lines) + 9 + len(lines)
+            file.write(first_lines + f'{header_length:08d}\n'.encode() + lines)
+        file.write(data.tobytes())
+    return data
+
+
+def test_read_pos(tmp_path):
+    data = write_pos(str(tmp_path / 'ag500.pos'), 50)
+    np.testing.assert_array_equal(ema_slicer.read_pos(str(tmp_path / 'ag500.pos')), data)
+    data = write_pos(str(tmp_path / 'ag501.pos'), 40, channel_count=16, header=True)
+    assert ema_slicer.pos_layout(str(tmp_path / 'ag501.pos'))[1] == 16
+    np.testing.assert_array_equal(ema_slicer.read_pos(str(tmp_path / 'ag501.pos')), data)
+
+
+def test_slice_phone_takes_the_nearest_samples():
+    data = np.random.default_rng(1).standard_normal((100, 12, 7))
+    sample_times = (1 / 200) * np.arange(1, 101)
+    # An exact sample, a tie between two samples and times before the first
+    # and after the last sample
+    for start_time, end_time in [(0.05, 0.1), (0.0525, 0.2475), (0.0, 0.03), (0.45, 0.9)]:
+        # The min(abs(t - time)) search of extract_ema.m, the first index on a tie
+        start_index = np.argmin(np.abs(sample_times - start_time))
+        end_index = np.argmin(np.abs(sample_times - end_time))
+        sliced = ema_slicer.slice_phone(data, sample_times, start_time, end_time)
+        np.testing.assert_array_equal(sliced, data[start_index:end_index + 1].transpose(1, 2, 0))
+
+
+def test_extract_ema(tmp_path, monkeypatch):
+    monkeypatch.setattr(ema_slicer, 'save_directory', str(tmp_path / 'phone_data'))
+    monkeypatch.setattr(ema_slicer, 'ema_json_file_path', str(tmp_path / 'master_sliced_ema_data.json'))
+    phones = [('f', '0.05', '0.125'), ('iy', '0.125', '0.235'), ('d', '0.235', '0.29'), ('d', '0.3', '0.36')]
+    data_dict = {}
+    pos_data = {}
+    for seed, speaker in enumerate(['F01', 'M01']):
+        pos_file_path = str(tmp_path / f'{speaker}.pos')
+        pos_data[speaker] = write_pos(pos_file_path, 80, seed=seed)
+        data_dict[speaker] = [{'person_name': speaker, 'pos_file_path': pos_file_path,
+                               'text': [{'prompt': 'feed', 'phone': phone, 'start_time': start_time,
+                                         'end_time': end_time} for phone, start_time, end_time in phones]}]
+    with open(tmp_path / 'master_sliced_data.json', 'w') as json_file:
+        json.dump(data_dict, json_file)
+
+    ema_slicer.extract_ema(str(tmp_path / 'master_sliced_data.json'), build_store=False, processes=1)
+    with open(tmp_path / 'master_sliced_ema_data.json', 'r') as json_file:
+        ema_dict = json.load(json_file)
+    ema_paths = [phones_row['ema_file_path'] for phones_row in ema_dict['M01'][0]['text']]
+    assert [os.path.basename(path) for path in ema_paths] == ['f_sliced.h5', 'iy_sliced.h5', 'd_sliced.h5',
+                                                              'd_sliced_2.h5']
+    sample_times = (1 / 200) * np.arange(1, 81)
+    for phones_row, ema_path in zip(ema_dict['M01'][0]['text'], ema_paths):
+        with h5py.File(ema_path, 'r') as file:
+            sliced = file[phones_row['phone']][:]
+        np.testing.assert_array_equal(sliced, ema_slicer.slice_phone(
+            pos_data['M01'], sample_times, float(phones_row['start_time']), float(phones_row['end_time'])))
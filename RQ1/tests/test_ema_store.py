@@ -0,0 +1,64 @@
+import h5py
+import numpy as np
+import pytest
+import catalog
+import ema_store
+from conftest import backdate, phones, speakers
+
+
+def test_store_round_trip(corpus):
+    assert not ema_store.has_slices([catalog.query()[0]['ema_path']], corpus['ema_store'])
+    ema_store.build_store(corpus['ema_store'])
+    rows = catalog.query()
+    ema_paths = [row['ema_path'] for row in rows]
+    assert ema_store.has_slices(ema_paths, corpus['ema_store'])
+    assert not ema_store.has_slices(ema_paths + ['unknown.h5'], corpus['ema_store'])
+    # Reversed, so the reads are not in store order
+    for row, ema in zip(rows[::-1], ema_store.read_slices(ema_paths[::-1], corpus['ema_store'])):
+        np.testing.assert_array_equal(ema, ema_store.read_slice(row)[ema_store.sensor_list, :ema_store.channels])
+
+
+def test_sensor_dropouts(corpus):
+    ema_store.build_store(corpus['ema_store'])
+    rows = catalog.query(speaker='MC01', phone='d') + catalog.query(speaker='M01', phone='d')
+    dropouts = ema_store.sensor_dropouts([row['ema_path'] for row in rows], corpus['ema_store'])
+    # Sensor 3 is the third of the selected sensors, one frame of each d
+    expected = np.zeros((4, len(ema_store.sensor_list)))
+    expected[0, 2] = 1 / 11
+    expected[1, 2] = 1 / 12
+    np.testing.assert_allclose(dropouts, expected, rtol=1e-6)
+    assert ema_store.sensor_dropouts(['unknown.h5'], corpus['ema_store']) is None
+
+
+def test_sensor_health(corpus):
+    ema_store.build_store(corpus['ema_store'])
+    table = ema_store.sensor_health(corpus['ema_store'])
+    assert len(table) == len(speakers) * len(phones) * len(ema_store.sensor_list)
+    dropped = table[table['has_dropout']]
+    assert set(zip(dropped['speaker'], dropped['phone'], dropped['sensor'])) == {('MC01', 'd', 'Tongue tip')}
+
+
+
+def test_sensor_health_without_store(corpus):
+    with pytest.raises(FileNotFoundError, match='build_store'):
+        ema_store.sensor_health(corpus['ema_store'])
+
+
+def test_sensor_health_of_store_without_dropout_index(corpus):
+    ema_store.build_store(corpus['ema_store'])
+    expected = ema_store.sensor_health(corpus['ema_store'])
+    ema_store._stores.pop(corpus['ema_store'])[0].close()
+    with h5py.File(corpus['ema_store'], 'a') as store:
+        del store['dropouts']
+    table = ema_store.sensor_health(corpus['ema_store'])
+    np.testing.assert_allclose(table['dropout_fraction'], expected['dropout_fraction'])
+
+
+def test_store_of_an_older_catalog_is_ignored(corpus, capsys):
+    ema_store.build_store(corpus['ema_store'])
+    backdate(corpus['catalog'])
+    assert ema_store.open_store(corpus['ema_store']) is None
+    assert 'Ignoring' in capsys.readouterr().out
+    assert not ema_store.has_slices([catalog.query()[0]['ema_path']], corpus['ema_store'])
+    ema_store.build_store(corpus['ema_store'])
+    assert ema_store.open_store(corpus['ema_store']) is not None
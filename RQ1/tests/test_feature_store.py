@@ -0,0 +1,65 @@
+import json
+import numpy as np
+import pytest
+import catalog
+import feature_store
+from conftest import backdate, phones, speakers
+
+
+def test_store_round_trip(corpus):
+    feature_store.build_store()
+    values, table, rows = feature_store.open_store()
+    assert len(table) == len(speakers) * len(phones)
+    for row in catalog.query():
+        matrix = feature_store.load_matrix(row['mfcc_path'])
+        assert matrix.dtype == np.float32
+        np.testing.assert_array_equal(matrix, np.asarray(catalog.token_matrix(row), dtype=np.float32))
+    tokens = feature_store.phone_matrices('d')
+    assert sorted(tokens) == sorted(f'{speaker}_T1_d_sliced{suffix}' for speaker in speakers for suffix in ('', '_2'))
+
+
+def test_load_matrix_without_store_reads_utterances(corpus):
+    assert feature_store.open_store() is None
+    row = catalog.query(speaker='M01', phone='f')[0]
+    np.testing.assert_array_equal(feature_store.load_matrix(row['mfcc_path']), catalog.token_matrix(row))
+
+
+def test_store_is_repacked_when_an_utterance_changes(corpus):
+    feature_store.build_store()
+    row = catalog.query(speaker='M01', phone='iy')[0]
+    matrix = np.load(row['matrix_file_path'])
+    matrix[:, 25:47] += 1
+    np.save(row['matrix_file_path'], matrix)
+    backdate(row['matrix_file_path'])
+    catalog._utterances.clear()
+    # A new process maps the store again
+    feature_store._stores.clear()
+    np.testing.assert_allclose(feature_store.load_matrix(row['mfcc_path']), matrix[:, 25:47], rtol=1e-6)
+
+
+def test_store_is_repacked_when_the_catalog_is_rebuilt(corpus, capsys):
+    feature_store.build_store()
+    backdate(corpus['catalog'])
+    feature_store._stores.clear()
+    assert feature_store.open_store() is not None
+    assert 'the catalog was rebuilt since' in capsys.readouterr().out
+    feature_store._stores.clear()
+    feature_store.open_store()
+    assert 'Rebuilding' not in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('emptied', ['manifest', 'frames'])
+def test_store_of_a_catalog_without_frames(corpus, emptied):
+    with open(corpus['manifest'], 'r') as json_file:
+        data_dict = json.load(json_file)
+    if emptied == 'manifest':
+        data_dict = {}
+    else:
+        for person_prompts in sum(data_dict.values(), []):
+            for phones in person_prompts['text']:
+                phones['end_frame'] = phones['start_frame']
+    with open(corpus['manifest'], 'w') as json_file:
+        json.dump(data_dict, json_file)
+    with pytest.raises(ValueError, match='nothing to pack'):
+        feature_store.build_store()
+    assert feature_store.open_store() is None
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import matrix_cache
+from conftest import backdate
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    budget_bytes = matrix_cache.budget_bytes
+    matrix_cache.clear()
+    yield
+    matrix_cache.set_budget(budget_bytes)
+    matrix_cache.clear()
+
+
+def test_matrix_cache_reloads_rewritten_files(tmp_path):
+    path = str(tmp_path / 'matrix.npy')
+    np.save(path, np.zeros(3))
+    first = matrix_cache.load(path)
+    assert matrix_cache.load(path) is first
+    assert not first.flags.writeable
+    np.save(path, np.ones(3))
+    backdate(path)
+    np.testing.assert_array_equal(matrix_cache.load(path), np.ones(3))
+    assert matrix_cache.stats()['entries'] == 1
+
+
+def test_matrix_cache_evicts_least_recently_used(tmp_path):
+    paths = [str(tmp_path / f'{index}.npy') for index in range(3)]
+    for path in paths:
+        np.save(path, np.zeros(100))
+    matrix_cache.set_budget(2 * 800)
+    matrix_cache.load(paths[0])
+    matrix_cache.load(paths[1])
+    matrix_cache.load(paths[0])
+    matrix_cache.load(paths[2])
+    stats = matrix_cache.stats()
+    assert (stats['entries'], stats['evictions'], stats['held_bytes']) == (2, 1, 1600)
+    matrix_cache.load(paths[0])
+    assert matrix_cache.stats()['hits'] == 2
+
+
+def test_matrix_cache_needs_a_version_for_missing_paths(tmp_path):
+    path = str(tmp_path / 'missing.npy')
+    with pytest.raises(FileNotFoundError):
+        matrix_cache.load(path, loader=lambda path: np.zeros(3))
+    assert matrix_cache.load(path, loader=lambda path: np.zeros(3), version=1).shape == (3,)
+    np.testing.assert_array_equal(matrix_cache.load(path, loader=lambda path: np.ones(3), version=2), np.ones(3))
+    assert matrix_cache.stats()['entries'] == 1
@@ -0,0 +1,66 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.spatial import distance as dist
+import catalog
+import dtw_engine
+import dtw_mfcc_phone
+import feature_store
+from conftest import backdate
+
+
+def phone_dict(phone):
+    # {'M01_T1_f': slice path, ...} of the first occurrences, as main builds it
+    return {key: paths[0] for key, paths in catalog.phone_paths([phone])[phone].items()}
+
+
+def reference_costs(root_key, paths):
+    root_row = catalog.occurrence_row(paths[root_key])
+    return {key: dtw_engine.dtw_reference(dist.cdist(catalog.token_matrix(root_row).T,
+                                                     catalog.token_matrix(catalog.occurrence_row(path)).T,
+                                                     'cosine'))[1][-1, -1]
+            for key, path in paths.items() if key != root_key}
+
+
+@pytest.mark.parametrize('packed', [False, True])
+@pytest.mark.parametrize('batched', [False, True])
+def test_compare_phone_matrix_without_slice_files(corpus, batched, packed):
+    # None of the sliced .npy files exist, the tokens come from the store or
+    # the utterance matrices and must not be scored as perfect matches
+    if packed:
+        feature_store.build_store()
+    paths = phone_dict('iy')
+    assert not any(os.path.exists(path) for path in paths.values())
+    expected = reference_costs('M01_T1_iy', paths)
+    frame = dtw_mfcc_phone.compare_phone_matrix(dict(paths), 'M01', 'iy', pd.DataFrame(), batched=batched)
+    costs = dict(zip(frame['audio_files'], frame['alignment_cost']))
+    assert sorted(costs) == sorted(expected)
+    for key, cost in costs.items():
+        assert cost > 0
+        assert cost == pytest.approx(expected[key], rel=1e-4)
+
+
+@pytest.mark.parametrize('batched', [False, True])
+def test_tokens_without_frames_are_nan(corpus, batched):
+    with open(corpus['manifest'], 'r') as json_file:
+        data_dict = json.load(json_file)
+    data_dict['MC01'][0]['text'][1]['end_frame'] = data_dict['MC01'][0]['text'][1]['start_frame']
+    with open(corpus['manifest'], 'w') as json_file:
+        json.dump(data_dict, json_file)
+    frame = dtw_mfcc_phone.compare_phone_matrix(phone_dict('iy'), 'M01', 'iy', pd.DataFrame(), batched=batched)
+    costs = dict(zip(frame['audio_files'], frame['alignment_cost']))
+    assert np.isnan(costs['MC01_T1_iy'])
+    assert costs['F01_T1_iy'] > 0
+
+
+def test_normalized_tokens_follow_their_source(corpus):
+    row = catalog.query(speaker='M01', phone='f')[0]
+    before = feature_store.normalized_matrix(row['mfcc_path'])
+    matrix = np.load(row['matrix_file_path'])
+    matrix[:, 10:25] = -matrix[:, 10:25]
+    np.save(row['matrix_file_path'], matrix)
+    backdate(row['matrix_file_path'])
+    catalog._utterances.clear()
+    np.testing.assert_allclose(feature_store.normalized_matrix(row['mfcc_path']), -before, rtol=1e-6)
@@ -0,0 +1,54 @@
+import os
+import pandas as pd
+import pytest
+import torgo_inventory
+
+save_paths = pytest.importorskip('save_paths')
+
+
+def write_dataset(root):
+    # Every preference of extract_paths: head over array microphone wavs,
+    # phn_headMic over phn_arrayMic, .phn over .PHN, and recordings without
+    # a phone or pos file that have to be skipped
+    files = {('M', 'M01', 'Session1'): {'wav_headMic': ['0001.wav'], 'wav_arrayMic': ['0001.wav', '0002.wav'],
+                                        'phn_arrayMic': ['0001.PHN', '0002.phn'], 'pos': ['0001.pos', '0002.pos']},
+             ('M', 'M02', 'Session1'): {'wav_arrayMic': ['0001.wav'], 'phn_arrayMic': ['0001.phn'],
+                                        'phn_headMic': ['0001.PHN'], 'pos': []},
+             ('M', 'M02', 'Session2'): {'wav_arrayMic': ['0005.wav'], 'phn_headMic': ['0005.phn', '0005.PHN'],
+                                        'pos': ['0005.pos']},
+             ('MC', 'MC01', 'Session1'): {'wav_headMic': ['0003.wav'], 'phn_headMic': ['0003.phn'],
+                                          'pos': ['0003.pos']}}
+    for (group, speaker, session), channels in files.items():
+        for channel, names in channels.items():
+            os.makedirs(os.path.join(root, group, speaker, session, channel))
+            for name in names:
+                open(os.path.join(root, group, speaker, session, channel, name), 'w').close()
+
+
+def test_resolve_paths_matches_extract_paths(tmp_path, monkeypatch):
+    root = str(tmp_path / 'Dataset') + '/'
+    write_dataset(root)
+    monkeypatch.setattr(save_paths, 'ROOT_DIRECTORY', root)
+    monkeypatch.setattr(torgo_inventory, '_inventories', {})
+    # Scanned once, both functions get it from the per-process cache
+    inventory = torgo_inventory.load_inventory(root, str(tmp_path / 'torgo_inventory.csv'))
+    df = pd.DataFrame([('M01', 'Session1', '0001.txt', 'feed'), ('M01', 'Session1', '0002.txt', 'feed'),
+                       ('M02', 'Session1', '0001.txt', 'feed'), ('M02', 'Session2', '0005.txt', 'feed'),
+                       ('MC01', 'Session1', '0003.txt', 'feed'), ('F01', 'Session1', '0001.txt', 'feed'),
+                       ('M01', 'Session1', '0002.txt', 'horn')],
+                      columns=['dir_name', 'session_name', 'file_name', 'text'])
+
+    row_list = []
+    for text in ['feed', 'horn']:
+        added_directories = []
+        for index, row in df[df['text'] == text].iterrows():
+            save_paths.extract_paths(row['dir_name'], row['session_name'], row['file_name'], row['text'],
+                                     row_list, added_directories)
+    expected = pd.DataFrame(row_list)
+
+    paths = save_paths.resolve_paths(df, inventory).reset_index(drop=True)
+    pd.testing.assert_frame_equal(paths.astype(object), expected[paths.columns].astype(object))
+    assert list(zip(paths['person_name'], paths['text'])) == [('M01', 'feed'), ('M02', 'feed'), ('MC01', 'feed'),
+                                                              ('M01', 'horn')]
+    assert paths['wav_file_path'][0].endswith('wav_headMic/0001.wav')
+    assert paths['phn_file_path'][1].endswith('phn_headMic/0005.phn')
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from scipy.spatial import distance as dist
+import dtw_engine
+import soft_dtw
+
+
+def random_sequences(seed, lengths, features=3):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal((length, features)) for length in lengths]
+
+
+def test_soft_dtw_matches_tslearn():
+    metrics = pytest.importorskip('tslearn.metrics')
+    x_sequences = random_sequences(41, (4, 9, 6, 1))
+    y_sequences = random_sequences(43, (7, 5, 6, 3))
+    values = soft_dtw.soft_dtw_pairs(x_sequences, y_sequences, gamma=0.5)
+    np.testing.assert_allclose(values, [metrics.soft_dtw(x_seq, y_seq, gamma=0.5)
+                                        for x_seq, y_seq in zip(x_sequences, y_sequences)])
+
+
+def test_soft_dtw_approaches_reference():
+    # With a small gamma the soft minimum is the minimum
+    x_sequences = random_sequences(29, (4, 9, 6))
+    y_sequences = random_sequences(31, (7, 5, 6))
+    values = soft_dtw.soft_dtw_pairs(x_sequences, y_sequences, gamma=1e-4)
+    expected = [dtw_engine.dtw_reference(dist.cdist(x_seq, y_seq, 'sqeuclidean'))[1][-1, -1]
+                for x_seq, y_seq in zip(x_sequences, y_sequences)]
+    np.testing.assert_allclose(values, expected, atol=1e-2)
+
+
+def test_soft_dtw_gradient_matches_finite_differences():
+    x_seq, y_seq = random_sequences(47, (5, 7))
+    values, gradients = soft_dtw.soft_dtw_pairs([x_seq], [y_seq], gamma=1.0, gradient=True)
+    step = 1e-6
+    numeric = np.zeros_like(x_seq)
+    for index in np.ndindex(x_seq.shape):
+        shifted = x_seq.copy()
+        shifted[index] += step
+        numeric[index] = (soft_dtw.soft_dtw_pairs([shifted], [y_seq], gamma=1.0)[0] - values[0]) / step
+    np.testing.assert_allclose(gradients[0], numeric, rtol=1e-3, atol=1e-4)
+
+
+def test_soft_dtw_matrix_matches_pairs():
+    x_sequences = random_sequences(53, (3, 8))
+    y_sequences = random_sequences(59, (6, 2, 4))
+    matrix = soft_dtw.soft_dtw_matrix(x_sequences, y_sequences)
+    for row, x_seq in enumerate(x_sequences):
+        for column, y_seq in enumerate(y_sequences):
+            assert matrix[row, column] == pytest.approx(soft_dtw.soft_dtw_pairs([x_seq], [y_seq])[0])
@@ -0,0 +1,72 @@
+import os
+import pytest
+import torgo_inventory
+from conftest import backdate
+
+
+def write_dataset(root):
+    # F01 with two sessions, M01 with one, MC01 has an empty pos directory
+    files = {('F', 'F01', 'Session1', 'wav_headMic'): ['0001.wav', '0002.wav'],
+             ('F', 'F01', 'Session1', 'prompts'): ['0001.txt', '0002.txt'],
+             ('F', 'F01', 'Session2', 'wav_arrayMic'): ['0001.wav'],
+             ('M', 'M01', 'Session1', 'wav_headMic'): ['0003.wav'],
+             ('MC', 'MC01', 'Session1', 'pos'): []}
+    for (group, speaker, session, channel), names in files.items():
+        os.makedirs(os.path.join(root, group, speaker, session, channel))
+        for name in names:
+            open(os.path.join(root, group, speaker, session, channel, name), 'w').close()
+    # Not a session directory
+    os.makedirs(os.path.join(root, 'M', 'M01', 'notes'))
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    root = str(tmp_path / 'Dataset') + os.sep
+    write_dataset(root)
+    monkeypatch.setattr(torgo_inventory, '_inventories', {})
+    return root, str(tmp_path / 'torgo_inventory.csv')
+
+
+def test_inventory_lookups(dataset):
+    root, table_path = dataset
+    inventory = torgo_inventory.load_inventory(root, table_path)
+    assert inventory.speakers('F') == ['F01'] and inventory.speakers('FC') == []
+    assert inventory.speaker_sessions('F', 'F01') == ['Session1', 'Session2']
+    assert inventory.speaker_sessions('M', 'M01') == ['Session1']
+    assert inventory.listdir('F01', 'Session1', 'wav_headMic') == ['0001.wav', '0002.wav']
+    assert inventory.exists('M01', 'Session1', 'wav_headMic', '0003.wav')
+    assert not inventory.exists('M01', 'Session1', 'wav_headMic', '0001.wav')
+    assert inventory.has_channel('MC01', 'Session1', 'pos') and inventory.listdir('MC01', 'Session1', 'pos') == []
+    assert inventory.session_path('F', 'F01', 'Session2') == os.path.join(root, 'F', 'F01', 'Session2')
+
+
+def test_inventory_is_rescanned_for_a_new_speaker(dataset):
+    root, table_path = dataset
+    torgo_inventory.load_inventory(root, table_path)
+    assert not torgo_inventory.is_stale(table_path, root)
+    os.makedirs(os.path.join(root, 'F', 'F03', 'Session1', 'wav_headMic'))
+    backdate(table_path)
+    assert torgo_inventory.is_stale(table_path, root)
+    # A new process rescans instead of reading the saved table back
+    torgo_inventory._inventories.clear()
+    assert torgo_inventory.load_inventory(root, table_path).speakers('F') == ['F01', 'F03']
+    assert not torgo_inventory.is_stale(table_path, root)
+
+
+@pytest.mark.parametrize('new_path', [('F', 'F01', 'Session3', 'wav_headMic'), ('M', 'M01', 'Session1', 'pos'),
+                                      ('F', 'F01', 'Session1', 'prompts', '0003.txt')])
+def test_inventory_is_rescanned_for_new_entries_of_a_speaker(dataset, new_path):
+    # A new session, a new channel of a session and a new file of a channel
+    root, table_path = dataset
+    torgo_inventory.load_inventory(root, table_path)
+    path = os.path.join(root, *new_path)
+    if path.endswith('.txt'):
+        open(path, 'w').close()
+    else:
+        os.makedirs(path)
+    backdate(table_path)
+    assert torgo_inventory.is_stale(table_path, root)
+    torgo_inventory._inventories.clear()
+    inventory = torgo_inventory.load_inventory(root, table_path)
+    assert inventory.has_channel(*new_path[1:4]) and (len(new_path) == 4 or inventory.exists(*new_path[1:]))
+    assert not torgo_inventory.is_stale(table_path, root)
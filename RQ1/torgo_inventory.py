@@ -0,0 +1,145 @@
+import os
+import pandas as pd
+
+ROOT_DIRECTORY = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Dataset/'
+OUTPUT_PATH = r'/Users/shrinivassampathmuthupalaniyappan/Desktop/Courses/Capstone/Local_Copy/Output/'
+inventory_path = os.path.join(OUTPUT_PATH, 'torgo_inventory.csv')
+
+directories = ['F', 'FC', 'M', 'MC']
+
+# One row per file of a session channel directory (wav_headMic, phn_arrayMic,
+# pos, prompts, ...). An empty channel directory gets one row with an empty
+# file name so that it still counts as present.
+columns = ['root', 'group', 'speaker', 'session', 'channel', 'file_name']
+
+
+def _directories(path):
+    with os.scandir(path) as entries:
+        return sorted((entry for entry in entries if entry.is_dir() and not entry.name.startswith('.')),
+                      key=lambda entry: entry.name)
+
+
+def scan(root=ROOT_DIRECTORY):
+    # Rows of the inventory, from a single os.scandir walk of the groups
+    rows = []
+    for group in directories:
+        group_path = os.path.join(root, group)
+        if not os.path.isdir(group_path):
+            print(f"The '{group}' directory does not exist.")
+            continue
+        for speaker in _directories(group_path):
+            for session in _directories(speaker.path):
+                if not session.name.startswith('Session'):
+                    continue
+                for channel in _directories(session.path):
+                    with os.scandir(channel.path) as entries:
+                        names = sorted(entry.name for entry in entries if entry.is_file())
+                    for name in names or ['']:
+                        rows.append((root, group, speaker.name, session.name, channel.name, name))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def is_stale(table_path=inventory_path, root=ROOT_DIRECTORY):
+    # Adding or removing an entry changes the mtime of the directory holding
+    # it: a group or speaker directory for a new speaker or session, a session
+    # directory for a new channel and a channel directory for a new file. Only
+    # directories are stat()ed, no file is listed.
+    if not os.path.exists(table_path):
+        return True
+    built = os.path.getmtime(table_path)
+    for group in directories:
+        group_path = os.path.join(root, group)
+        if not os.path.isdir(group_path):
+            continue
+        if os.path.getmtime(group_path) > built:
+            return True
+        for speaker in _directories(group_path):
+            if speaker.stat().st_mtime > built:
+                return True
+            for session in _directories(speaker.path):
+                if not session.name.startswith('Session'):
+                    continue
+                if session.stat().st_mtime > built:
+                    return True
+                if any(channel.stat().st_mtime > built for channel in _directories(session.path)):
+                    return True
+    return False
+
+
+class Inventory:
+    """
+    In-memory view of the inventory table: existence checks and directory
+    listings are set and dictionary lookups instead of filesystem calls.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.root = table['root'].iloc[0] if len(table) else ROOT_DIRECTORY
+        self.files = set()
+        self.listings = {}
+        self.sessions = {}
+        for group, speaker, session, channel, file_name in zip(table['group'], table['speaker'], table['session'],
+                                                                table['channel'], table['file_name']):
+            listing = self.listings.setdefault((speaker, session, channel), [])
+            if file_name:
+                self.files.add((speaker, session, channel, file_name))
+                listing.append(file_name)
+            sessions = self.sessions.setdefault(group, {}).setdefault(speaker, [])
+            if session not in sessions:
+                sessions.append(session)
+
+    def file_index(self):
+        # (speaker, session, channel, file_name) MultiIndex for vectorized isin lookups
+        files = self.table[self.table['file_name'] != '']
+        return pd.MultiIndex.from_frame(files[['speaker', 'session', 'channel', 'file_name']])
+
+    def exists(self, speaker, session, channel, file_name):
+        return (speaker, session, channel, file_name) in self.files
+
+    def has_channel(self, speaker, session, channel):
+        return (speaker, session, channel) in self.listings
+
+    def listdir(self, speaker, session, channel):
+        # File names of one channel directory, sorted
+        return self.listings.get((speaker, session, channel), [])
+
+    def speakers(self, group):
+        return list(self.sessions.get(group, {}))
+
+    def speaker_sessions(self, group, speaker):
+        return self.sessions.get(group, {}).get(speaker, [])
+
+    def session_path(self, group, speaker, session):
+        return os.path.join(self.root, group, speaker, session)
+
+
+# root -> Inventory, one per process
+_inventories = {}
+
+
+def load_inventory(root=ROOT_DIRECTORY, table_path=inventory_path, refresh=False):
+    """
+    The inventory of the dataset under `root`. The table is cached at
+    `table_path` and only rescanned when it is missing, was built for another
+    root, is older than any group, speaker, session or channel directory or
+    `refresh` is set.
+    """
+
+    if root in _inventories and not refresh:
+        return _inventories[root]
+    table = None
+    if not refresh and not is_stale(table_path, root):
+        table = pd.read_csv(table_path, dtype=str, keep_default_na=False)
+        if len(table) and table['root'].iloc[0] != root:
+            table = None
+    if table is None:
+        table = scan(root)
+        os.makedirs(os.path.dirname(table_path), exist_ok=True)
+        table.to_csv(table_path, index=False)
+        print(f"Inventory of {len(table)} files under {root} saved to {table_path}")
+    _inventories[root] = Inventory(table)
+    return _inventories[root]
+
+
+if __name__ == '__main__':
+    load_inventory(refresh=True)
@@ -1,15 +1,17 @@
 import os
 import csv
 
+# Run from the repository root: python -m Utils.convert_prompts_to_csv
+from RQ1 import torgo_inventory
 
-# Function to process a session directory
-def extract_prompt(root_name, session_dir, csv_writer):
-    prompts_dir = os.path.join(session_dir, "prompts")
 
-    if not os.path.exists(prompts_dir):
+# Function to process a session directory
+def extract_prompt(root_name, inventory, speaker, session_dir, csv_writer):
+    if not inventory.has_channel(speaker, os.path.basename(session_dir), "prompts"):
         return
 
-    for root, _, files in os.walk(prompts_dir):
+    # Walked, the inventory only lists the files directly in a channel directory
+    for root, _, files in os.walk(os.path.join(session_dir, "prompts")):
         for file in files:
             if file.endswith(".txt"):
                 file_path = os.path.join(root, file)
@@ -18,18 +20,16 @@ def extract_prompt(root_name, session_dir, csv_writer):
                     csv_writer.writerow([root_name, file, text])
 
 
-def process_session(directory, path, csv_writer):
-    for dir_name in os.listdir(path):
-        if dir_name.startswith("Session"):
-            session_dir = os.path.join(path, dir_name)
-            extract_prompt(directory, session_dir, csv_writer)
+def process_session(directory, inventory, speaker, csv_writer):
+    for dir_name in inventory.speaker_sessions(directory, speaker):
+        session_dir = inventory.session_path(directory, speaker, dir_name)
+        extract_prompt(directory, inventory, speaker, session_dir, csv_writer)
 
 
-def process_directory(directory, dir, csv_writer):
-    for dir_name in os.listdir(dir):
+def process_directory(directory, inventory, csv_writer):
+    for dir_name in inventory.speakers(directory):
         if dir_name.startswith(directory):
-            sub_dir = os.path.join(dir, dir_name)
-            process_session(directory, sub_dir, csv_writer)
+            process_session(directory, inventory, dir_name, csv_writer)
 
 
 # Main program
@@ -41,11 +41,9 @@ with open(csv_file, "w", newline="") as csvfile:
     csv_writer = csv.writer(csvfile)
     csv_writer.writerow(["File_Name", "Text"])
 
+    # One walk of the dataset, the prompts are read from its listing
+    inventory = torgo_inventory.load_inventory(root_directory)
     for directory in directories:
-        dir_path = os.path.join(root_directory, directory)
-        if os.path.exists(dir_path):
-            process_directory(directory, dir_path, csv_writer)
-        else:
-            print(f"The '{directory}' directory does not exist.")
+        process_directory(directory, inventory, csv_writer)
 
 print("Process completed and data is saved to 'output.csv'.")